@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+import collections
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from .utils import content_digest
+
+logger = logging.getLogger("AttachmentCache")
+
+_INDEX_FILE = 'index.json'
+_MAX_ALIASES = 4096
+
+
+class AttachmentCache:
+    """
+    Two-tier (memory + disk directory) cache of downloaded attachments.
+
+    Payloads are stored once under the digest of the downloaded bytes and found through
+    aliases: the attachment URL and, when the sender embedded one in the filename, the
+    content digest. The same screenshot shared twice has a new URL but the same digest.
+    Both tiers are bounded by total size and evict least recently used entries; entries too
+    large for the memory tier live on disk only. Methods are blocking (disk I/O) and
+    thread-safe, so callers run them in an executor.
+
+    Several users can share one cache (hub mode) through AttachmentCacheView: aliases are
+    kept per `namespace`, so one tenant never finds another's attachments, while payloads
+    and the size bounds are shared.
+    """
+
+    def __init__(self, directory: Optional[str], memory_max_bytes: int = 32 * 1024 * 1024,
+                 disk_max_bytes: int = 256 * 1024 * 1024):
+        self.directory = directory
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_max_bytes = disk_max_bytes if directory else 0
+        self._lock = threading.Lock()
+        self._memory: "collections.OrderedDict[str, bytes]" = collections.OrderedDict()
+        self._memory_bytes = 0
+        self._disk: "collections.OrderedDict[str, int]" = collections.OrderedDict()
+        self._disk_bytes = 0
+        self._aliases: "collections.OrderedDict[str, str]" = collections.OrderedDict()
+        self._content_types: Dict[str, str] = {}
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            self._load_disk_index()
+
+    # --- Disk tier bookkeeping ---
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.bin")
+
+    def _load_disk_index(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.bin'):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, name[:-4], st.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        try:
+            with open(os.path.join(self.directory, _INDEX_FILE), 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            for alias, key in index.get('aliases', {}).items():
+                if key in self._disk:
+                    self._aliases[alias] = key
+            self._content_types = {k: v for k, v in index.get('types', {}).items() if k in self._disk}
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, AttributeError) as e:
+            logger.warning(f"Ignoring unreadable attachment cache index: {e}")
+        self._evict_disk()
+        if self._disk:
+            logger.info(f"Attachment cache at {self.directory}: {len(self._disk)} item(s), {self._disk_bytes} bytes.")
+
+    def _save_index(self):
+        try:
+            fd, temp_path = tempfile.mkstemp(prefix='.index-', dir=self.directory)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'aliases': dict(self._aliases), 'types': self._content_types}, f)
+            os.replace(temp_path, os.path.join(self.directory, _INDEX_FILE))
+        except OSError as e:
+            logger.warning(f"Failed to save attachment cache index: {e}")
+
+    def _evict_disk(self):
+        while self._disk_bytes > self.disk_max_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            self._forget_if_unused(key)
+
+    def _evict_memory(self):
+        while self._memory_bytes > self.memory_max_bytes and self._memory:
+            key, data = self._memory.popitem(last=False)
+            self._memory_bytes -= len(data)
+            self.evictions += 1
+            self._forget_if_unused(key)
+
+    def _forget_if_unused(self, key: str):
+        if key in self._memory or key in self._disk:
+            return
+        for alias in [a for a, k in self._aliases.items() if k == key]:
+            del self._aliases[alias]
+        self._content_types.pop(key, None)
+
+    # --- Public API ---
+
+    @staticmethod
+    def _alias_keys(url: Optional[str], digest: Optional[str], namespace: Optional[str] = None):
+        prefix = f"{namespace}/" if namespace else ''
+        if digest:
+            yield f"{prefix}digest:{digest}"
+        if url:
+            yield f"{prefix}url:{url}"
+
+    def get(self, url: Optional[str] = None, digest: Optional[str] = None,
+            namespace: Optional[str] = None) -> Optional[Tuple[bytes, Optional[str]]]:
+        """Returns (payload, content_type) for a cached attachment, or None."""
+        with self._lock:
+            key = next((self._aliases[a] for a in self._alias_keys(url, digest, namespace) if a in self._aliases), None)
+            if key is None:
+                self.misses += 1
+                return None
+            content_type = self._content_types.get(key)
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return data, content_type
+            if key in self._disk:
+                try:
+                    with open(self._path(key), 'rb') as f:
+                        data = f.read()
+                    os.utime(self._path(key)) # mtime orders the LRU across restarts
+                except OSError as e:
+                    logger.warning(f"Attachment cache entry {key} unreadable: {e}")
+                    self._disk_bytes -= self._disk.pop(key)
+                    self._forget_if_unused(key)
+                    self.misses += 1
+                    return None
+                self._disk.move_to_end(key)
+                self.disk_hits += 1
+                self._put_memory(key, data)
+                return data, content_type
+            self.misses += 1
+            return None
+
+    def _put_memory(self, key: str, data: bytes):
+        if len(data) > self.memory_max_bytes // 4:
+            return # Large payloads only go to disk
+        if key not in self._memory:
+            self._memory[key] = data
+            self._memory_bytes += len(data)
+        self._memory.move_to_end(key)
+        self._evict_memory()
+
+    def put(self, data, url: Optional[str] = None, digest: Optional[str] = None,
+            content_type: Optional[str] = None, namespace: Optional[str] = None):
+        """Stores a downloaded payload (bytes-like) under its URL and content digest."""
+        key = content_digest(data)
+        size = len(data)
+        with self._lock:
+            for alias in self._alias_keys(url, digest, namespace):
+                self._aliases[alias] = key
+                self._aliases.move_to_end(alias)
+            while len(self._aliases) > _MAX_ALIASES:
+                self._aliases.popitem(last=False)
+            if content_type:
+                self._content_types[key] = content_type
+            if size <= self.memory_max_bytes // 4:
+                self._put_memory(key, bytes(data))
+            if self.directory and size <= self.disk_max_bytes:
+                if key not in self._disk:
+                    try:
+                        with open(self._path(key), 'wb') as f:
+                            f.write(data)
+                        self._disk[key] = size
+                        self._disk_bytes += size
+                    except OSError as e:
+                        logger.warning(f"Failed to write attachment cache entry: {e}")
+                else:
+                    self._disk.move_to_end(key)
+                self._evict_disk()
+                self._save_index()
+            self._forget_if_unused(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'memory_items': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'disk_items': len(self._disk),
+                'disk_bytes': self._disk_bytes,
+            }
+
+
+class AttachmentCacheView:
+    """One tenant's window onto a shared AttachmentCache, with the same get/put/stats interface."""
+
+    def __init__(self, cache: AttachmentCache, namespace: str):
+        self.cache = cache
+        self.namespace = namespace
+
+    def get(self, url: Optional[str] = None, digest: Optional[str] = None) -> Optional[Tuple[bytes, Optional[str]]]:
+        return self.cache.get(url, digest, namespace=self.namespace)
+
+    def put(self, data, url: Optional[str] = None, digest: Optional[str] = None,
+            content_type: Optional[str] = None):
+        self.cache.put(data, url, digest, content_type, namespace=self.namespace)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
+
+
+def create_attachment_cache(receiver_config: Dict[str, Any], state_dir: Optional[str]) -> Optional[AttachmentCache]:
+    """
+    Builds the attachment cache from the `attachment_cache` section of `receiver_config`
+    (receiver.attachment_cache, or the hub's top-level section), or returns None if disabled.
+    """
+    cfg = receiver_config.get('attachment_cache') or {}
+    if not cfg.get('enabled', True):
+        return None
+    if 'directory' in cfg:
+        directory = cfg['directory']
+    elif state_dir is None:
+        logger.error("No usable state directory for the attachment cache. Caching in memory only.")
+        directory = None
+    else:
+        directory = os.path.join(state_dir, 'attachment_cache')
+    if directory:
+        directory = os.path.expanduser(directory)
+    try:
+        return AttachmentCache(
+            directory,
+            memory_max_bytes=int(cfg.get('memory_max_bytes', 32 * 1024 * 1024)),
+            disk_max_bytes=int(cfg.get('disk_max_bytes', 256 * 1024 * 1024)),
+        )
+    except OSError as e:
+        logger.error(f"Cannot use attachment cache directory {directory}: {e}. Caching in memory only.")
+        return AttachmentCache(None, memory_max_bytes=int(cfg.get('memory_max_bytes', 32 * 1024 * 1024)))
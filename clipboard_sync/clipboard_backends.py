@@ -0,0 +1,398 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+import select
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from typing import Optional, List
+
+from .images import IMAGE_MIME_TYPES
+
+logger = logging.getLogger("ClipboardBackend")
+
+try:
+    import pyperclip
+    HAS_PYPERCLIP = True
+except ImportError:
+    HAS_PYPERCLIP = False
+
+
+class ClipboardBackend:
+    """Text clipboard backend used by ClipboardManager when NSPasteboard is not available."""
+
+    name = "base"
+    blocking = True # Calls may block (processes, system APIs), so they run on the clipboard thread
+    image_reader: Optional['CommandImageReader'] = None # Set by create_backend when a desktop tool can read images
+
+    @property
+    def supports_images(self) -> bool:
+        return self.image_reader is not None
+
+    def get_text(self) -> Optional[str]:
+        raise NotImplementedError
+
+    def set_text(self, text: str) -> bool:
+        raise NotImplementedError
+
+    def get_image(self) -> Optional[bytes]:
+        """Returns the encoded image on the clipboard (PNG, JPEG, ...), or None if there is none."""
+        return self.image_reader.get_image() if self.image_reader else None
+
+    def image_change_token(self) -> Optional[str]:
+        """
+        Cheap probe for image changes: a value that differs whenever the clipboard content may
+        have changed, so an unchanged image need not be fetched and hashed again.
+        None if this backend cannot tell.
+        """
+        return self.image_reader.change_token() if self.image_reader else None
+
+    def close(self):
+        """Releases any resources (helper processes, handles) held by the backend."""
+        pass
+
+
+class PyperclipBackend(ClipboardBackend):
+    """pyperclip-based backend. On Linux this spawns xclip/xsel for every call."""
+
+    name = "pyperclip"
+
+    def get_text(self) -> Optional[str]:
+        if not HAS_PYPERCLIP:
+            logger.warning("No method available to get clipboard text.")
+            return None
+        try:
+            return pyperclip.paste()
+        except pyperclip.PyperclipException as e:
+            logger.error(f"Error reading text with pyperclip: {e}")
+            return None
+
+    def set_text(self, text: str) -> bool:
+        if not HAS_PYPERCLIP:
+            return False
+        try:
+            pyperclip.copy(text)
+            return True
+        except pyperclip.PyperclipException as e:
+            logger.error(f"Error setting text with pyperclip: {e}")
+            return False
+        except Exception as e: # Catch potential weirdness like TTY issues
+            logger.error(f"Unexpected error setting text with pyperclip: {e}", exc_info=True)
+            return False
+
+
+class HelperProcessBackend(ClipboardBackend):
+    """
+    Talks to one long-lived helper process (clipboard_sync.clipboard_helper) over a
+    line-delimited JSON request/response protocol, instead of forking per call.
+    The helper is (re)started lazily if it is not running.
+    """
+
+    name = "helper"
+
+    def __init__(self, command: Optional[List[str]] = None, request_timeout: float = 5.0, restart_delay: float = 5.0):
+        self.command = command or [sys.executable, '-m', 'clipboard_sync.clipboard_helper']
+        self.request_timeout = request_timeout
+        self.restart_delay = restart_delay
+        self._process: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+        self._last_start_attempt = 0.0
+        self._offered_types: Optional[List[str]] = None # Targets from the last probe, used by the next get_image
+
+    def start(self) -> bool:
+        """Starts the helper and waits for its ready line. Returns False if it is unusable."""
+        with self._lock:
+            return self._ensure_started(force=True)
+
+    def _ensure_started(self, force: bool = False) -> bool:
+        if self._process and self._process.poll() is None:
+            return True
+        now = time.monotonic()
+        if not force and now - self._last_start_attempt < self.restart_delay:
+            return False
+        self._last_start_attempt = now
+        self._stop_process()
+        try:
+            # Run from the package root so `-m clipboard_sync.clipboard_helper` resolves
+            package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            self._process = subprocess.Popen(
+                self.command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                cwd=package_root,
+            )
+        except OSError as e:
+            logger.error(f"Failed to start clipboard helper {self.command}: {e}")
+            self._process = None
+            return False
+
+        ready = self._read_response()
+        if not ready or not ready.get('ok'):
+            error = ready.get('error') if ready else "no response"
+            logger.error(f"Clipboard helper failed to start: {error}")
+            self._stop_process()
+            return False
+        logger.info(f"Clipboard helper started (PID: {self._process.pid}).")
+        return True
+
+    def _read_response(self) -> Optional[dict]:
+        stdout = self._process.stdout
+        if os.name == 'posix':
+            readable, _, _ = select.select([stdout], [], [], self.request_timeout)
+            if not readable:
+                logger.error(f"Clipboard helper did not respond within {self.request_timeout}s.")
+                return None
+        line = stdout.readline()
+        if not line:
+            return None
+        try:
+            return json.loads(line)
+        except ValueError:
+            logger.error(f"Invalid response from clipboard helper: {line[:200]!r}")
+            return None
+
+    def _request(self, payload: dict) -> Optional[dict]:
+        with self._lock:
+            if not self._ensure_started():
+                return None
+            try:
+                self._process.stdin.write(json.dumps(payload).encode('utf-8') + b'\n')
+                self._process.stdin.flush()
+            except (BrokenPipeError, OSError) as e:
+                logger.error(f"Clipboard helper pipe error: {e}. It will be restarted.")
+                self._stop_process()
+                return None
+            response = self._read_response()
+            if response is None:
+                # Desynchronized or dead helper: restart on next request
+                self._stop_process()
+            return response
+
+    def get_text(self) -> Optional[str]:
+        response = self._request({'op': 'get'})
+        if not response or not response.get('ok'):
+            if response:
+                logger.error(f"Clipboard helper get failed: {response.get('error')}")
+            return None
+        return response.get('text')
+
+    def image_change_token(self) -> Optional[str]:
+        """The selection owner's timestamp, asked of the running helper without spawning anything."""
+        self._offered_types = None
+        if not self.image_reader:
+            return None
+        response = self._request({'op': 'probe'})
+        if not response or not response.get('ok'):
+            return None
+        self._offered_types = response.get('types') or []
+        stamp = response.get('stamp')
+        return str(stamp) if stamp else None
+
+    def get_image(self) -> Optional[bytes]:
+        offered, self._offered_types = self._offered_types, None
+        if not self.image_reader:
+            return None
+        # Targets just reported by the helper spare the reader its listing command
+        return self.image_reader.get_image(offered)
+
+    def set_text(self, text: str) -> bool:
+        response = self._request({'op': 'set', 'text': text})
+        if not response or not response.get('ok'):
+            if response:
+                logger.error(f"Clipboard helper set failed: {response.get('error')}")
+            return False
+        return True
+
+    def _stop_process(self):
+        process, self._process = self._process, None
+        if not process:
+            return
+        try:
+            if process.poll() is None:
+                try:
+                    process.stdin.write(b'{"op": "quit"}\n')
+                    process.stdin.flush()
+                except OSError:
+                    pass
+                try:
+                    process.wait(timeout=1)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+        finally:
+            for stream in (process.stdin, process.stdout):
+                try:
+                    stream.close()
+                except OSError:
+                    pass
+
+    def close(self):
+        with self._lock:
+            self._stop_process()
+
+
+class MemoryBackend(ClipboardBackend):
+    """
+    In-memory clipboard for tests and headless runs.
+    `external_copy` simulates a copy by another application and notifies change listeners,
+    so it can drive event-driven watchers from a script.
+    """
+
+    name = "memory"
+    blocking = False
+    supports_images = True
+
+    def __init__(self, text: Optional[str] = None, image: Optional[bytes] = None):
+        self.text = text
+        self.image = image
+        self.read_count = 0
+        self.image_read_count = 0
+        self.write_count = 0
+        self.change_count = 0
+        self._listeners = []
+
+    def get_text(self) -> Optional[str]:
+        self.read_count += 1
+        return self.text
+
+    def set_text(self, text: str) -> bool:
+        self.write_count += 1
+        self.text = text
+        self.image = None
+        self._emit_change()
+        return True
+
+    def get_image(self) -> Optional[bytes]:
+        self.image_read_count += 1
+        return self.image
+
+    def image_change_token(self) -> Optional[str]:
+        return str(self.change_count)
+
+    def external_copy(self, text: Optional[str]):
+        """Changes the clipboard as another application would."""
+        self.text = text
+        self.image = None
+        self._emit_change()
+
+    def external_copy_image(self, data: bytes):
+        """Puts an encoded image (e.g. a screenshot PNG) on the clipboard as another application would."""
+        self.text = None
+        self.image = data
+        self._emit_change()
+
+    def add_change_listener(self, callback):
+        self._listeners.append(callback)
+
+    def remove_change_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _emit_change(self):
+        self.change_count += 1
+        for callback in list(self._listeners):
+            callback()
+
+
+class CommandImageReader:
+    """
+    Reads image clipboard content with a desktop tool: `wl-paste` on Wayland, `xclip` on X11.
+    The offered MIME types are listed first and the most preferred image type is fetched
+    as-is, so nothing is decoded or re-encoded. `token_command`, if given, prints a value
+    that changes with every copy (the X11 selection timestamp); wl-paste has none.
+    """
+
+    def __init__(self, list_command: List[str], read_command: List[str], timeout: float = 5.0,
+                 token_command: Optional[List[str]] = None):
+        self.list_command = list_command
+        self.read_command = read_command # The MIME type is appended
+        self.token_command = token_command
+        self.timeout = timeout
+
+    def _run(self, command: List[str]) -> Optional[bytes]:
+        try:
+            result = subprocess.run(command, capture_output=True, timeout=self.timeout, check=False)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logger.debug(f"Clipboard image command {command[0]} failed: {e}")
+            return None
+        return result.stdout if result.returncode == 0 else None
+
+    def change_token(self) -> Optional[str]:
+        if not self.token_command:
+            return None
+        output = self._run(self.token_command)
+        # xclip prints the timestamp as raw bytes; an owner without a real timestamp reports 0
+        return output.hex() if output and any(output) else None
+
+    def get_image(self, offered: Optional[List[str]] = None) -> Optional[bytes]:
+        """Fetches the preferred image type; `offered` (the MIME types on the clipboard) skips the listing."""
+        if offered is None:
+            listing = self._run(self.list_command)
+            if not listing:
+                return None
+            offered = listing.decode('utf-8', errors='ignore').split()
+        for mime_type in IMAGE_MIME_TYPES.values():
+            if mime_type in offered:
+                return self._run(self.read_command + [mime_type]) or None
+        return None
+
+
+def find_image_reader(timeout: float = 5.0) -> Optional[CommandImageReader]:
+    """Returns an image reader for this desktop session, if a suitable tool is installed."""
+    if os.environ.get('WAYLAND_DISPLAY') and shutil.which('wl-paste'):
+        return CommandImageReader(['wl-paste', '--list-types'], ['wl-paste', '--no-newline', '--type'], timeout)
+    if os.environ.get('DISPLAY') and shutil.which('xclip'):
+        return CommandImageReader(['xclip', '-selection', 'clipboard', '-t', 'TARGETS', '-o'],
+                                  ['xclip', '-selection', 'clipboard', '-o', '-t'], timeout,
+                                  token_command=['xclip', '-selection', 'clipboard', '-t', 'TIMESTAMP', '-o'])
+    return None
+
+
+def _helper_usable() -> bool:
+    """The Tk helper is only worth it on X11-style desktops; elsewhere pyperclip does not fork."""
+    if not sys.platform.startswith('linux'):
+        return False
+    if not (os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY')):
+        return False
+    try:
+        import tkinter  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def create_backend(name: str = 'auto', clipboard_config: Optional[dict] = None) -> ClipboardBackend:
+    """
+    Creates a clipboard backend by name ('auto', 'pyperclip', 'helper', 'memory').
+    'auto' prefers the persistent helper on Linux desktops and falls back to pyperclip.
+    Images are read with wl-paste/xclip when installed (clipboard.capture_images).
+    """
+    clipboard_config = clipboard_config or {}
+    name = (name or 'auto').lower()
+    if name == 'memory':
+        return MemoryBackend()
+    backend = _create_text_backend(name, clipboard_config)
+    if clipboard_config.get('capture_images', True):
+        backend.image_reader = find_image_reader(float(clipboard_config.get('helper_timeout_seconds', 5.0)))
+    return backend
+
+
+def _create_text_backend(name: str, clipboard_config: dict) -> ClipboardBackend:
+    if name == 'pyperclip':
+        return PyperclipBackend()
+    if name in ('helper', 'auto'):
+        if name == 'auto' and not _helper_usable():
+            return PyperclipBackend()
+        helper = HelperProcessBackend(
+            request_timeout=float(clipboard_config.get('helper_timeout_seconds', 5.0)),
+        )
+        if helper.start():
+            return helper
+        logger.warning("Persistent clipboard helper unavailable. Falling back to pyperclip.")
+        helper.close()
+        return PyperclipBackend()
+    logger.error(f"Unknown clipboard backend '{name}'. Falling back to pyperclip.")
+    return PyperclipBackend()
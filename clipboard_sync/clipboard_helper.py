@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Long-lived clipboard helper process (X11).
+
+Started by HelperProcessBackend as `python -m clipboard_sync.clipboard_helper`.
+Speaks a line-delimited JSON request/response protocol over stdin/stdout:
+
+    -> {"op": "get"}                 <- {"ok": true, "text": "..." | null}
+    -> {"op": "set", "text": "..."}  <- {"ok": true}
+    -> {"op": "probe"}               <- {"ok": true, "stamp": 123 | null, "types": ["image/png", ...]}
+    -> {"op": "ping"}                <- {"ok": true}
+    -> {"op": "quit"}                <- {"ok": true}   (then exits)
+
+Clipboard access goes through Tk, so no xclip/xsel process is spawned per request.
+Staying alive also lets the helper keep ownership of the selection after a `set`,
+which is why xclip has to daemonize after every copy.
+
+`probe` answers what changes cheaply: the selection owner's TIMESTAMP (new for every
+copy) and the offered targets, so the image itself is only fetched when it is new.
+"""
+import json
+import sys
+
+import tkinter
+
+
+class _Helper:
+    def __init__(self):
+        self.root = tkinter.Tk()
+        self.root.withdraw()
+        self.stdin = sys.stdin.buffer
+        self.stdout = sys.stdout.buffer
+
+    def get_text(self):
+        # Prefer UTF8_STRING so non-Latin text survives; fall back to Tk's default target.
+        for target in ('UTF8_STRING', 'STRING'):
+            try:
+                return self.root.clipboard_get(type=target)
+            except tkinter.TclError:
+                continue
+        return None
+
+    def probe(self):
+        try:
+            stamp = int(self.root.clipboard_get(type='TIMESTAMP').split()[0], 0) or None
+        except (tkinter.TclError, ValueError, IndexError):
+            stamp = None # No owner, or one that does not report when it took the selection
+        try:
+            types = self.root.clipboard_get(type='TARGETS').split()
+        except tkinter.TclError:
+            types = []
+        return stamp, types
+
+    def set_text(self, text):
+        self.root.clipboard_clear()
+        self.root.clipboard_append(text)
+        self.root.update()
+
+    def handle(self, request):
+        op = request.get('op')
+        if op == 'get':
+            return {'ok': True, 'text': self.get_text()}
+        if op == 'probe':
+            stamp, types = self.probe()
+            return {'ok': True, 'stamp': stamp, 'types': types}
+        if op == 'set':
+            self.set_text(request.get('text') or '')
+            return {'ok': True}
+        if op in ('ping', 'quit'):
+            return {'ok': True}
+        return {'ok': False, 'error': f"unknown op: {op}"}
+
+    def respond(self, response):
+        self.stdout.write(json.dumps(response).encode('utf-8') + b'\n')
+        self.stdout.flush()
+
+    def on_stdin(self, *_):
+        line = self.stdin.readline()
+        if not line:
+            # Parent went away
+            self.root.quit()
+            return
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            self.respond({'ok': False, 'error': f"bad request: {e}"})
+            return
+        try:
+            self.respond(self.handle(request))
+        except Exception as e:
+            self.respond({'ok': False, 'error': str(e)})
+        if request.get('op') == 'quit':
+            self.root.quit()
+
+    def run(self):
+        # Serve stdin from the Tk event loop so selection requests from other
+        # applications keep being answered between our own requests.
+        self.root.tk.createfilehandler(self.stdin, tkinter.READABLE, self.on_stdin)
+        self.respond({'ok': True, 'ready': True})
+        self.root.mainloop()
+
+
+def main():
+    try:
+        helper = _Helper()
+    except tkinter.TclError as e:
+        sys.stdout.write(json.dumps({'ok': False, 'error': f"Tk unavailable: {e}"}) + '\n')
+        sys.stdout.flush()
+        return 1
+    helper.run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
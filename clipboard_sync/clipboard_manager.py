@@ -1,11 +1,16 @@
 # -*- coding: utf-8 -*-
 import sys
+import asyncio
+import functools
 import logging
 import subprocess
 import tempfile
 import os
-import time
-from typing import Optional, Tuple, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple, NamedTuple, Union
+
+from .images import ClipboardImage, detect_image_format
+from .utils import content_digest
 
 logger = logging.getLogger("ClipboardManager")
 
@@ -13,7 +18,9 @@ logger = logging.getLogger("ClipboardManager")
 try:
     if sys.platform == 'darwin':
         from AppKit import NSPasteboard, NSStringPboardType, NSPasteboardItem, NSData, NSURL, NSPasteboardTypeFileURL, NSPasteboardTypePNG, NSPasteboardTypeTIFF
+        from AppKit import NSBitmapImageRep
         import AppKit # 确保 AppKit 被导入
+        NSBitmapImageFileTypePNG = getattr(AppKit, 'NSBitmapImageFileTypePNG', 4) # NSPNGFileType on older SDKs
         HAS_PYOBJC = True
     else:
         HAS_PYOBJC = False
@@ -21,27 +28,47 @@ except ImportError:
     HAS_PYOBJC = False
 
 # --- Fallback/Cross-platform Text Clipboard ---
-try:
-    import pyperclip
-    HAS_PYPERCLIP = True
-except ImportError:
-    HAS_PYPERCLIP = False
-    if not HAS_PYOBJC: # Only critical if no other clipboard mechanism exists
-        logger.warning("Pyperclip not found. Text clipboard functionality might be limited on non-macOS.")
+from .clipboard_backends import ClipboardBackend, HAS_PYPERCLIP, create_backend
+if not HAS_PYPERCLIP and not HAS_PYOBJC: # Only critical if no other clipboard mechanism exists
+    logger.warning("Pyperclip not found. Text clipboard functionality might be limited on non-macOS.")
+
+
+class ClipboardSnapshot(NamedTuple):
+    """Clipboard state captured in a single call (see ClipboardManager.snapshot)."""
+    change_count: int
+    changed: bool
+    text: Optional[str]
+    digest: Optional[str] # Of the text, or of the image bytes when the clipboard holds an image
+    image: Optional[ClipboardImage] = None
 
 
 class ClipboardManager:
     """
     Manages clipboard interactions, prioritizing macOS native methods
-    and falling back to pyperclip for text if necessary.
+    and falling back to a pluggable text backend (see clipboard_backends) if necessary.
     """
-    def __init__(self, macos_config: Optional[dict] = None):
-        self.is_macos = sys.platform == 'darwin' and HAS_PYOBJC
+    def __init__(self, macos_config: Optional[dict] = None, clipboard_config: Optional[dict] = None,
+                 backend: Optional[ClipboardBackend] = None):
+        self.is_macos = sys.platform == 'darwin' and HAS_PYOBJC and backend is None
         self.macos_config = macos_config or {}
+        self.clipboard_config = clipboard_config or {}
         self.image_support_enabled = self.is_macos and self.macos_config.get('image_support', False)
         self.image_uti_map = self.macos_config.get('image_uti_map', {}) if self.image_support_enabled else {}
+        # TIFF-only pasteboard images are converted to PNG (much smaller, readable everywhere)
+        self.convert_tiff_to_png = self.macos_config.get('convert_tiff_to_png', True)
         self.last_change_count = -1
         self.pasteboard = None
+        # Non-macOS change detection: rolling content digest + synthetic monotonic counter
+        self._change_count = 0
+        self._content_digest: Optional[str] = None
+        # Images are only fetched (and hashed) again when the backend's change token moved or,
+        # for backends without one, when a watcher notification signalled a change
+        self._image_token: Optional[str] = None
+        self.change_notifications = False # Set by the sender while an event-driven watcher runs
+        self._change_signalled = True
+        # All clipboard I/O is serialized on one dedicated thread (NSPasteboard is thread-affine,
+        # and clipboard calls must not queue behind other work in the default pool)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="Clipboard")
 
         if self.is_macos:
             try:
@@ -52,31 +79,114 @@ class ClipboardManager:
                 logger.error(f"Failed to initialize NSPasteboard: {e}. Disabling native macOS support.", exc_info=True)
                 self.is_macos = False # Fallback if init fails
                 self.image_support_enabled = False
-        elif not HAS_PYPERCLIP:
+        elif not HAS_PYPERCLIP and backend is None:
              logger.warning("No suitable clipboard library found (PyObjC for macOS or Pyperclip). Clipboard operations will likely fail.")
 
+        # Text backend: used directly off macOS, and as the fallback when NSPasteboard writes fail
+        if backend is not None:
+            self.backend = backend
+        elif self.is_macos:
+            self.backend = create_backend('pyperclip')
+        else:
+            self.backend = create_backend(self.clipboard_config.get('backend', 'auto'), self.clipboard_config)
+        # Image capture: NSPasteboard on macOS, otherwise whatever the backend can read
+        self.image_capture_enabled = self.image_support_enabled if self.is_macos else self.backend.supports_images
+        if not self.is_macos:
+            logger.info(f"Using '{self.backend.name}' clipboard backend{' (with image capture)' if self.image_capture_enabled else ''}.")
+            # Prime the digest so existing clipboard content is not treated as a new copy (mirrors changeCount on macOS)
+            self.update_last_change_count()
+
     def get_change_count(self) -> int:
-        """Returns the clipboard change count (macOS only)."""
+        """
+        Returns the clipboard change count.
+        On macOS this is NSPasteboard's changeCount; elsewhere it is a synthetic counter
+        that increases whenever the content digest changes.
+        """
         if self.is_macos and self.pasteboard:
             return self.pasteboard.changeCount()
-        return int(time.time()) # Fallback: use timestamp as a crude change indicator
+        self._read_tracked(self.image_capture_enabled)
+        return self._change_count
+
+    async def run_io(self, func, *args):
+        """Runs a blocking clipboard call on the dedicated clipboard thread."""
+        if not self.is_macos and not self.backend.blocking:
+            return func(*args) # Non-blocking backends (e.g. in-memory hub sinks) need no thread hop
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args))
+
+    def snapshot(self, include_images: bool = True) -> ClipboardSnapshot:
+        """
+        Captures change count, text (or, when there is no text, the image) and digest in one
+        call and marks them as seen (updates last_change_count). On macOS content is only read
+        when the change count moved.
+        """
+        include_images = include_images and self.image_capture_enabled
+        if self.is_macos and self.pasteboard:
+            change_count = self.pasteboard.changeCount()
+            if change_count == self.last_change_count:
+                return ClipboardSnapshot(change_count, False, None, None)
+            # Count is read before the content: a copy in between only causes one extra read next time
+            text = self.get_text()
+            image = self.get_image() if include_images and not text else None
+            self.last_change_count = change_count
+            digest = content_digest(image.data) if image else content_digest(text)
+            return ClipboardSnapshot(change_count, True, text, digest, image)
+
+        text, image = self._read_tracked(include_images)
+        if self._change_count == self.last_change_count:
+            return ClipboardSnapshot(self._change_count, False, None, self._content_digest)
+        self.last_change_count = self._change_count
+        return ClipboardSnapshot(self._change_count, True, text, self._content_digest, image)
+
+    def get_content_digest(self) -> Optional[str]:
+        """Returns the digest of the last text or image seen on the clipboard (non-macOS change tracking)."""
+        return self._content_digest
 
     def update_last_change_count(self):
         """Updates the stored change count to the current one."""
         self.last_change_count = self.get_change_count()
 
     def has_changed(self) -> bool:
-        """Checks if the clipboard change count has increased."""
-        if self.is_macos and self.pasteboard:
-             current_change_count = self.pasteboard.changeCount()
-             changed = current_change_count != self.last_change_count
-             # self.last_change_count = current_change_count # Let caller decide when to update
-             return changed
+        """Checks if the clipboard change count differs from the last stored one."""
+        return self.get_change_count() != self.last_change_count
+
+    def _track_content(self, content: Optional[Union[str, bytes]]) -> Optional[str]:
+        """Updates the rolling digest, bumping the synthetic change count when content differs."""
+        digest = content_digest(content)
+        if digest != self._content_digest:
+            self._content_digest = digest
+            self._change_count += 1
+        return digest
+
+    def notify_change(self):
+        """Records a change notification, so the next read fetches the image even without a change token."""
+        self._change_signalled = True
+
+    def _read_tracked(self, include_images: bool = False) -> Tuple[Optional[str], Optional[ClipboardImage]]:
+        """
+        Reads text via the fallback backend, or the image when there is no text, and feeds it
+        to the change tracker. Returns (text, image). An image that cannot have changed since
+        it was last read is not fetched again; the tracked digest then stays as it is.
+        """
+        text = self.backend.get_text()
+        image = None
+        signalled, self._change_signalled = self._change_signalled, False
+        if include_images and not text:
+            token = self.backend.image_change_token()
+            if token is None:
+                unchanged = self.change_notifications and not signalled
+            else:
+                unchanged = token == self._image_token
+            if unchanged:
+                return text, None
+            self._image_token = token
+            data = self.backend.get_image()
+            if data:
+                image = ClipboardImage(data, detect_image_format(data))
         else:
-            # Non-macOS or fallback: cannot reliably detect changes this way
-            # This method becomes less useful without NSPasteboard's changeCount
-            logger.debug("Cannot reliably detect clipboard changes on non-macOS or without PyObjC.")
-            return True # Assume changed if not on macOS with AppKit
+            self._image_token = None
+        self._track_content(image.data if image else text)
+        return text, image
 
     def get_text(self) -> Optional[str]:
         """Gets text content from the clipboard."""
@@ -87,17 +197,38 @@ class ClipboardManager:
                 return text
             # logger.debug("NSStringPboardType not found in pasteboard types.")
             return None
-        elif HAS_PYPERCLIP:
-            try:
-                text = pyperclip.paste()
-                # logger.debug(f"Read text using pyperclip (len: {len(text) if text else 0})")
-                return text
-            except pyperclip.PyperclipException as e:
-                logger.error(f"Error reading text with pyperclip: {e}")
-                return None
-        else:
-            logger.warning("No method available to get clipboard text.")
+        return self._read_tracked(self.image_capture_enabled)[0]
+
+    def get_image(self) -> Optional[ClipboardImage]:
+        """
+        Gets the image on the clipboard as encoded bytes, without decoding it.
+        On macOS PNG data is preferred; TIFF-only images (e.g. copied from some apps) are
+        converted to PNG unless macos.convert_tiff_to_png is off.
+        """
+        if not self.image_capture_enabled:
             return None
+        if not (self.is_macos and self.pasteboard):
+            data = self.backend.get_image()
+            return ClipboardImage(data, detect_image_format(data)) if data else None
+
+        types = self.pasteboard.types()
+        if NSPasteboardTypePNG in types:
+            data = self.pasteboard.dataForType_(NSPasteboardTypePNG)
+            if data:
+                return ClipboardImage(bytes(data), 'png')
+        if NSPasteboardTypeTIFF in types:
+            data = self.pasteboard.dataForType_(NSPasteboardTypeTIFF)
+            if not data:
+                return None
+            if self.convert_tiff_to_png:
+                try:
+                    png = NSBitmapImageRep.imageRepWithData_(data).representationUsingType_properties_(NSBitmapImageFileTypePNG, None)
+                    if png:
+                        return ClipboardImage(bytes(png), 'png')
+                except Exception as e:
+                    logger.warning(f"Could not convert clipboard TIFF to PNG: {e}. Using the TIFF data as-is.")
+            return ClipboardImage(bytes(data), 'tiff')
+        return None
 
     def set_text(self, text: str, source: str = "Receiver") -> bool:
         """Sets text content to the clipboard."""
@@ -120,24 +251,28 @@ class ClipboardManager:
                 success = False # Ensure success is False on exception
 
         # Fallback or if macOS failed
-        if not success and HAS_PYPERCLIP:
-            try:
-                pyperclip.copy(text)
-                logger.info(f"Text (len: {len(text)}) set using pyperclip by {source} (macOS fallback or non-macOS).")
-                success = True
-                # Cannot reliably update change count here
-            except pyperclip.PyperclipException as e:
-                logger.error(f"Error setting text with pyperclip: {e}")
-                success = False
-            except Exception as e: # Catch potential weirdness like TTY issues
-                logger.error(f"Unexpected error setting text with pyperclip: {e}", exc_info=True)
-                success = False
+        if not success:
+            success = self.backend.set_text(text)
+            if success:
+                logger.info(f"Text (len: {len(text)}) set using {self.backend.name} backend by {source} (macOS fallback or non-macOS).")
+                if not self.is_macos:
+                    # Own write: record it so the sender does not see it as a new change
+                    self._track_content(text)
+                    self.last_change_count = self._change_count
 
         if not success:
              logger.error(f"Failed to set clipboard text from {source} using any available method.")
 
         return success
 
+    def close(self):
+        """Releases clipboard backend resources (e.g. the persistent helper process) and the clipboard thread."""
+        if not self.is_macos and not self.backend.blocking:
+            self.backend.close()
+        else:
+            self.executor.submit(self.backend.close)
+        self.executor.shutdown(wait=True)
+
     def set_image_macos(self, image_data: bytes, filename: str, source: str = "Receiver") -> bool:
         """Sets image data to the clipboard (macOS only, using osascript)."""
         if not self.is_macos or not self.image_support_enabled:
@@ -196,12 +331,3 @@ class ClipboardManager:
                     logger.error(f"Error deleting temporary image file {temp_path}: {e}")
 
         return success
-
-    # --- Potentially add get_image() if needed, more complex with NSPasteboard ---
-    # def get_image_macos(self) -> Optional[bytes]:
-    #     """Gets image data from the clipboard (macOS only). More complex."""
-    #     if not self.is_macos or not self.pasteboard:
-    #         return None
-    #     # Check for image types (e.g., NSPasteboardTypePNG, NSPasteboardTypeTIFF)
-    #     # ... implementation needed ...
-    #     pass
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import os
+import shutil
+from typing import Dict, Any, Optional, List
+
+from .clipboard_manager import ClipboardManager
+from .poll_scheduler import AdaptivePollScheduler, FixedPollScheduler
+
+logger = logging.getLogger("ClipboardWatcher")
+
+
+class ClipboardWatcher:
+    """
+    Tells the sender when to look at the clipboard.
+    `wait_for_change` returns once a check is due: after a change notification
+    for event-driven watchers, or after the poll interval for polling ones.
+    """
+
+    name = "base"
+    event_driven = False
+
+    async def start(self):
+        pass
+
+    async def wait_for_change(self) -> bool:
+        """Waits until the clipboard should be checked. Returns True if a change was signalled."""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class PollingWatcher(ClipboardWatcher):
+    """Fallback: checks the clipboard at the interval chosen by a poll scheduler."""
+
+    name = "poll"
+
+    def __init__(self, scheduler: AdaptivePollScheduler):
+        self.scheduler = scheduler
+
+    async def wait_for_change(self) -> bool:
+        await asyncio.sleep(self.scheduler.next_interval())
+        return False
+
+
+class _NotifyingWatcher(ClipboardWatcher):
+    """Shared logic for watchers woken by notifications, with a slow safety poll."""
+
+    event_driven = True
+
+    def __init__(self, fallback_interval: float):
+        self.fallback_interval = fallback_interval
+        self._event: Optional[asyncio.Event] = None
+        self.notifications = 0
+
+    async def start(self):
+        self._event = asyncio.Event()
+
+    def _notify(self):
+        self.notifications += 1
+        self._event.set()
+
+    async def wait_for_change(self) -> bool:
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout=self.fallback_interval)
+        except asyncio.TimeoutError:
+            return False # Safety poll in case a notification was missed
+        # Several notifications while we were busy collapse into one check
+        self._event.clear()
+        return True
+
+
+class CommandWatcher(_NotifyingWatcher):
+    """
+    Runs a helper that prints one line per clipboard change, e.g.
+    `wl-paste --watch echo` (Wayland) or `clipnotify -l` (X11, XFixes).
+    If the helper keeps dying the watcher degrades to polling with the sender's scheduler.
+    """
+
+    name = "command"
+
+    def __init__(self, command: List[str], fallback_interval: float, scheduler: AdaptivePollScheduler, restart_delay: float = 5.0, max_failures: int = 3):
+        super().__init__(fallback_interval)
+        self.command = command
+        self.scheduler = scheduler
+        self.restart_delay = restart_delay
+        self.max_failures = max_failures
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._polling: Optional[PollingWatcher] = None
+
+    async def start(self):
+        await super().start()
+        self._reader_task = asyncio.create_task(self._read_loop(), name="ClipboardWatcher")
+
+    async def _read_loop(self):
+        failures = 0
+        while failures < self.max_failures:
+            try:
+                self._process = await asyncio.create_subprocess_exec(
+                    *self.command,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.DEVNULL,
+                )
+                logger.info(f"Clipboard change notifications via: {' '.join(self.command)} (PID: {self._process.pid})")
+                while True:
+                    line = await self._process.stdout.readline()
+                    if not line:
+                        break
+                    failures = 0
+                    self._notify()
+                return_code = await self._process.wait()
+                logger.warning(f"Clipboard watch helper exited (return code: {return_code}).")
+            except asyncio.CancelledError:
+                raise
+            except OSError as e:
+                logger.error(f"Failed to run clipboard watch helper {self.command}: {e}")
+            failures += 1
+            await asyncio.sleep(self.restart_delay)
+
+        logger.warning(f"Clipboard watch helper failed {failures} times. Falling back to polling every {self.scheduler.min_interval}-{self.scheduler.max_interval}s.")
+        self.event_driven = False
+        self._polling = PollingWatcher(self.scheduler)
+        self._event.set() # Wake a pending wait so it switches to polling now
+
+    async def wait_for_change(self) -> bool:
+        if self._polling:
+            return await self._polling.wait_for_change()
+        return await super().wait_for_change()
+
+    async def close(self):
+        if self._reader_task:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except (asyncio.CancelledError, Exception):
+                pass
+        if self._process and self._process.returncode is None:
+            self._process.terminate()
+            try:
+                await asyncio.wait_for(self._process.wait(), timeout=2)
+            except asyncio.TimeoutError:
+                self._process.kill()
+
+
+class BackendEventWatcher(_NotifyingWatcher):
+    """Subscribes to change callbacks of a backend that emits them (e.g. MemoryBackend in tests)."""
+
+    name = "backend-events"
+
+    def __init__(self, backend, fallback_interval: float):
+        super().__init__(fallback_interval)
+        self.backend = backend
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def start(self):
+        await super().start()
+        self._loop = asyncio.get_running_loop()
+        self.backend.add_change_listener(self._on_backend_change)
+
+    def _on_backend_change(self):
+        # Backends may call this from any thread
+        self._loop.call_soon_threadsafe(self._notify)
+
+    async def close(self):
+        self.backend.remove_change_listener(self._on_backend_change)
+
+
+def find_watch_command() -> Optional[List[str]]:
+    """Returns a change-notification helper command available on this desktop, if any."""
+    if os.environ.get('WAYLAND_DISPLAY') and shutil.which('wl-paste'):
+        return ['wl-paste', '--watch', 'echo']
+    if os.environ.get('DISPLAY') and shutil.which('clipnotify'):
+        return ['clipnotify', '-l']
+    return None
+
+
+def create_watcher(clipboard_manager: ClipboardManager, sender_config: Dict[str, Any],
+                   scheduler: Optional[AdaptivePollScheduler] = None) -> ClipboardWatcher:
+    """
+    Picks the clipboard watcher for the sender.
+    sender.watch_mode: 'auto' (notifications when available, else polling), 'event' or 'poll'.
+    """
+    poll_interval = float(sender_config.get('poll_interval_seconds', 1.0))
+    scheduler = scheduler or FixedPollScheduler(poll_interval)
+    fallback_interval = float(sender_config.get('event_fallback_poll_seconds', 30.0))
+    mode = str(sender_config.get('watch_mode', 'auto')).lower()
+
+    if mode == 'poll':
+        return PollingWatcher(scheduler)
+
+    backend = clipboard_manager.backend
+    if not clipboard_manager.is_macos and hasattr(backend, 'add_change_listener'):
+        return BackendEventWatcher(backend, fallback_interval)
+
+    # NSPasteboard has no change notifications; polling changeCount is cheap there
+    command = None if clipboard_manager.is_macos else find_watch_command()
+    if command:
+        return CommandWatcher(command, fallback_interval, scheduler)
+
+    if mode == 'event':
+        logger.warning("sender.watch_mode is 'event' but no clipboard change notifier is available. Polling instead.")
+    return PollingWatcher(scheduler)
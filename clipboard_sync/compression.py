@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Optional payload compression for clipboard attachments.
+
+The codec is signalled to the receiver through the attachment filename
+(`clipboard_....txt.gz`, `....txt.zst`), since ntfy does not forward custom headers.
+"""
+import gzip
+import logging
+import zlib
+from typing import Optional, Tuple, Dict, Any
+
+logger = logging.getLogger("Compression")
+
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+CODEC_EXTENSIONS = {'gzip': '.gz', 'zstd': '.zst'}
+CODEC_CONTENT_TYPES = {'gzip': 'application/gzip', 'zstd': 'application/zstd'}
+
+# Size of the prefix compressed first to estimate whether a payload is worth compressing
+_SAMPLE_BYTES = 64 * 1024
+
+
+def resolve_codec(codec: str) -> Optional[str]:
+    """Maps a configured codec name ('auto', 'gzip', 'zstd', 'none') to an available codec."""
+    codec = (codec or 'gzip').lower()
+    if codec in ('none', 'off', 'false'):
+        return None
+    if codec == 'auto':
+        return 'zstd' if HAS_ZSTD else 'gzip'
+    if codec == 'zstd' and not HAS_ZSTD:
+        logger.warning("zstd compression requested but 'zstandard' is not installed. Using gzip.")
+        return 'gzip'
+    if codec not in CODEC_EXTENSIONS:
+        logger.warning(f"Unknown compression codec '{codec}'. Using gzip.")
+        return 'gzip'
+    return codec
+
+
+def _compress(data: bytes, codec: str, level: int) -> bytes:
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def compress_payload(data: bytes, codec: Optional[str], min_bytes: int = 16 * 1024,
+                     max_ratio: float = 0.9, level: int = 6) -> Tuple[bytes, Optional[str]]:
+    """
+    Compresses `data` if it is large enough and compresses well.
+    Returns (payload, codec) where codec is None if the data was left as is.
+    A sample of the payload is compressed first so incompressible data is rejected cheaply.
+    """
+    if not codec or len(data) < min_bytes:
+        return data, None
+    if len(data) > 2 * _SAMPLE_BYTES:
+        sample = data[:_SAMPLE_BYTES]
+        if len(_compress(sample, codec, 1)) > len(sample) * max_ratio:
+            logger.debug("Payload sample does not compress well. Sending uncompressed.")
+            return data, None
+    compressed = _compress(data, codec, level)
+    if len(compressed) > len(data) * max_ratio:
+        logger.debug(f"Compression ratio too low ({len(compressed)}/{len(data)}). Sending uncompressed.")
+        return data, None
+    logger.info(f"Compressed payload with {codec}: {len(data)} -> {len(compressed)} bytes.")
+    return compressed, codec
+
+
+def detect_compression(filename: Optional[str], content_type: Optional[str] = None) -> Optional[str]:
+    """Returns the codec a received attachment was compressed with, if any."""
+    if filename:
+        lower_name = filename.lower()
+        for codec, extension in CODEC_EXTENSIONS.items():
+            if lower_name.endswith(extension):
+                return codec
+    if content_type:
+        for codec, codec_type in CODEC_CONTENT_TYPES.items():
+            if content_type.startswith(codec_type):
+                return codec
+    return None
+
+
+def strip_compression_suffix(filename: str) -> str:
+    """'clip.txt.gz' -> 'clip.txt'"""
+    codec = detect_compression(filename)
+    if codec:
+        return filename[:-len(CODEC_EXTENSIONS[codec])]
+    return filename
+
+
+def decompress_payload(data: bytes, codec: str, max_output_bytes: int) -> Optional[bytes]:
+    """
+    Decompresses a received payload, refusing output larger than `max_output_bytes`.
+    Returns None on failure.
+    """
+    try:
+        if codec == 'zstd':
+            if not HAS_ZSTD:
+                logger.error("Received zstd-compressed payload but 'zstandard' is not installed (pip install zstandard).")
+                return None
+            reader = zstandard.ZstdDecompressor().stream_reader(data)
+            output = reader.read(max_output_bytes + 1)
+        else:
+            decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS) # gzip container
+            output = decompressor.decompress(data, max_output_bytes + 1)
+        if len(output) > max_output_bytes:
+            logger.error(f"Decompressed payload exceeds limit of {max_output_bytes} bytes. Discarding.")
+            return None
+        return output
+    except (zlib.error, OSError, ValueError) as e:
+        logger.error(f"Failed to decompress {codec} payload: {e}")
+        return None
+    except Exception as e:
+        if HAS_ZSTD and isinstance(e, zstandard.ZstdError):
+            logger.error(f"Failed to decompress {codec} payload: {e}")
+            return None
+        raise
+
+
+def get_compression_settings(sender_config: Dict[str, Any]) -> Dict[str, Any]:
+    """Reads sender.compression with defaults."""
+    cfg = sender_config.get('compression') or {}
+    enabled = cfg.get('enabled', True)
+    return {
+        'codec': resolve_codec(cfg.get('codec', 'gzip')) if enabled else None,
+        'min_bytes': int(cfg.get('min_bytes', 16 * 1024)),
+        'max_ratio': float(cfg.get('max_ratio', 0.9)),
+        'level': int(cfg.get('level', 6)),
+    }
@@ -4,9 +4,14 @@ import os
 import logging
 from typing import Dict, Any, Optional
 
+from .image_pipeline import OUTPUT_FORMATS
+from .topics import get_topic_names, validate_topics
+
 logger = logging.getLogger(__name__)
 
 DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(__file__), '..', 'config', 'config.yaml')
+DEFAULT_STATE_DIR = os.path.join('~', '.clipboard-sync-ntfy')
+RECEIVE_TRANSPORTS = ("websocket", "json", "sse")
 
 def load_config(config_path: str = DEFAULT_CONFIG_PATH) -> Optional[Dict[str, Any]]:
     """加载 YAML 配置文件"""
@@ -43,22 +48,73 @@ def validate_config(config: Dict[str, Any]) -> bool:
         if not sender_cfg.get('ntfy_topic_url') or "YOUR_SEND_TOPIC_HERE" in sender_cfg['ntfy_topic_url']:
             logger.error("Sender is enabled but 'sender.ntfy_topic_url' is missing or not set.")
             return False
-        if not isinstance(sender_cfg.get('poll_interval_seconds', 1.0), (int, float)) or sender_cfg['poll_interval_seconds'] <= 0:
+        if not isinstance(sender_cfg.get('poll_interval_seconds', 1.0), (int, float)) or sender_cfg.get('poll_interval_seconds', 1.0) <= 0:
             logger.error("Invalid 'sender.poll_interval_seconds'. Must be a positive number.")
             return False
+        for key in ('poll_interval_min_seconds', 'poll_interval_max_seconds'):
+            if key in sender_cfg and (not isinstance(sender_cfg[key], (int, float)) or sender_cfg[key] <= 0):
+                logger.error(f"Invalid 'sender.{key}'. Must be a positive number.")
+                return False
+        image_max_bytes = (sender_cfg.get('images') or {}).get('max_bytes', 1)
+        if not isinstance(image_max_bytes, int) or image_max_bytes <= 0:
+            logger.error("Invalid 'sender.images.max_bytes'. Must be a positive integer.")
+            return False
+        if str(sender_cfg.get('watch_mode', 'auto')).lower() not in ("auto", "event", "poll"):
+            logger.error(f"Invalid 'sender.watch_mode': {sender_cfg['watch_mode']}. Must be one of ['auto', 'event', 'poll'].")
+            return False
 
     # Receiver validation
     receiver_cfg = config.get('receiver')
     if receiver_cfg and receiver_cfg.get('enabled'):
-        if not receiver_cfg.get('ntfy_topic') or "YOUR_RECEIVE_TOPIC_HERE" in receiver_cfg['ntfy_topic']:
-            logger.error("Receiver is enabled but 'receiver.ntfy_topic' is missing or not set.")
+        topics_error = validate_topics(receiver_cfg)
+        if topics_error:
+            logger.error(topics_error)
             return False
         if not receiver_cfg.get('ntfy_server'):
             logger.error("Receiver is enabled but 'receiver.ntfy_server' is missing.")
             return False
-        if not isinstance(receiver_cfg.get('reconnect_delay_seconds', 5), (int, float)) or receiver_cfg['reconnect_delay_seconds'] <= 0:
+        if not isinstance(receiver_cfg.get('reconnect_delay_seconds', 5), (int, float)) or receiver_cfg.get('reconnect_delay_seconds', 5) <= 0:
             logger.error("Invalid 'receiver.reconnect_delay_seconds'. Must be a positive number.")
             return False
+        reconnect_cfg = receiver_cfg.get('reconnect') or {}
+        for key in ('initial_delay_seconds', 'max_delay_seconds'):
+            value = reconnect_cfg.get(key, 1)
+            if not isinstance(value, (int, float)) or value <= 0:
+                logger.error(f"Invalid 'receiver.reconnect.{key}'. Must be a positive number.")
+                return False
+        for key in ('keepalive_interval_seconds', 'websocket_heartbeat_seconds'):
+            value = receiver_cfg.get(key, 1)
+            if not isinstance(value, (int, float)) or value <= 0:
+                logger.error(f"Invalid 'receiver.{key}'. Must be a positive number.")
+                return False
+        if str(receiver_cfg.get('transport', 'websocket')).lower() not in RECEIVE_TRANSPORTS:
+            logger.error(f"Invalid 'receiver.transport': {receiver_cfg['transport']}. Must be one of {list(RECEIVE_TRANSPORTS)}.")
+            return False
+
+    # Image processing validation (sender.images.transcode / receiver.images.transcode)
+    for section in ('sender', 'receiver'):
+        transcode_cfg = ((config.get(section) or {}).get('images') or {}).get('transcode') or {}
+        image_format = str(transcode_cfg.get('format', 'keep')).lower()
+        if image_format not in OUTPUT_FORMATS + ('jpg',):
+            logger.error(f"Invalid '{section}.images.transcode.format': {transcode_cfg['format']}. Must be one of {list(OUTPUT_FORMATS)}.")
+            return False
+        for key in ('max_pixels', 'min_bytes'):
+            value = transcode_cfg.get(key, 0)
+            if not isinstance(value, int) or value < 0:
+                logger.error(f"Invalid '{section}.images.transcode.{key}'. Must be a non-negative integer.")
+                return False
+        quality = transcode_cfg.get('quality', 85)
+        if not isinstance(quality, int) or not 1 <= quality <= 100:
+            logger.error(f"Invalid '{section}.images.transcode.quality'. Must be between 1 and 100.")
+            return False
+
+    # Clipboard backend validation
+    clipboard_cfg = config.get('clipboard')
+    if clipboard_cfg and clipboard_cfg.get('backend'):
+        valid_backends = ["auto", "pyperclip", "helper", "memory"]
+        if str(clipboard_cfg['backend']).lower() not in valid_backends:
+            logger.error(f"Invalid 'clipboard.backend': {clipboard_cfg['backend']}. Must be one of {valid_backends}.")
+            return False
 
     # Logging validation
     log_cfg = config.get('logging')
@@ -85,15 +141,67 @@ def get_logging_config(config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
 def get_macos_config(config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     return config.get('macos') if config else None
 
+def get_state_dir(config: Dict[str, Any]) -> Optional[str]:
+    """
+    Directory for persistent runtime state (outgoing spool, etc.), created on demand.
+    Returns None if it cannot be created; callers then run without that state.
+    """
+    state_dir = os.path.expanduser((config or {}).get('state_dir') or DEFAULT_STATE_DIR)
+    try:
+        os.makedirs(state_dir, exist_ok=True)
+    except OSError as e:
+        logger.error(f"Cannot create state directory {state_dir}: {e}")
+        return None
+    return state_dir
+
+def get_clipboard_config(config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    return config.get('clipboard') if config else None
+
+def get_server_base_url(config: Dict[str, Any]) -> Optional[str]:
+    """HTTP(S) base URL of the receiver's ntfy server (https unless http:// is given)."""
+    rcv_cfg = get_receiver_config(config)
+    server = rcv_cfg.get('ntfy_server') if rcv_cfg else None
+    if not server:
+        return None
+    if server.startswith(("http://", "https://")):
+        return server.rstrip('/')
+    return f"https://{server.rstrip('/')}"
+
+def get_receiver_topic_path(config: Dict[str, Any]) -> Optional[str]:
+    """订阅的主题列表 (ntfy 以逗号分隔多个主题，共用一个连接)"""
+    topics = get_topic_names(get_receiver_config(config))
+    return ','.join(topics) if topics else None
+
+def get_poll_url(config: Dict[str, Any]) -> Optional[str]:
+    """构造 JSON 轮询 URL (用于断线补收)"""
+    base_url = get_server_base_url(config)
+    topic = get_receiver_topic_path(config)
+    if base_url and topic:
+        return f"{base_url}/{topic}/json"
+    return None
+
 def get_websocket_url(config: Dict[str, Any]) -> Optional[str]:
     """构造 WebSocket URL"""
     rcv_cfg = get_receiver_config(config)
     if not rcv_cfg or not rcv_cfg.get('enabled'):
         return None
     server = rcv_cfg.get('ntfy_server')
-    topic = rcv_cfg.get('ntfy_topic')
+    topic = get_receiver_topic_path(config)
     if server and topic:
         protocol = "wss" if not server.startswith("http://") else "ws" # 简单处理 http vs https
         clean_server = server.replace("https://", "").replace("http://", "")
         return f"{protocol}://{clean_server}/{topic}/ws"
-    return None
\ No newline at end of file
+    return None
+
+def get_subscribe_url(config: Dict[str, Any], transport: str = "websocket") -> Optional[str]:
+    """构造订阅 URL: websocket (/ws)、HTTP JSON 流 (/json) 或 SSE (/sse)"""
+    if transport == "websocket":
+        return get_websocket_url(config)
+    rcv_cfg = get_receiver_config(config)
+    if not rcv_cfg or not rcv_cfg.get('enabled'):
+        return None
+    base_url = get_server_base_url(config)
+    topic = get_receiver_topic_path(config)
+    if base_url and topic:
+        return f"{base_url}/{topic}/{transport}"
+    return None
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+import tempfile
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger("Cursor")
+
+
+class ReceiveCursor:
+    """
+    Remembers the last processed ntfy message (ID and timestamp) for a subscription,
+    persisted as a small JSON file so the receiver can resume with `since=<id>` after
+    a reconnect or restart. The cursor is keyed by subscription so changing the
+    configured topic does not resume from an unrelated message.
+    """
+
+    def __init__(self, path: str, subscription: str):
+        self.path = path
+        self.subscription = subscription
+        self.message_id: Optional[str] = None
+        self.message_time: Optional[int] = None
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable receiver cursor {self.path}: {e}")
+            return
+        entry = data.get(self.subscription) if isinstance(data, dict) else None
+        if isinstance(entry, dict):
+            self.message_id = entry.get('id')
+            self.message_time = entry.get('time')
+
+    @property
+    def is_set(self) -> bool:
+        return bool(self.message_id)
+
+    def advance(self, message: Dict[str, Any]) -> bool:
+        """Moves the cursor to `message` if it is newer. Returns True if it moved."""
+        message_id = message.get('id')
+        message_time = message.get('time')
+        if not message_id:
+            return False
+        if self.message_time is not None and message_time is not None and message_time < self.message_time:
+            return False
+        self.message_id = message_id
+        self.message_time = message_time
+        return True
+
+    def save(self):
+        """Atomically writes the cursor (blocking; run it in an executor)."""
+        try:
+            data = {}
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                except (OSError, ValueError):
+                    data = {}
+                if not isinstance(data, dict):
+                    data = {} # Valid JSON but not ours (e.g. a list): start over
+            data[self.subscription] = {'id': self.message_id, 'time': self.message_time}
+            directory = os.path.dirname(self.path) or '.'
+            fd, temp_path = tempfile.mkstemp(prefix='.cursor-', dir=directory)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.error(f"Failed to persist receiver cursor to {self.path}: {e}")
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+import collections
+import logging
+import re
+import time
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from .utils import content_digest
+
+logger = logging.getLogger("Dedupe")
+
+# Attachment filenames from our sender carry the content digest: clipboard_<date>_<time>_<digest>.txt[.gz]
+_FILENAME_DIGEST_RE = re.compile(r'_([0-9a-f]{32})(?:\.[A-Za-z0-9]+)+$')
+
+
+def digest_from_filename(filename: Optional[str]) -> Optional[str]:
+    """Extracts the content digest embedded in an attachment filename by our sender, if any."""
+    if not filename:
+        return None
+    match = _FILENAME_DIGEST_RE.search(filename)
+    return match.group(1) if match else None
+
+
+class BoundedTTLSet:
+    """
+    Set with fixed capacity whose entries expire after `ttl` seconds.
+    When full, the oldest entry is evicted. Memory use is bounded by `max_entries`.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: "collections.OrderedDict[Hashable, float]" = collections.OrderedDict()
+
+    def _expire(self, now: float):
+        while self._entries:
+            key, expires_at = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            del self._entries[key]
+
+    def add(self, key: Hashable):
+        now = self.clock()
+        self._expire(now)
+        if key in self._entries:
+            del self._entries[key] # Re-insert at the end with a fresh expiry
+        self._entries[key] = now + self.ttl
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __contains__(self, key: Hashable) -> bool:
+        expires_at = self._entries.get(key)
+        if expires_at is None:
+            return False
+        if expires_at <= self.clock():
+            del self._entries[key]
+            return False
+        return True
+
+    def discard(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        self._expire(self.clock())
+        return len(self._entries)
+
+
+class MessageDedupeCache:
+    """
+    Recognises ntfy messages that were already handled, before any download or clipboard write.
+
+    - By message ID: reconnect replays, since= catch-up and overlapping subscriptions
+      deliver the same message ID again.
+    - By content digest: the same content published twice back to back (e.g. a sender retry
+      after a lost response) within `content_window` seconds. Only the most recent content
+      is compared, so copying A, then B, then A again still applies A.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600.0, content_window: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.content_window = content_window
+        self._message_ids = BoundedTTLSet(max_entries, ttl, clock)
+        self._last_content_key: Optional[str] = None
+        self._last_content_time = 0.0
+        self.id_hits = 0
+        self.content_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def content_key(message: Dict[str, Any]) -> Optional[str]:
+        """Digest identifying the message content without downloading anything."""
+        attachment = message.get('attachment')
+        if isinstance(attachment, dict):
+            return digest_from_filename(attachment.get('name'))
+        body = message.get('message')
+        return content_digest(body) if body else None
+
+    def is_duplicate(self, message: Dict[str, Any]) -> bool:
+        """Checks a message and records it as seen. Returns True for duplicates."""
+        message_id = message.get('id')
+        if message_id and message_id in self._message_ids:
+            self.id_hits += 1
+            return True
+        if message_id:
+            self._message_ids.add(message_id)
+
+        now = self.clock()
+        content_key = self.content_key(message)
+        if content_key:
+            if content_key == self._last_content_key and now - self._last_content_time < self.content_window:
+                self.content_hits += 1
+                self._last_content_time = now
+                return True
+            self._last_content_key = content_key
+            self._last_content_time = now
+
+        self.misses += 1
+        return False
+
+    def mark_seen(self, message: Dict[str, Any]):
+        """
+        Records only the message ID, e.g. for messages skipped without being applied. The
+        content key is left alone, so the content that is applied next is not taken for a repeat.
+        """
+        message_id = message.get('id')
+        if message_id:
+            self._message_ids.add(message_id)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'id_hits': self.id_hits,
+            'content_hits': self.content_hits,
+            'misses': self.misses,
+            'tracked_ids': len(self._message_ids),
+        }
+
+
+def create_dedupe_cache(receiver_config: Dict[str, Any]) -> MessageDedupeCache:
+    cfg = receiver_config.get('dedupe') or {}
+    return MessageDedupeCache(
+        max_entries=int(cfg.get('max_entries', 1024)),
+        ttl=float(cfg.get('ttl_seconds', 3600)),
+        content_window=float(cfg.get('content_window_seconds', 60)),
+    )
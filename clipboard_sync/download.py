@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import logging
+import mmap
+import tempfile
+from typing import Optional, Union
+
+logger = logging.getLogger("Download")
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+
+class DownloadTooLarge(Exception):
+    """Raised when an attachment exceeds the configured download limit."""
+
+
+class DownloadBuffer:
+    """
+    Destination of a streamed attachment download.
+
+    Chunks are collected in memory until `spill_threshold` bytes, then moved to an anonymous
+    temporary file, so a large image does not have to fit in RAM. getbuffer() exposes the
+    content as a memoryview (memory-mapped once spilled), which decompression, text decoding,
+    hashing and file writes all accept without copying. Call close() when done.
+    """
+
+    def __init__(self, spill_threshold: int = 8 * 1024 * 1024, max_bytes: Optional[int] = None):
+        self.spill_threshold = spill_threshold
+        self.max_bytes = max_bytes
+        self._memory: Optional[BytesLike] = bytearray()
+        self._file = None
+        self._mmap: Optional[mmap.mmap] = None
+        self.size = 0
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "DownloadBuffer":
+        """Wraps already available content (e.g. a cache hit) without copying it."""
+        buffer = cls()
+        buffer._memory = data
+        buffer.size = len(data)
+        return buffer
+
+    @property
+    def spilled(self) -> bool:
+        return self._file is not None
+
+    def write(self, chunk: BytesLike):
+        if self.max_bytes is not None and self.size + len(chunk) > self.max_bytes:
+            raise DownloadTooLarge(f"download exceeds limit of {self.max_bytes} bytes")
+        if self._file is None and self.size + len(chunk) > self.spill_threshold:
+            self._file = tempfile.TemporaryFile(prefix='clipboard-sync-download-')
+            self._file.write(self._memory)
+            self._memory = None
+            logger.debug(f"Download larger than {self.spill_threshold} bytes; spilling to a temporary file.")
+        if self._file is not None:
+            self._file.write(chunk)
+        else:
+            self._memory += chunk
+        self.size += len(chunk)
+
+    def getbuffer(self) -> memoryview:
+        """Read-only view of the downloaded content."""
+        if self._file is None:
+            return memoryview(self._memory).toreadonly()
+        if self.size == 0:
+            return memoryview(b'')
+        if self._mmap is None:
+            self._file.flush()
+            self._mmap = mmap.mmap(self._file.fileno(), self.size, access=mmap.ACCESS_READ)
+        return memoryview(self._mmap)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def close(self):
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # A view is still referenced somewhere; the map is released with it
+                logger.debug("Download buffer still referenced at close; leaving it to the garbage collector.")
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._memory = None
+
+    def __enter__(self) -> "DownloadBuffer":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
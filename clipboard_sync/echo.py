@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+from typing import Any, Callable, Dict, Optional
+
+from .dedupe import BoundedTTLSet
+
+logger = logging.getLogger("EchoSuppressor")
+
+
+class EchoSuppressor:
+    """
+    Loop prevention shared by ClipboardSender and NtfyReceiver.
+
+    The receiver remembers the digest of every text or image it writes to the clipboard;
+    when the sender then sees that content on the clipboard it is recognised as an echo
+    and not sent back. Only digests are kept, each for `ttl` seconds, in bounded memory,
+    so several items arriving back to back are all covered.
+
+    The clipboard manager usually hides the receiver's own writes from the sender, so most
+    entries are never looked up. Once the sender sees any other local change the user has
+    copied over what was received, and the table is cleared (`clear`); otherwise copying
+    received content again later would be taken for an echo and dropped.
+    """
+
+    def __init__(self, max_entries: int = 64, ttl: float = 300.0, clock: Callable[[], float] = time.monotonic):
+        self._digests = BoundedTTLSet(max_entries, ttl, clock)
+        self.remembered_count = 0
+        self.suppressed_count = 0
+        self.cleared_count = 0
+
+    def remember(self, digest: Optional[str]):
+        """Records content written to the clipboard by the receiver."""
+        if digest:
+            self._digests.add(digest)
+            self.remembered_count += 1
+
+    def is_echo(self, digest: Optional[str]) -> bool:
+        """
+        Returns True if `digest` is content the receiver wrote. The entry is consumed, so a
+        later deliberate copy of the same content by the user is sent normally.
+        """
+        if not digest or digest not in self._digests:
+            return False
+        self._digests.discard(digest)
+        self.suppressed_count += 1
+        return True
+
+    def clear(self):
+        """Forgets all remembered content, e.g. after the user copied something else."""
+        if len(self._digests):
+            self._digests.clear()
+            self.cleared_count += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'tracked': len(self._digests),
+            'remembered': self.remembered_count,
+            'suppressed': self.suppressed_count,
+            'cleared': self.cleared_count,
+        }
+
+
+def create_echo_suppressor(config: Dict[str, Any]) -> EchoSuppressor:
+    cfg = (config or {}).get('echo_suppression') or {}
+    return EchoSuppressor(
+        max_entries=int(cfg.get('max_entries', 64)),
+        ttl=float(cfg.get('ttl_seconds', 300)),
+    )
+
+
+def get_echo_suppressor(shared_state: Dict, config: Dict[str, Any]) -> EchoSuppressor:
+    """Returns the suppressor in shared_state, creating it there if the caller did not."""
+    suppressor = shared_state.get('echo_suppressor')
+    if suppressor is None:
+        suppressor = create_echo_suppressor(config)
+        shared_state['echo_suppressor'] = suppressor
+    return suppressor
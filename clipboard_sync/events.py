@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Parsing of ntfy subscription frames.
+
+Most frames on a subscription are control events (keepalive, open, poll_request) that the
+receiver only logs. Their type is read straight from the frame text without decoding the
+JSON; only 'message' events (and anything unrecognised) are fully decoded, with orjson
+when it is installed and the standard library otherwise.
+"""
+import json
+import logging
+import re
+from typing import Any, Callable, Optional, Tuple, Union
+
+logger = logging.getLogger("Events")
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+Frame = Union[str, bytes]
+
+# Events the receiver handles from their type alone
+CONTROL_EVENTS = frozenset({'keepalive', 'open', 'poll_request'})
+
+# An unescaped '"event":"' can only be an object key: quotes inside JSON strings are escaped
+_EVENT_RE = re.compile(r'"event"\s*:\s*"([a-z_]+)"')
+_EVENT_RE_BYTES = re.compile(rb'"event"\s*:\s*"([a-z_]+)"')
+
+
+def resolve_decoder(name: str = 'auto') -> Callable[[Frame], Any]:
+    """Maps a configured decoder name ('auto', 'orjson', 'stdlib') to a loads() function."""
+    name = (name or 'auto').lower()
+    if name == 'stdlib':
+        return json.loads
+    if name not in ('auto', 'orjson'):
+        logger.warning(f"Unknown JSON decoder '{name}'. Using auto.")
+    elif name == 'orjson' and not HAS_ORJSON:
+        logger.warning("orjson decoder requested but 'orjson' is not installed. Using the standard library.")
+    return orjson.loads if HAS_ORJSON else json.loads
+
+
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers catch the latter for both
+loads = resolve_decoder()
+
+
+def peek_event(frame: Frame) -> Optional[str]:
+    """Returns the event type named in a frame without decoding it, or None if not found."""
+    match = (_EVENT_RE_BYTES if isinstance(frame, bytes) else _EVENT_RE).search(frame)
+    if not match:
+        return None
+    event = match.group(1)
+    return event.decode('ascii') if isinstance(event, bytes) else event
+
+
+def parse_frame(frame: Frame, decode: Callable[[Frame], Any] = loads) -> Tuple[Optional[str], Optional[dict]]:
+    """
+    Returns (event, data) for a subscription frame. Control events come back with data None
+    and are not decoded; other frames are decoded in full and their type read from the data.
+    Raises json.JSONDecodeError for frames that are not valid JSON.
+    """
+    event = peek_event(frame)
+    if event in CONTROL_EVENTS:
+        return event, None
+    data = decode(frame)
+    if not isinstance(data, dict):
+        return None, None
+    return data.get('event'), data
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+Hub mode: many clipboards (tenants) served by one process, one event loop and one
+aiohttp session.
+
+Each tenant is an ordinary ClipboardSender/NtfyReceiver pair with its own config,
+clipboard sink, NtfyClient, state directory and echo suppressor, so tenants never see
+each other's content or loop-prevention state. Downloaded attachments go to one cache
+shared by all tenants (the hub's `attachment_cache` section), so its memory and disk
+bounds hold for the whole hub rather than for each tenant. Clipboard sinks are ClipboardBackends,
+chosen by `clipboard_sink`: a backend name ('memory' by default) or 'module:factory',
+a callable taking (tenant_name, tenant_config) and returning a ClipboardBackend.
+"""
+import asyncio
+import contextvars
+import copy
+import importlib
+import logging
+import os
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+import aiohttp
+import yaml
+
+from .attachment_cache import AttachmentCache, AttachmentCacheView, create_attachment_cache
+from .clipboard_backends import ClipboardBackend, create_backend
+from .clipboard_manager import ClipboardManager
+from .config import DEFAULT_STATE_DIR, get_clipboard_config, get_state_dir, validate_config
+from .echo import create_echo_suppressor
+from .ntfy_client import NtfyClient
+from .receiver import NtfyReceiver
+from .sender import ClipboardSender
+from .transports import get_warmup_origins
+
+logger = logging.getLogger("Hub")
+
+TENANT_NAME_RE = re.compile(r'^[-_A-Za-z0-9][-_.A-Za-z0-9]{0,63}$') # Also used as a directory name
+
+# Name of the tenant whose task is running; inherited by every task a tenant starts
+current_tenant: contextvars.ContextVar[str] = contextvars.ContextVar('tenant', default='-')
+
+SinkFactory = Callable[[str, Dict[str, Any]], ClipboardBackend]
+
+
+class TenantLogFilter(logging.Filter):
+    """Adds `record.tenant`, so hub log lines can be told apart by tenant."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.tenant = current_tenant.get()
+        return True
+
+
+def load_hub_config(path: str) -> Optional[Dict[str, Any]]:
+    """Loads the hub YAML file (top-level settings, `defaults` and a `tenants` list)."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            hub_config = yaml.safe_load(f)
+    except (OSError, yaml.YAMLError) as e:
+        logger.error(f"Cannot load hub configuration {path}: {e}")
+        return None
+    if not isinstance(hub_config, dict) or not isinstance(hub_config.get('tenants'), list):
+        logger.error(f"Hub configuration {path} must be a mapping with a 'tenants' list.")
+        return None
+    return hub_config
+
+
+def _merge(base: Dict[str, Any], override: Dict[str, Any]) -> Dict[str, Any]:
+    merged = copy.deepcopy(base)
+    for key, value in (override or {}).items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+
+def build_tenant_config(hub_config: Dict[str, Any], tenant_entry: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    A tenant's config in the single-user format: hub `defaults` overlaid with the tenant's
+    own sections. Network settings are the hub's (one shared session); state lives in a
+    per-tenant directory under the hub's state_dir.
+    """
+    name = tenant_entry['name']
+    config = _merge(hub_config.get('defaults') or {}, {k: v for k, v in tenant_entry.items() if k != 'name'})
+    config['network'] = hub_config.get('network') or {}
+    config.setdefault('state_dir', os.path.join(get_hub_state_dir(hub_config), 'tenants', name))
+    for section in ('sender', 'receiver'):
+        config.setdefault(section, {}).setdefault('enabled', False)
+    return config
+
+
+def get_hub_state_dir(hub_config: Dict[str, Any]) -> str:
+    return hub_config.get('state_dir') or os.path.join(DEFAULT_STATE_DIR, 'hub')
+
+
+def resolve_sink_factory(spec: Optional[str]) -> SinkFactory:
+    """Maps `clipboard_sink` to a factory: a backend name, or 'module:callable'."""
+    spec = spec or 'memory'
+    if ':' not in spec:
+        return lambda name, config: create_backend(spec, get_clipboard_config(config))
+    module_name, _, attr = spec.partition(':')
+    factory = getattr(importlib.import_module(module_name), attr)
+    if not callable(factory):
+        raise TypeError(f"clipboard_sink '{spec}' is not callable")
+    return factory
+
+
+class Tenant:
+    """One sender/receiver pair with its own clipboard sink, state and echo suppression."""
+
+    def __init__(self, name: str, config: Dict[str, Any], sink: ClipboardBackend, session: aiohttp.ClientSession,
+                 attachment_cache: Optional[AttachmentCache] = None):
+        self.name = name
+        self.config = config
+        self.sink = sink
+        token = current_tenant.set(name) # Tag the components' startup log lines
+        try:
+            self.clipboard = ClipboardManager(config.get('macos') or {}, get_clipboard_config(config), backend=sink)
+            cache_view = AttachmentCacheView(attachment_cache, name) if attachment_cache else None
+            self.ntfy_client = NtfyClient(config, attachment_cache=cache_view)
+            # Per-tenant shared state: echo suppression never crosses tenants
+            self.shared_state: Dict[str, Any] = {
+                'echo_suppressor': create_echo_suppressor(config),
+                '_last_remote_activity': None,
+            }
+            self.sender = ClipboardSender(config, self.clipboard, self.ntfy_client, self.shared_state, session)
+            self.receiver = NtfyReceiver(config, self.clipboard, self.ntfy_client, self.shared_state, session)
+        finally:
+            current_tenant.reset(token)
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.sender.enabled or self.receiver.enabled
+
+    def start(self):
+        self.task = asyncio.create_task(self._run(), name=f"Tenant-{self.name}")
+
+    async def _run(self):
+        current_tenant.set(self.name) # Copied into every task the sender and receiver create
+        components = [c.run() for c in (self.sender, self.receiver) if c.enabled]
+        results = await asyncio.gather(*components, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Tenant component failed: {result}", exc_info=result)
+
+    async def stop(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+        self.clipboard.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'echo': self.shared_state['echo_suppressor'].stats(),
+            'receiver_pipeline': self.receiver.pipeline.stats(),
+            'receiver_connection': self.receiver.connection_stats.stats(),
+        }
+
+
+class ClipboardHub:
+    """Builds tenants from the hub config and runs them all on the current event loop."""
+
+    def __init__(self, hub_config: Dict[str, Any], session: aiohttp.ClientSession,
+                 sink_factory: Optional[SinkFactory] = None):
+        self.hub_config = hub_config
+        self.session = session
+        self.sink_factory = sink_factory or resolve_sink_factory(hub_config.get('clipboard_sink'))
+        self.tenants: Dict[str, Tenant] = {}
+        self.attachment_cache: Optional[AttachmentCache] = None
+
+    def tenant_configs(self) -> Dict[str, Dict[str, Any]]:
+        """Valid tenant configs by name; invalid or duplicate entries are logged and skipped."""
+        configs: Dict[str, Dict[str, Any]] = {}
+        for entry in self.hub_config.get('tenants') or []:
+            name = entry.get('name') if isinstance(entry, dict) else None
+            if not name or not TENANT_NAME_RE.match(str(name)):
+                logger.error(f"Skipping tenant with a missing or invalid name: {entry!r}")
+                continue
+            if name in configs:
+                logger.error(f"Skipping duplicate tenant '{name}'.")
+                continue
+            config = build_tenant_config(self.hub_config, entry)
+            if not validate_config(config):
+                logger.error(f"Skipping tenant '{name}': invalid configuration.")
+                continue
+            configs[name] = config
+        return configs
+
+    def build(self, configs: Optional[Dict[str, Dict[str, Any]]] = None):
+        configs = configs if configs is not None else self.tenant_configs()
+        if any((config.get('receiver') or {}).get('enabled') for config in configs.values()):
+            # One cache, bounded once, for every tenant's downloads
+            state_dir = get_state_dir({'state_dir': get_hub_state_dir(self.hub_config)})
+            self.attachment_cache = create_attachment_cache(self.hub_config, state_dir)
+        for name, config in configs.items():
+            try:
+                tenant = Tenant(name, config, self.sink_factory(name, config), self.session, self.attachment_cache)
+            except Exception as e:
+                logger.error(f"Skipping tenant '{name}': setup failed: {e}", exc_info=True)
+                continue
+            if tenant.enabled:
+                self.tenants[name] = tenant
+            else:
+                logger.warning(f"Tenant '{name}' has neither sender nor receiver enabled. Skipping it.")
+                tenant.clipboard.close()
+        logger.info(f"Hub configured with {len(self.tenants)} tenant(s).")
+
+    def start(self):
+        for tenant in self.tenants.values():
+            tenant.start()
+
+    async def stop(self):
+        await asyncio.gather(*(tenant.stop() for tenant in self.tenants.values()), return_exceptions=True)
+        logger.info("All hub tenants stopped.")
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: tenant.stats() for name, tenant in self.tenants.items()}
+
+
+def get_hub_warmup_origins(configs: Dict[str, Dict[str, Any]]) -> List[str]:
+    """Distinct ntfy servers used by all tenants, warmed up once for the shared session."""
+    return list(dict.fromkeys(origin for config in configs.values() for origin in get_warmup_origins(config)))
+
+
+def install_tenant_logging():
+    """Prefixes log lines with the tenant they belong to ('-' for the hub itself)."""
+    for handler in logging.getLogger().handlers:
+        handler.addFilter(TenantLogFilter())
+        handler.setFormatter(logging.Formatter(
+            '%(asctime)s - %(levelname)s - [%(tenant)s] [%(name)s] - %(message)s', datefmt='%Y-%m-%d %H:%M:%S'))
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+Image processing stage for clipboard images: optional downscaling above a pixel cap,
+recompression (optimized PNG, WebP or JPEG) and metadata stripping, configured per
+direction (sender.images.transcode before upload, receiver.images.transcode before the
+image is put on the clipboard).
+
+Decoding and re-encoding a multi-megapixel screenshot costs hundreds of milliseconds of
+CPU, so the work runs in a process pool shared by every sender and receiver in the process
+(hub tenants included); the event loop only awaits the result. Requires Pillow
+(pip install Pillow); without it images pass through unchanged.
+"""
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from .download import BytesLike
+from .images import detect_image_format
+
+logger = logging.getLogger("ImagePipeline")
+
+try:
+    from PIL import Image
+    HAS_PIL = True
+except ImportError:
+    HAS_PIL = False
+
+OUTPUT_FORMATS = ('keep', 'png', 'webp', 'jpeg')
+_PIL_FORMATS = {'png': 'PNG', 'webp': 'WEBP', 'jpeg': 'JPEG'}
+# Metadata that says nothing about how the pixels look (EXIF incl. GPS, XMP, comments, PNG text)
+_METADATA_KEYS = ('exif', 'xmp', 'XML:com.adobe.xmp', 'comment', 'photoshop')
+
+
+class ImagePolicy(NamedTuple):
+    """What to do with images in one direction."""
+    max_pixels: int # Downscale above this many pixels, keeping the aspect ratio; 0 = never
+    output_format: str # 'keep' (PNG for formats other than PNG/JPEG/WebP), 'png', 'webp' or 'jpeg'
+    quality: int # WebP/JPEG quality
+    strip_metadata: bool
+    min_bytes: int # Smaller images within the pixel cap are only re-encoded to change format or strip metadata
+
+
+class TranscodeResult(NamedTuple):
+    data: bytes
+    format: str
+    source_size: Tuple[int, int]
+    size: Tuple[int, int]
+
+
+def _target_format(policy: ImagePolicy, source_format: Optional[str]) -> str:
+    if policy.output_format != 'keep':
+        return policy.output_format
+    return source_format if source_format in _PIL_FORMATS else 'png'
+
+
+def _has_metadata(image: "Image.Image") -> bool:
+    return any(key in image.info for key in _METADATA_KEYS) or bool(getattr(image, 'text', None))
+
+
+def _prepare_mode(image: "Image.Image", target: str) -> "Image.Image":
+    """Converts to a mode the resampler and the target encoder both handle."""
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+    if target == 'jpeg':
+        if has_alpha:
+            rgba = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(rgba, mask=rgba.getchannel('A'))
+            return background
+        return image if image.mode in ('RGB', 'L') else image.convert('RGB')
+    if image.mode in ('RGB', 'RGBA', 'L'):
+        return image
+    return image.convert('RGBA' if has_alpha else 'RGB')
+
+
+def transcode_image(data: bytes, policy: ImagePolicy) -> Optional[TranscodeResult]:
+    """
+    Runs in a worker process. Returns the processed image, or None when the original should
+    be kept: nothing to do, an animated image, or re-encoding would not make it smaller.
+    """
+    source_format = detect_image_format(data)
+    target = _target_format(policy, source_format)
+    with Image.open(io.BytesIO(data)) as image:
+        source_size = image.size
+        width, height = source_size
+        downscale = bool(policy.max_pixels) and width * height > policy.max_pixels
+        strip = policy.strip_metadata and _has_metadata(image)
+        if not downscale and not strip and target == source_format and len(data) < policy.min_bytes:
+            return None
+        if getattr(image, 'n_frames', 1) > 1:
+            return None # Animated GIF/WebP: re-encoding would drop the animation
+
+        image.load()
+        converted = _prepare_mode(image, target)
+        if downscale:
+            factor = (policy.max_pixels / (width * height)) ** 0.5
+            converted = converted.resize((max(1, int(width * factor)), max(1, int(height * factor))), Image.LANCZOS)
+
+        options: Dict[str, Any] = {}
+        icc_profile = image.info.get('icc_profile')
+        if icc_profile:
+            options['icc_profile'] = icc_profile # Colour profile is kept even when stripping metadata
+        if not policy.strip_metadata and image.info.get('exif'):
+            options['exif'] = image.info['exif']
+        if target == 'png':
+            options['optimize'] = True
+        elif target == 'jpeg':
+            options.update(quality=policy.quality, optimize=True, progressive=True)
+        else:
+            options.update(quality=policy.quality, method=4)
+
+        output = io.BytesIO()
+        converted.save(output, _PIL_FORMATS[target], **options)
+        encoded = output.getvalue()
+        size = converted.size
+
+    if not downscale and not strip and target == source_format and len(encoded) >= len(data):
+        return None
+    return TranscodeResult(encoded, target, source_size, size)
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool(workers: int) -> ProcessPoolExecutor:
+    """The process pool shared by all pipelines, started on first use."""
+    global _pool
+    if _pool is None:
+        # spawn, not fork: this process runs an event loop and helper threads
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        logger.info(f"Started image processing pool with {workers} worker process(es).")
+    return _pool
+
+
+def shutdown_process_pool():
+    global _pool
+    pool, _pool = _pool, None
+    if pool:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+class ImagePipeline:
+    """Applies one direction's ImagePolicy to images on the shared process pool."""
+
+    def __init__(self, policy: ImagePolicy, direction: str, workers: int = 2, timeout: float = 30.0):
+        self.policy = policy
+        self.direction = direction
+        self.workers = workers
+        self.timeout = timeout
+        self.processed_count = 0
+        self.unchanged_count = 0
+        self.failed_count = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    async def process(self, data: BytesLike) -> Optional[TranscodeResult]:
+        """Processes an encoded image. Returns None if the original should be used as-is."""
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            future = loop.run_in_executor(get_process_pool(self.workers), transcode_image, bytes(data), self.policy)
+            result = await asyncio.wait_for(future, timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.failed_count += 1
+            logger.warning(f"Processing a {len(data)} byte image ({self.direction}) took longer than {self.timeout}s. Using it unchanged.")
+            return None
+        except asyncio.CancelledError:
+            raise
+        except BrokenProcessPool as e:
+            self.failed_count += 1
+            logger.error(f"Image processing pool failed: {e}. It will be restarted; using the image unchanged.")
+            shutdown_process_pool()
+            return None
+        except Exception as e: # Undecodable image, decompression bomb guard
+            self.failed_count += 1
+            logger.warning(f"Could not process {len(data)} byte image ({self.direction}): {e}. Using it unchanged.")
+            return None
+
+        if result is None:
+            self.unchanged_count += 1
+            logger.debug(f"Image ({self.direction}, {len(data)} bytes) left unchanged by the image pipeline.")
+            return None
+        self.processed_count += 1
+        self.bytes_in += len(data)
+        self.bytes_out += len(result.data)
+        (w, h), (nw, nh) = result.source_size, result.size
+        logger.info(f"Processed image ({self.direction}): {w}x{h} {detect_image_format(data) or '?'} {len(data)} bytes"
+                    f" -> {nw}x{nh} {result.format} {len(result.data)} bytes in {time.perf_counter() - started:.2f}s.")
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'processed': self.processed_count,
+            'unchanged': self.unchanged_count,
+            'failed': self.failed_count,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+        }
+
+
+def get_image_policy(transcode_cfg: Dict[str, Any]) -> ImagePolicy:
+    output_format = str(transcode_cfg.get('format', 'keep')).lower()
+    if output_format == 'jpg':
+        output_format = 'jpeg'
+    return ImagePolicy(
+        max_pixels=int(transcode_cfg.get('max_pixels', 0)),
+        output_format=output_format,
+        quality=int(transcode_cfg.get('quality', 85)),
+        strip_metadata=bool(transcode_cfg.get('strip_metadata', True)),
+        min_bytes=int(transcode_cfg.get('min_bytes', 512 * 1024)),
+    )
+
+
+def create_image_pipeline(config: Dict[str, Any], direction: str) -> Optional[ImagePipeline]:
+    """
+    Builds the pipeline for 'sender' or 'receiver' from <direction>.images.transcode, or returns
+    None if it is disabled or Pillow is missing. Off by default: re-encoding costs seconds of
+    CPU per screenshot and changes the bytes that are shared, so images go out as captured
+    unless it is turned on.
+    """
+    transcode_cfg = ((config.get(direction) or {}).get('images') or {}).get('transcode') or {}
+    if not transcode_cfg.get('enabled', False):
+        return None
+    if not HAS_PIL:
+        logger.warning(f"Image processing ({direction}) needs Pillow (pip install Pillow). Images are used unchanged.")
+        return None
+    pipeline_cfg = config.get('image_pipeline') or {}
+    return ImagePipeline(
+        get_image_policy(transcode_cfg),
+        direction,
+        workers=int(pipeline_cfg.get('workers', min(2, os.cpu_count() or 1))),
+        timeout=float(pipeline_cfg.get('timeout_seconds', 30)),
+    )
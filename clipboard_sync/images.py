@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Image formats found on clipboards, recognised from their leading bytes
+(the encoded data is sent as-is, so the format has to come from the data itself).
+"""
+from typing import NamedTuple, Optional
+
+from .download import BytesLike
+
+# Encoded formats by preference: the first one a clipboard offers is the one captured
+IMAGE_MIME_TYPES = {
+    'png': 'image/png',
+    'jpeg': 'image/jpeg',
+    'webp': 'image/webp',
+    'gif': 'image/gif',
+    'bmp': 'image/bmp',
+    'tiff': 'image/tiff',
+}
+
+IMAGE_EXTENSIONS = {
+    'png': '.png',
+    'jpeg': '.jpg',
+    'webp': '.webp',
+    'gif': '.gif',
+    'bmp': '.bmp',
+    'tiff': '.tiff',
+}
+
+_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+    (b'II*\x00', 'tiff'),
+    (b'MM\x00*', 'tiff'),
+    (b'BM', 'bmp'),
+)
+
+
+class ClipboardImage(NamedTuple):
+    """Encoded image bytes captured from the clipboard."""
+    data: bytes
+    format: Optional[str] # Key of IMAGE_MIME_TYPES, None if not recognised
+
+
+def detect_image_format(data: Optional[BytesLike]) -> Optional[str]:
+    """Returns the image format of encoded data ('png', 'jpeg', ...) or None."""
+    if not data:
+        return None
+    head = bytes(data[:16])
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    for signature, image_format in _SIGNATURES:
+        if head.startswith(signature):
+            return image_format
+    return None
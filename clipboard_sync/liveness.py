@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Callable, Dict, Optional
+
+from .transports import ConnectionClosed, SubscriptionTransport
+
+logger = logging.getLogger("Liveness")
+
+
+class StreamStalled(ConnectionClosed):
+    """The subscription stayed silent past its expected keepalive."""
+
+
+class StreamLiveness:
+    """
+    Stall detection for one subscription, based on ntfy's keepalive cadence.
+
+    ntfy sends a keepalive event on HTTP streams every `keepalive_interval` seconds, whatever
+    else it sends meanwhile, so a stream that has been silent for that long plus `grace`
+    seconds is dead even if the socket still looks open. The interval is learned from the
+    gaps between consecutive keepalives, so a server with a shorter cadence is caught sooner.
+    With `enabled` False (WebSocket, where the heartbeat covers liveness) nothing stalls.
+    """
+
+    def __init__(self, keepalive_interval: float = 45.0, grace: float = 5.0, smoothing: float = 0.5,
+                 clock: Callable[[], float] = time.monotonic, enabled: bool = True):
+        self.expected_interval = keepalive_interval
+        self.grace = grace
+        self.enabled = enabled
+        self.smoothing = min(max(smoothing, 0.0), 1.0)
+        self.clock = clock
+        self.last_frame_at = clock()
+        self.last_keepalive_at: Optional[float] = None
+        self.keepalive_count = 0
+        self.learned_count = 0 # Keepalive gaps the interval was learned from
+        self.stalled = False
+
+    def frame_received(self):
+        self.last_frame_at = self.clock()
+
+    def keepalive_received(self):
+        """Call when a keepalive arrives; learns the server's cadence from the gap since the previous one."""
+        now = self.clock()
+        if self.last_keepalive_at is not None:
+            gap = max(1.0, now - self.last_keepalive_at)
+            if self.learned_count == 0:
+                self.expected_interval = gap
+            else:
+                self.expected_interval += self.smoothing * (gap - self.expected_interval)
+            self.learned_count += 1
+        self.last_keepalive_at = now
+        self.keepalive_count += 1
+
+    def silence(self) -> float:
+        return self.clock() - self.last_frame_at
+
+    def seconds_until_stall(self) -> Optional[float]:
+        """Time left before the stream counts as stalled; None if stall detection is off."""
+        if not self.enabled:
+            return None
+        return max(0.0, self.expected_interval + self.grace - self.silence())
+
+
+async def iter_with_liveness(transport: SubscriptionTransport, liveness: StreamLiveness) -> AsyncIterator[str]:
+    """Yields the transport's frames; raises StreamStalled once it has been silent for too long."""
+    frames = transport.__aiter__()
+    liveness.frame_received()
+    while True:
+        try:
+            frame = await asyncio.wait_for(frames.__anext__(), timeout=liveness.seconds_until_stall())
+        except StopAsyncIteration:
+            return
+        except asyncio.TimeoutError:
+            liveness.stalled = True
+            raise StreamStalled(f"stalled: no data for {liveness.silence():.1f}s "
+                                f"(keepalive expected every {liveness.expected_interval:.0f}s)")
+        liveness.frame_received()
+        yield frame
+
+
+class ConnectionStats:
+    """
+    Time spent without any live subscription. An outage starts when the last live
+    connection drops and ends when one is established again; while a standby connection
+    is still up, losing the other one is a switch-over, not an outage.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.live = 0
+        self.connect_count = 0
+        self.outage_count = 0
+        self.stall_count = 0
+        self.switchover_count = 0
+        self.total_disconnected_seconds = 0.0
+        self.longest_disconnected_seconds = 0.0
+        self._down_since: Optional[float] = None
+
+    def connected(self) -> Optional[float]:
+        """Records a new live connection. Returns the length of the outage it ended, if any."""
+        self.live += 1
+        self.connect_count += 1
+        if self._down_since is None:
+            return None
+        outage = self.clock() - self._down_since
+        self._down_since = None
+        self.total_disconnected_seconds += outage
+        self.longest_disconnected_seconds = max(self.longest_disconnected_seconds, outage)
+        return outage
+
+    def disconnected(self, stalled: bool = False) -> bool:
+        """Records a lost connection. Returns True if no live connection is left (an outage)."""
+        self.live = max(0, self.live - 1)
+        if stalled:
+            self.stall_count += 1
+        if self.live:
+            self.switchover_count += 1
+            return False
+        self.outage_count += 1
+        self._down_since = self.clock()
+        return True
+
+    def stats(self) -> Dict[str, float]:
+        current = self.clock() - self._down_since if self._down_since is not None else 0.0
+        return {
+            'live': self.live,
+            'connects': self.connect_count,
+            'outages': self.outage_count,
+            'stalls': self.stall_count,
+            'switchovers': self.switchover_count,
+            'disconnected_seconds': round(self.total_disconnected_seconds + current, 1),
+            'longest_outage_seconds': round(max(self.longest_disconnected_seconds, current), 1),
+        }
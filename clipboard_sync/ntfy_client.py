@@ -1,20 +1,33 @@
 # -*- coding: utf-8 -*-
 import aiohttp
 import asyncio
+import io
 import logging
 import os
-import tempfile
+import secrets
 import datetime
 # 移除 urllib.request 和 urllib.error
 from typing import Optional, Dict, Any, Tuple
 
+from .utils import content_digest
+from .attachment_cache import AttachmentCacheView, create_attachment_cache
+from .config import get_state_dir
+from .dedupe import digest_from_filename
+from .download import BytesLike, DownloadBuffer, DownloadTooLarge
+from .images import IMAGE_EXTENSIONS, IMAGE_MIME_TYPES, detect_image_format
+from .rate_limit import create_rate_limiter, parse_retry_after
+from .compression import (
+    CODEC_CONTENT_TYPES, CODEC_EXTENSIONS, compress_payload, decompress_payload,
+    detect_compression, get_compression_settings, strip_compression_suffix,
+)
+
 logger = logging.getLogger("NtfyClient")
 
 class NtfyClient:
     """Handles communication with the ntfy server (sending POST, receiving via WebSocket)."""
 
     # 移除 __init__ 中的 session 存储，将在方法中传递
-    def __init__(self, config: Dict[str, Any]):
+    def __init__(self, config: Dict[str, Any], attachment_cache: Optional[AttachmentCacheView] = None):
         self.config = config
         self.sender_cfg = config.get('sender', {})
         self.receiver_cfg = config.get('receiver', {})
@@ -23,15 +36,94 @@ class NtfyClient:
         self.sender_url = self.sender_cfg.get('ntfy_topic_url')
         self.sender_timeout_config = self.sender_cfg.get('request_timeout_seconds', 15) # 配置中的超时
         self.filename_prefix = self.sender_cfg.get('filename_prefix', "clipboard_")
+        self.stream_threshold_bytes = int(self.sender_cfg.get('stream_threshold_bytes', 1024 * 1024))
+        # Text up to this size goes in the message body itself (ntfy's message limit is 4096 bytes)
+        self.inline_max_bytes = int(self.sender_cfg.get('inline_max_bytes', 3072))
+        self.compression = get_compression_settings(self.sender_cfg)
+        # Client-side publish budget, adjusted when ntfy answers 429
+        self.rate_limiter = create_rate_limiter(self.sender_cfg)
 
         self.receiver_server = self.receiver_cfg.get('ntfy_server')
         self.receiver_timeout_config = self.receiver_cfg.get('request_timeout_seconds', 15) # 配置中的超时
+        self.max_decompressed_bytes = int(self.receiver_cfg.get('max_decompressed_bytes', 64 * 1024 * 1024))
+        # Streaming downloads: size cap, in-memory limit before spilling to disk, and chunk size
+        self.max_download_bytes = int(self.receiver_cfg.get('max_attachment_bytes', 64 * 1024 * 1024))
+        self.download_spill_bytes = int(self.receiver_cfg.get('download_spill_bytes', 8 * 1024 * 1024))
+        self.download_chunk_bytes = int(self.receiver_cfg.get('download_chunk_bytes', 64 * 1024))
+        # request_timeout_seconds bounds connecting and each wait for data; 0 = no limit on the whole transfer
+        self.download_total_timeout = float(self.receiver_cfg.get('download_total_timeout_seconds', 0)) or None
+        # Repeated attachments (replays, the same screenshot shared twice) are served without network I/O.
+        # Hub tenants pass their view of the hub's shared cache instead of building their own.
+        self.attachment_cache = None
+        if self.receiver_cfg.get('enabled', False):
+            if attachment_cache is None:
+                self.attachment_cache = create_attachment_cache(self.receiver_cfg, get_state_dir(config))
+            elif (self.receiver_cfg.get('attachment_cache') or {}).get('enabled', True):
+                self.attachment_cache = attachment_cache
         self.image_uti_map = self.macos_cfg.get('image_uti_map', {})
 
-    # 修改 post_text_as_file 以使用 aiohttp
+    def _make_filename(self, extension: str, digest: Optional[str] = None) -> str:
+        """
+        Builds an ASCII-only attachment filename without touching disk.
+        The content digest, when given, is embedded so receivers can recognise the content before downloading.
+        """
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"{self.filename_prefix}{timestamp}_{digest or secrets.token_hex(4)}{extension}"
+        # Ensure Filename header is ASCII or Latin-1 compatible
+        safe_filename = filename.encode('ascii', errors='ignore').decode('ascii')
+        return safe_filename or f"clipboard{extension}"
+
+    def _build_text_upload(self, body: bytes) -> Tuple[bytes, Dict[str, str]]:
+        """
+        Builds the attachment body and headers in memory, compressing large text
+        when it pays off. The codec is marked in the filename ('.txt.gz' / '.txt.zst').
+        """
+        compressed_body, codec = compress_payload(body, **self.compression)
+        filename = self._make_filename('.txt' + (CODEC_EXTENSIONS[codec] if codec else ''), content_digest(body))
+        headers = {
+            'Filename': filename,
+            'Content-Type': CODEC_CONTENT_TYPES[codec] if codec else 'text/plain; charset=utf-8', # Explicitly set for clarity
+            'Title': f'Clipboard Text ({datetime.datetime.now().strftime("%H:%M:%S")})',
+        }
+        return compressed_body, headers
+
+    def _can_inline(self, text_content: str, body: bytes) -> bool:
+        """
+        Short text can travel as the ntfy message itself, saving the receiver a download.
+        ntfy trims surrounding whitespace from message bodies, so such text must stay an attachment.
+        """
+        return len(body) <= self.inline_max_bytes and text_content == text_content.strip()
+
+    async def post_text(self, session: aiohttp.ClientSession, text_content: str) -> bool:
+        """
+        Sends clipboard text using the cheapest form: inline in the message body when it is
+        short enough, otherwise as a file attachment.
+        """
+        if not self.sender_url:
+            logger.error("Sender URL not configured. Cannot post text.")
+            return False
+        if not text_content:
+            logger.warning("Attempted to post empty text content.")
+            return False
+
+        try:
+            body = text_content.encode('utf-8')
+        except UnicodeEncodeError as e:
+            logger.error(f"Cannot encode clipboard text as UTF-8: {e}")
+            return False
+        if not self._can_inline(text_content, body):
+            return await self.post_text_as_file(session, text_content)
+
+        headers = {
+            'Content-Type': 'text/plain; charset=utf-8',
+            'Title': f'Clipboard Text ({datetime.datetime.now().strftime("%H:%M:%S")})',
+        }
+        return await self._post(session, body, headers)
+
     async def post_text_as_file(self, session: aiohttp.ClientSession, text_content: str) -> bool:
         """
         Asynchronously posts text content as a file attachment to the configured ntfy sender URL using aiohttp.
+        The body is built in memory; no temporary file is written.
         """
         if not self.sender_url:
             logger.error("Sender URL not configured. Cannot post text.")
@@ -40,39 +132,59 @@ class NtfyClient:
             logger.warning("Attempted to post empty text content.")
             return False
 
-        temp_file_path = None
         try:
-            # Create a temporary file to hold the text content (synchronous part)
-            # Use a context manager for cleaner temp file handling
-            with tempfile.NamedTemporaryFile(mode='w', encoding='utf-8', suffix='.txt',
-                                             delete=False, prefix=self.filename_prefix) as temp_file:
-                temp_file_path = temp_file.name
-                temp_file.write(text_content)
-                logger.debug(f"Text content written to temporary file: {temp_file_path}")
-                temp_filename_base = os.path.basename(temp_file_path) # Get filename before closing
-
-            # Ensure Filename header is ASCII or Latin-1 compatible
-            safe_filename = temp_filename_base.encode('ascii', errors='ignore').decode('ascii')
-            if not safe_filename:
-                safe_filename = "clipboard.txt"
-
-            headers = {
-                'Filename': safe_filename,
-                'Content-Type': 'text/plain; charset=utf-8', # Explicitly set for clarity
-                'Title': f'Clipboard Text ({datetime.datetime.now().strftime("%H:%M:%S")})',
-            }
-
-            # Read the content back (synchronous part)
-            with open(temp_file_path, 'rb') as f_read:
-                file_content_bytes = f_read.read()
-
-            logger.info(f"Attempting to POST file: {safe_filename} ({len(file_content_bytes)} bytes) to {self.sender_url}")
+            body = text_content.encode('utf-8')
+        except UnicodeEncodeError as e:
+            logger.error(f"Cannot encode clipboard text as UTF-8: {e}")
+            return False
+        if self.compression['codec'] and len(body) >= self.compression['min_bytes']:
+            # Compression is CPU-bound; keep it off the event loop
+            loop = asyncio.get_running_loop()
+            body, headers = await loop.run_in_executor(None, self._build_text_upload, body)
+        else:
+            body, headers = self._build_text_upload(body)
+        return await self._post(session, body, headers)
+
+    async def post_image(self, session: aiohttp.ClientSession, image_data: bytes, digest: Optional[str] = None) -> bool:
+        """
+        Posts clipboard image bytes as an attachment exactly as captured: the encoded data is
+        not decoded or re-encoded. The format is detected from the data and the content digest
+        is embedded in the filename, so receivers can skip images they already have.
+        """
+        if not self.sender_url:
+            logger.error("Sender URL not configured. Cannot post image.")
+            return False
+        if not image_data:
+            logger.warning("Attempted to post empty image data.")
+            return False
+        image_format = detect_image_format(image_data)
+        if not image_format:
+            logger.error("Clipboard image is not in a recognized format (PNG, JPEG, WebP, GIF, BMP, TIFF). Not sending it.")
+            return False
+
+        headers = {
+            'Filename': self._make_filename(IMAGE_EXTENSIONS[image_format], digest or content_digest(image_data)),
+            'Content-Type': IMAGE_MIME_TYPES[image_format],
+            'Title': f'Clipboard Image ({datetime.datetime.now().strftime("%H:%M:%S")})',
+        }
+        return await self._post(session, image_data, headers)
 
+    async def _post(self, session: aiohttp.ClientSession, body: bytes, headers: Dict[str, str]) -> bool:
+        """POSTs an encoded body to the sender URL. Large bodies are streamed from a buffer."""
+        description = headers.get('Filename', 'inline message')
+        # Large payloads are streamed in chunks from an in-memory buffer instead of one write
+        data = io.BytesIO(body) if len(body) > self.stream_threshold_bytes else body
+
+        if self.rate_limiter:
+            await self.rate_limiter.acquire()
+
+        logger.info(f"Attempting to POST {description} ({len(body)} bytes) to {self.sender_url}")
+        try:
             # --- Asynchronous POST using aiohttp ---
             request_timeout = aiohttp.ClientTimeout(total=self.sender_timeout_config)
             async with session.post(
                 self.sender_url,
-                data=file_content_bytes,
+                data=data,
                 headers=headers,
                 timeout=request_timeout
             ) as response:
@@ -81,7 +193,15 @@ class NtfyClient:
 
                 if 200 <= status_code < 300:
                     logger.info(f"Successfully POSTed to ntfy. Status: {status_code}.")
+                    if self.rate_limiter:
+                        self.rate_limiter.on_success()
                     return True
+                elif status_code == 429:
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    logger.warning(f"ntfy rate limit hit (429). Retry-After: {response.headers.get('Retry-After', 'not given')}.")
+                    if self.rate_limiter:
+                        self.rate_limiter.on_throttled(retry_after)
+                    return False
                 else:
                     logger.error(f"Error POSTing to ntfy. Status: {status_code}")
                     logger.error(f"Ntfy Response: {response_text[:500]}{'...' if len(response_text)>500 else ''}")
@@ -96,63 +216,108 @@ class NtfyClient:
         except asyncio.TimeoutError:
             logger.error(f"Timeout ({self.sender_timeout_config}s) during POST to {self.sender_url}")
             return False
-        except FileNotFoundError:
-             logger.error(f"Error: Temporary file not found at {temp_file_path}")
-             return False
         except Exception as e:
-            logger.error(f"Unexpected error during text post: {e}", exc_info=True)
+            logger.error(f"Unexpected error during post: {e}", exc_info=True)
             return False
-        finally:
-            # Clean up the temporary file
-            if temp_file_path and os.path.exists(temp_file_path):
-                try:
-                    os.remove(temp_file_path)
-                    logger.debug(f"Temporary file deleted: {temp_file_path}")
-                except OSError as e:
-                    logger.error(f"Error deleting temporary file {temp_file_path}: {e}")
 
     # --- _execute_post_request is no longer needed ---
     # def _execute_post_request(...)
 
-    # download_attachment remains mostly the same, but uses the passed session
-    async def download_attachment(self, session: aiohttp.ClientSession, url: str) -> Optional[Tuple[bytes, Optional[str]]]:
+    @staticmethod
+    def _cache_digest(filename: Optional[str]) -> Optional[str]:
+        """Content digest from our sender's filename, qualified by the codec the payload is stored with."""
+        digest = digest_from_filename(filename)
+        if not digest:
+            return None
+        return f"{digest}.{detect_compression(filename, None) or 'raw'}"
+
+    async def download_attachment(self, session: aiohttp.ClientSession, url: str,
+                                  expected_size: Optional[int] = None,
+                                  filename: Optional[str] = None) -> Optional[Tuple[DownloadBuffer, Optional[str]]]:
         """
-        Asynchronously downloads attachment content (bytes) and detects content type.
-        Handles relative URLs based on receiver config.
-        Returns (content_bytes, content_type) or None on failure.
+        Asynchronously streams attachment content into a DownloadBuffer and detects content type.
+        Served from the attachment cache when the URL, or the content digest in `filename`, was seen before.
+        Handles relative URLs based on receiver config. Attachments larger than max_attachment_bytes
+        are refused before the request (advertised size), after the headers (Content-Length) or
+        while streaming. The timeout applies to connecting and to each wait for data, so a slow
+        transfer that keeps making progress is not cut off.
+        Returns (buffer, content_type) or None on failure; the caller closes the buffer.
         """
         full_url = self._resolve_url(url)
         if not full_url:
             logger.error(f"Could not resolve attachment URL: {url}")
             return None
+        loop = asyncio.get_running_loop()
+        cache_digest = self._cache_digest(filename)
+        if self.attachment_cache:
+            cached = await loop.run_in_executor(None, self.attachment_cache.get, full_url, cache_digest)
+            if cached:
+                data, content_type = cached
+                logger.info(f"Attachment served from cache ({len(data)} bytes), no download needed: {full_url}")
+                return DownloadBuffer.from_bytes(data), content_type
+        if expected_size and int(expected_size) > self.max_download_bytes:
+            logger.error(f"Attachment advertised as {expected_size} bytes exceeds limit of {self.max_download_bytes} bytes. Not downloading {full_url}")
+            return None
 
         logger.info(f"Attempting to download attachment from: {full_url}")
+        buffer = DownloadBuffer(self.download_spill_bytes, self.max_download_bytes)
         try:
-            # Use the passed session and configured timeout
-            request_timeout = aiohttp.ClientTimeout(total=self.receiver_timeout_config)
+            # Use the passed session; timeouts are progress-based (see docstring)
+            request_timeout = aiohttp.ClientTimeout(
+                total=self.download_total_timeout,
+                sock_connect=self.receiver_timeout_config,
+                sock_read=self.receiver_timeout_config,
+            )
             async with session.get(full_url, timeout=request_timeout) as response:
                 response.raise_for_status() # Raise exception for bad status codes (4xx, 5xx)
-                content_bytes = await response.read()
+                if response.content_length is not None and response.content_length > self.max_download_bytes:
+                    raise DownloadTooLarge(f"Content-Length {response.content_length} exceeds limit of {self.max_download_bytes} bytes")
+                async for chunk in response.content.iter_chunked(self.download_chunk_bytes):
+                    buffer.write(chunk)
                 content_type = response.headers.get('Content-Type', '').lower()
-                logger.info(f"Successfully downloaded attachment. Size: {len(content_bytes)} bytes, Type: {content_type or 'Unknown'}.")
-                return content_bytes, content_type
+            logger.info(f"Successfully downloaded attachment. Size: {buffer.size} bytes{' (spilled to disk)' if buffer.spilled else ''}, Type: {content_type or 'Unknown'}.")
+            if self.attachment_cache:
+                await loop.run_in_executor(None, self.attachment_cache.put, buffer.getbuffer(), full_url, cache_digest, content_type)
+            return buffer, content_type
+        except DownloadTooLarge as e:
+            logger.error(f"Attachment too large: {e}. Aborted download from {full_url}")
         except aiohttp.ClientResponseError as e:
              logger.error(f"HTTP error downloading attachment: {e.status} {e.message} from {full_url}")
-             return None
         except aiohttp.ClientError as e:
             logger.error(f"Network error downloading attachment: {e} from {full_url}")
-            return None
         except asyncio.TimeoutError:
-            logger.error(f"Timeout ({self.receiver_timeout_config}s) downloading attachment from {full_url}")
-            return None
+            logger.error(f"Download from {full_url} stalled (no data for {self.receiver_timeout_config}s) or exceeded the total timeout.")
+        except asyncio.CancelledError:
+            buffer.close()
+            raise
         except Exception as e:
             logger.error(f"Unexpected error downloading attachment: {e} from {full_url}", exc_info=True)
-            return None
+        buffer.close()
+        return None
+
 
+    async def decompress_attachment(self, content_bytes: BytesLike, filename: Optional[str],
+                                    content_type: Optional[str]) -> Tuple[Optional[BytesLike], Optional[str], Optional[str]]:
+        """
+        Undoes sender-side compression, detected from the filename marker or Content-Type.
+        Returns (content_bytes, filename, content_type) describing the inner payload,
+        unchanged if the attachment was not compressed; content_bytes is None on failure.
+        """
+        codec = detect_compression(filename, content_type)
+        if not codec:
+            return content_bytes, filename, content_type
+        loop = asyncio.get_running_loop()
+        decompressed = await loop.run_in_executor(None, decompress_payload, content_bytes, codec, self.max_decompressed_bytes)
+        if decompressed is None:
+            return None, filename, content_type
+        inner_name = strip_compression_suffix(filename) if filename else filename
+        logger.info(f"Decompressed {codec} attachment '{filename}': {len(content_bytes)} -> {len(decompressed)} bytes.")
+        # The inner type is inferred from the remaining filename extension
+        return decompressed, inner_name, None
 
-    def decode_text_content(self, content_bytes: bytes, url: str = "N/A") -> Optional[str]:
+    def decode_text_content(self, content_bytes: BytesLike, url: str = "N/A") -> Optional[str]:
         """
-        Attempts to decode byte content into text using common encodings.
+        Attempts to decode byte content (bytes or a buffer view) into text using common encodings.
         Tries UTF-8 first, then GBK as a fallback.
         """
         if not content_bytes:
@@ -162,7 +327,7 @@ class NtfyClient:
 
         for encoding in encodings_to_try:
             try:
-                text = content_bytes.decode(encoding)
+                text = str(content_bytes, encoding)
                 logger.info(f"Successfully decoded text attachment using '{encoding}'. URL: {url}")
                 return text
             except UnicodeDecodeError:
@@ -173,7 +338,7 @@ class NtfyClient:
 
         # If all attempts fail, force decode with utf-8 ignoring errors
         logger.warning(f"All decoding attempts failed for attachment from {url}. Forcing decode with 'utf-8' (ignore errors).")
-        final_text = content_bytes.decode('utf-8', errors='ignore')
+        final_text = str(content_bytes, 'utf-8', errors='ignore')
         return final_text
 
 
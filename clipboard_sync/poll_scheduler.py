@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+from typing import Callable, Dict, Any
+
+logger = logging.getLogger("PollScheduler")
+
+
+class AdaptivePollScheduler:
+    """
+    Decides how long the sender sleeps between clipboard polls.
+
+    Right after activity (a local copy, or a message written by the receiver) it polls
+    at `min_interval`. Once `idle_grace` seconds pass without activity, each idle poll
+    multiplies the interval by `backoff_factor`, up to `max_interval`.
+    The clock is injectable so the policy can be driven by a virtual clock in tests.
+    """
+
+    def __init__(self, min_interval: float, max_interval: float, backoff_factor: float = 1.5,
+                 idle_grace: float = 10.0, clock: Callable[[], float] = time.monotonic):
+        if min_interval <= 0 or max_interval < min_interval:
+            raise ValueError(f"Invalid poll interval range: {min_interval}..{max_interval}")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff_factor = max(1.0, backoff_factor)
+        self.idle_grace = idle_grace
+        self.clock = clock
+
+        self.current_interval = min_interval
+        self.last_activity = clock()
+        self.wake_count = 0
+        self.active_wake_count = 0 # Wakes that found a change
+        self.activity_count = 0
+
+    def record_activity(self):
+        """Snaps back to the fast interval (a copy happened or content was received)."""
+        self.last_activity = self.clock()
+        self.activity_count += 1
+        self.current_interval = self.min_interval
+
+    def record_wake(self, changed: bool):
+        """Records the outcome of one poll."""
+        self.wake_count += 1
+        if changed:
+            self.active_wake_count += 1
+            self.record_activity()
+
+    def next_interval(self) -> float:
+        """Returns the delay before the next poll, backing off while idle."""
+        idle_for = self.clock() - self.last_activity
+        if idle_for < self.idle_grace:
+            self.current_interval = self.min_interval
+        else:
+            self.current_interval = min(self.current_interval * self.backoff_factor, self.max_interval)
+        return self.current_interval
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'current_interval': self.current_interval,
+            'wake_count': self.wake_count,
+            'active_wake_count': self.active_wake_count,
+            'idle_wake_count': self.wake_count - self.active_wake_count,
+            'activity_count': self.activity_count,
+        }
+
+
+class FixedPollScheduler(AdaptivePollScheduler):
+    """Constant interval (sender.adaptive_polling: false); keeps the same counters."""
+
+    def __init__(self, interval: float, clock: Callable[[], float] = time.monotonic):
+        super().__init__(interval, interval, backoff_factor=1.0, idle_grace=0.0, clock=clock)
+
+
+def create_poll_scheduler(sender_config: Dict[str, Any]) -> AdaptivePollScheduler:
+    """Builds the sender's poll scheduler from the sender config section."""
+    poll_interval = float(sender_config.get('poll_interval_seconds', 1.0))
+    if not sender_config.get('adaptive_polling', True):
+        return FixedPollScheduler(poll_interval)
+    min_interval = float(sender_config.get('poll_interval_min_seconds', min(0.25, poll_interval)))
+    max_interval = float(sender_config.get('poll_interval_max_seconds', max(5.0, poll_interval)))
+    return AdaptivePollScheduler(
+        min_interval=min_interval,
+        max_interval=max(max_interval, min_interval),
+        backoff_factor=float(sender_config.get('poll_backoff_factor', 1.5)),
+        idle_grace=float(sender_config.get('poll_idle_grace_seconds', 10.0)),
+    )
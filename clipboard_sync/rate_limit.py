@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import datetime
+import email.utils
+import logging
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger("RateLimit")
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """Parses a Retry-After header (delta-seconds or HTTP date) into seconds to wait."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        logger.debug(f"Unparseable Retry-After header: {value!r}")
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+    now = time.time() if now is None else now
+    return max(0.0, retry_at.timestamp() - now)
+
+
+class TokenBucketRateLimiter:
+    """
+    Token bucket for outgoing publishes that adapts to server throttling.
+
+    Tokens refill at `rate` per second up to `burst`. A 429 response empties the bucket,
+    blocks sends until Retry-After has passed and halves the rate (not below `min_rate`);
+    each successful send then recovers the rate additively toward the configured one.
+    """
+
+    def __init__(self, rate: float, burst: int, min_rate: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.configured_rate = rate
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.min_rate = min_rate if min_rate is not None else rate / 8
+        self.clock = clock
+
+        self.tokens = float(self.burst)
+        self.blocked_until = 0.0
+        self._last_refill = clock()
+        self.throttle_count = 0
+        self.wait_count = 0
+        self.total_wait_seconds = 0.0
+
+    def _refill(self):
+        now = self.clock()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        if elapsed > 0:
+            self.tokens = min(float(self.burst), self.tokens + elapsed * self.rate)
+
+    def time_until_available(self) -> float:
+        """Seconds until a send is allowed (0 if one is allowed now)."""
+        self._refill()
+        blocked = max(0.0, self.blocked_until - self.clock())
+        missing = max(0.0, 1.0 - self.tokens)
+        return max(blocked, missing / self.rate if self.rate > 0 else float('inf'))
+
+    def try_acquire(self) -> bool:
+        if self.time_until_available() > 0:
+            return False
+        self.tokens -= 1.0
+        return True
+
+    async def acquire(self):
+        """Waits until a send is allowed and takes a token."""
+        while not self.try_acquire():
+            delay = self.time_until_available()
+            self.wait_count += 1
+            self.total_wait_seconds += delay
+            logger.debug(f"Rate limit: waiting {delay:.2f}s before next publish.")
+            await asyncio.sleep(delay)
+
+    def on_throttled(self, retry_after: Optional[float] = None):
+        """Records a 429. Without Retry-After, waits for one token at the reduced rate."""
+        self._refill()
+        self.throttle_count += 1
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = 0.0
+        delay = retry_after if retry_after is not None else 1.0 / self.rate
+        self.blocked_until = max(self.blocked_until, self.clock() + delay)
+        logger.warning(f"Server is throttling publishes. Pausing {delay:.1f}s; send rate lowered to {self.rate:.3f}/s.")
+
+    def on_success(self):
+        if self.rate < self.configured_rate:
+            self.rate = min(self.configured_rate, self.rate + self.configured_rate / 10)
+
+    def stats(self) -> Dict[str, Any]:
+        self._refill()
+        return {
+            'tokens': round(self.tokens, 2),
+            'rate_per_second': self.rate,
+            'configured_rate_per_second': self.configured_rate,
+            'blocked_for_seconds': max(0.0, self.blocked_until - self.clock()),
+            'throttle_count': self.throttle_count,
+            'wait_count': self.wait_count,
+            'total_wait_seconds': round(self.total_wait_seconds, 3),
+        }
+
+
+def create_rate_limiter(sender_config: Dict[str, Any]) -> Optional[TokenBucketRateLimiter]:
+    """
+    Builds the publish rate limiter from sender.rate_limit.
+    Defaults follow ntfy.sh's per-visitor request quota (burst of 60, one request per 5s after that).
+    """
+    cfg = sender_config.get('rate_limit') or {}
+    if not cfg.get('enabled', True):
+        return None
+    return TokenBucketRateLimiter(
+        rate=float(cfg.get('requests_per_second', 0.2)),
+        burst=int(cfg.get('burst', 60)),
+    )
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional
+
+logger = logging.getLogger("ReceivePipeline")
+
+
+class _ResolvedItem(NamedTuple):
+    seq: int
+    message: Dict[str, Any]
+    update: Any
+
+
+class ReceivePipeline:
+    """
+    Staged receive path between the WebSocket reader and the clipboard.
+
+    1. submit(): the frame stage hands over parsed messages in arrival order; it never waits.
+    2. resolve stage: each message is resolved (attachment download, decompression, decoding)
+       in its own task, with at most `max_concurrent` running at once.
+    3. apply stage: a single task applies only the newest resolved item. Anything older than
+       an item already applied or waiting to be applied is dropped, so a burst of messages
+       costs one clipboard write.
+
+    With `cancel_stale`, in-flight resolutions of older messages are cancelled as soon as a
+    newer message has resolved to something to apply, so a burst costs roughly one download
+    instead of queueing behind slow ones. A message that resolves to None or fails supersedes
+    nothing: older messages still resolve and apply. Resolved results that are dropped
+    unapplied are passed to `discard`, if given.
+    """
+
+    def __init__(self, resolve: Callable[[Dict[str, Any]], Awaitable[Any]],
+                 apply: Callable[[Dict[str, Any], Any], Awaitable[None]],
+                 max_concurrent: int = 4, cancel_stale: bool = True,
+                 discard: Optional[Callable[[Any], None]] = None):
+        self.resolve = resolve
+        self.apply = apply
+        self.discard = discard
+        self.max_concurrent = max(1, max_concurrent)
+        self.cancel_stale = cancel_stale
+
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._ready_event: Optional[asyncio.Event] = None
+        self._apply_task: Optional[asyncio.Task] = None
+        self._inflight: Dict[int, asyncio.Task] = {}
+        self._ready: Optional[_ResolvedItem] = None
+        self._applying = False
+        self._next_seq = 0
+        self._applied_seq = -1
+
+        self.submitted_count = 0
+        self.applied_count = 0
+        self.superseded_count = 0
+        self.cancelled_count = 0
+        self.failed_count = 0
+        self.empty_count = 0
+
+    def start(self):
+        """Starts the apply stage. Must be called from the running event loop."""
+        if self._apply_task:
+            return
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        self._ready_event = asyncio.Event()
+        self._apply_task = asyncio.create_task(self._apply_stage())
+
+    def submit(self, message: Dict[str, Any]) -> int:
+        """Queues a message for resolution. Returns its sequence number."""
+        if not self._apply_task:
+            self.start()
+        seq = self._next_seq
+        self._next_seq += 1
+        self.submitted_count += 1
+        self._inflight[seq] = asyncio.create_task(self._resolve_stage(seq, message))
+        return seq
+
+    def _cancel_older(self, seq: int):
+        for older_seq, task in list(self._inflight.items()):
+            if older_seq < seq and not task.done():
+                task.cancel()
+                self.cancelled_count += 1
+                logger.debug(f"Cancelled stale resolution of message #{older_seq} (superseded by #{seq}).")
+
+    def _is_stale(self, seq: int) -> bool:
+        return seq <= self._applied_seq or (self._ready is not None and self._ready.seq > seq)
+
+    async def _resolve_stage(self, seq: int, message: Dict[str, Any]):
+        try:
+            async with self._semaphore:
+                if self._is_stale(seq):
+                    self.superseded_count += 1
+                    return
+                update = await self.resolve(message)
+        except asyncio.CancelledError:
+            return
+        except Exception as e:
+            logger.error(f"Failed to resolve message (ID: {message.get('id', 'N/A')}): {e}", exc_info=True)
+            self.failed_count += 1
+            update = None
+        finally:
+            self._inflight.pop(seq, None)
+        if update is None:
+            self.empty_count += 1
+            if self._ready is not None or any(older_seq < seq for older_seq in self._inflight):
+                return # Nothing to copy: must not replace or cancel older content still on its way
+        self._offer(_ResolvedItem(seq, message, update))
+
+    def _drop(self, item: Optional[_ResolvedItem]):
+        if item is None:
+            return
+        self.superseded_count += 1
+        if self.discard and item.update is not None:
+            self.discard(item.update)
+
+    def _offer(self, item: _ResolvedItem):
+        if self._is_stale(item.seq):
+            self._drop(item)
+            return
+        self._drop(self._ready) # Replaced before the apply stage got to it
+        self._ready = item
+        self._ready_event.set()
+        if self.cancel_stale:
+            self._cancel_older(item.seq)
+
+    async def _apply_stage(self):
+        while True:
+            await self._ready_event.wait()
+            self._ready_event.clear()
+            item, self._ready = self._ready, None
+            if item is None:
+                continue
+            self._applied_seq = item.seq
+            self._applying = True
+            try:
+                await self.apply(item.message, item.update)
+                self.applied_count += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Failed to apply message (ID: {item.message.get('id', 'N/A')}): {e}", exc_info=True)
+            finally:
+                self._applying = False
+
+    @property
+    def idle(self) -> bool:
+        return not self._inflight and self._ready is None and not self._applying
+
+    async def join(self, poll_interval: float = 0.01):
+        """Waits until every submitted message has been applied, superseded or cancelled."""
+        while not self.idle:
+            await asyncio.sleep(poll_interval)
+
+    async def close(self):
+        tasks = list(self._inflight.values())
+        if self._apply_task:
+            tasks.append(self._apply_task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._inflight.clear()
+        self._apply_task = None
+        if self._ready is not None and self.discard and self._ready.update is not None:
+            self.discard(self._ready.update)
+        self._ready = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'submitted': self.submitted_count,
+            'applied': self.applied_count,
+            'superseded': self.superseded_count,
+            'cancelled': self.cancelled_count,
+            'failed': self.failed_count,
+            'empty': self.empty_count,
+            'in_flight': len(self._inflight),
+        }
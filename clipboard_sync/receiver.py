@@ -1,21 +1,43 @@
 # -*- coding: utf-8 -*-
 import asyncio
-import websockets
 import json
 import logging
 import aiohttp # Keep aiohttp import
 import os
 import socket # Import socket for gaierror
-from typing import Dict, Any, Optional
+import time
+from typing import Dict, Any, NamedTuple, Optional
 
 from .clipboard_manager import ClipboardManager
 from .ntfy_client import NtfyClient
-from .config import get_websocket_url
+from .config import RECEIVE_TRANSPORTS, get_websocket_url, get_subscribe_url, get_poll_url, get_state_dir
+from .cursor import ReceiveCursor
+from .dedupe import create_dedupe_cache
+from .download import BytesLike, DownloadBuffer
+from .echo import get_echo_suppressor
+from .events import parse_frame, resolve_decoder
+from .image_pipeline import create_image_pipeline
+from .images import IMAGE_EXTENSIONS
+from .liveness import ConnectionStats, StreamLiveness, iter_with_liveness
+from .receive_pipeline import ReceivePipeline
+from .topics import TopicPolicy, load_topic_policies
+from .transports import ConnectionClosed, create_transport
+from .utils import ExponentialBackoff, content_digest
 
 logger = logging.getLogger("Receiver")
 
+
+class ClipboardUpdate(NamedTuple):
+    """What a resolved ntfy message puts on the clipboard."""
+    text: Optional[str]
+    image: Optional[BytesLike]
+    image_filename: Optional[str]
+    description: str # For logging
+    buffer: Optional[DownloadBuffer] = None # Download backing `image`, closed once applied or superseded
+
+
 class NtfyReceiver:
-    """Listens to ntfy via WebSocket and updates the local clipboard."""
+    """Listens to ntfy (WebSocket, JSON stream or SSE) and updates the local clipboard."""
 
     def __init__(self, config: Dict[str, Any], clipboard_manager: ClipboardManager, ntfy_client: NtfyClient, shared_state: Dict, session: aiohttp.ClientSession):
         """
@@ -25,7 +47,7 @@ class NtfyReceiver:
             config: The application configuration dictionary.
             clipboard_manager: An instance of ClipboardManager.
             ntfy_client: An instance of NtfyClient.
-            shared_state: A dictionary for shared state between components (e.g., _last_received_text).
+            shared_state: A dictionary for shared state between components (e.g., echo_suppressor).
             session: An active aiohttp.ClientSession for network requests.
         """
         self.config = config
@@ -34,135 +56,366 @@ class NtfyReceiver:
         self.ntfy_client = ntfy_client
         self.shared_state = shared_state
         self.session = session # Store the shared session
+        self.echo_suppressor = get_echo_suppressor(shared_state, config)
 
         self.enabled = self.receiver_cfg.get('enabled', False)
-        self.websocket_url = get_websocket_url(config)
-        self.reconnect_delay = int(self.receiver_cfg.get('reconnect_delay_seconds', 5))
+        self.websocket_url = get_websocket_url(config) # Also identifies the subscription for the cursor
+        # Subscription transport: 'websocket', 'json' (HTTP line stream) or 'sse'; the HTTP ones pass proxies that break WebSockets
+        self.transport_name = str(self.receiver_cfg.get('transport', 'websocket')).lower()
+        if self.transport_name not in RECEIVE_TRANSPORTS:
+            logger.warning(f"Unknown receiver.transport '{self.transport_name}', using websocket.")
+            self.transport_name = 'websocket'
+        self.subscribe_base_url = get_subscribe_url(config, self.transport_name)
+        # All configured topics share one connection (ntfy accepts 'a,b,c'); each has its own policy
+        self.topic_policies = load_topic_policies(self.receiver_cfg)
+        self.stream_read_timeout = float(self.receiver_cfg.get('stream_read_timeout_seconds', 90))
+        # JSON decoder for message events ('auto' uses orjson when installed); control frames skip decoding
+        self.decode_json = resolve_decoder(self.receiver_cfg.get('json_decoder', 'auto'))
+        # Reconnects back off exponentially (fast first retry, jittered); see _create_backoff
+        self.reconnect_cfg = self.receiver_cfg.get('reconnect') or {}
+        self.backoff_reset_after = float(self.reconnect_cfg.get('reset_after_seconds', 30))
+        # Stall detection: a stream silent past ntfy's keepalive interval plus a grace period is reconnected
+        self.keepalive_interval = float(self.receiver_cfg.get('keepalive_interval_seconds', 45))
+        self.stall_grace = float(self.receiver_cfg.get('stall_grace_seconds', 5))
+        self.websocket_heartbeat = float(self.receiver_cfg.get('websocket_heartbeat_seconds', 10))
+        # Optional second subscription kept open, so a dropped connection needs no new handshake
+        self.standby_enabled = bool(self.receiver_cfg.get('standby_connection', False))
+        self.connection_stats = ConnectionStats()
+        self._first_connected: Optional[asyncio.Event] = None
         self.is_macos_image_support = clipboard_manager.image_support_enabled
+        # Downscaling/recompression of received images before they reach the clipboard (receiver.images.transcode)
+        self.image_pipeline = create_image_pipeline(config, 'receiver') if self.is_macos_image_support else None
+        self.poll_url = get_poll_url(config)
+        # Resume support: persisted last message ID, replayed with since=<id> on (re)connect
+        self.resume_enabled = self.receiver_cfg.get('resume', True)
+        self.fetch_latest_on_start = self.receiver_cfg.get('fetch_latest_on_start', False)
+        self.cursor: Optional[ReceiveCursor] = None
+        self._cold_start_done = False
+        # Fixed-size, time-bounded memory of handled messages (by ID and content digest)
+        self.dedupe = create_dedupe_cache(self.receiver_cfg)
+        # Downloads run concurrently off the subscription read loop; only the newest result is copied
+        self.pipeline = ReceivePipeline(
+            self._resolve_for_pipeline,
+            self._apply_from_pipeline,
+            max_concurrent=int(self.receiver_cfg.get('max_concurrent_downloads', 4)),
+            cancel_stale=self.receiver_cfg.get('cancel_stale_downloads', True),
+            discard=self._release_update,
+        )
 
         if not self.enabled:
             logger.info("Ntfy Receiver is disabled in the configuration.")
-        elif not self.websocket_url:
-            logger.error("Receiver is enabled but WebSocket URL could not be determined (check server/topic). Disabling receiver.")
+        elif not self.websocket_url or not self.subscribe_base_url:
+            logger.error("Receiver is enabled but subscription URL could not be determined (check server/topic). Disabling receiver.")
             self.enabled = False
         elif not self.session:
              logger.error("Receiver requires an aiohttp ClientSession but none was provided. Disabling receiver.")
              self.enabled = False
         else:
-             logger.info(f"Ntfy Receiver initialized. Listening on: {self.websocket_url}")
+             state_dir = get_state_dir(config) if self.resume_enabled else None
+             if self.resume_enabled and state_dir is None:
+                 logger.error("No usable state directory for the receiver cursor. Resuming after restarts is disabled.")
+             elif self.resume_enabled:
+                 self.cursor = ReceiveCursor(os.path.join(state_dir, 'receiver_cursor.json'), self.websocket_url)
+                 if self.cursor.is_set:
+                     logger.info(f"Resuming after last processed message ID: {self.cursor.message_id}")
+             logger.info(f"Ntfy Receiver initialized. Listening on: {self.subscribe_base_url} ({self.transport_name})")
+             for policy in self.topic_policies.values():
+                 logger.info(f"Topic '{policy.topic}': text={policy.text}, images={policy.images}, min_priority={policy.min_priority}")
              if self.is_macos_image_support:
                  logger.info("macOS image support is enabled.")
 
 
     async def run(self):
-        """Starts the WebSocket listening loop with reconnection logic."""
+        """Starts the subscription (and the optional standby subscription) with reconnection logic."""
         if not self.enabled:
             return
 
+        self.pipeline.start()
+        self._first_connected = asyncio.Event()
+        slots = ['primary', 'standby'] if self.standby_enabled else ['primary']
+        tasks = [asyncio.create_task(self._connection_loop(slot), name=f"Receiver-{slot}") for slot in slots]
+        try:
+            await asyncio.gather(*tasks)
+        except asyncio.CancelledError:
+            logger.info("Receiver task cancelled during shutdown.")
+            self.enabled = False
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.pipeline.close()
+        logger.info(f"Ntfy Receiver run loop finished. Pipeline stats: {self.pipeline.stats()}, "
+                    f"connection stats: {self.connection_stats.stats()}")
+
+    def _create_backoff(self) -> ExponentialBackoff:
+        # Fast first retry, then exponential growth with jitter so clients do not reconnect in lockstep
+        return ExponentialBackoff(
+            initial=float(self.reconnect_cfg.get('initial_delay_seconds', 0.5)),
+            maximum=float(self.reconnect_cfg.get('max_delay_seconds', self.receiver_cfg.get('reconnect_delay_seconds', 60))),
+            factor=float(self.reconnect_cfg.get('backoff_factor', 2.0)),
+            jitter=float(self.reconnect_cfg.get('jitter', 0.5)),
+        )
+
+    async def _connection_loop(self, slot: str):
+        """
+        Keeps one subscription connected. With a standby, two of these run side by side; both
+        feed the same dedupe and pipeline, so when one drops the other is already delivering.
+        """
+        backoff = self._create_backoff()
+        if slot != 'primary':
+            await self._first_connected.wait() # Connect the standby once the first subscription is up
         # Use the passed session, do not create a new one locally
         while self.enabled: # Loop continues as long as enabled and no fatal error/cancellation
-            websocket = None # Ensure websocket is None initially for finally block
+            transport = None # Ensure transport is None initially for finally block
+            connected_at = None
+            liveness = None
+            connect_timeout = self.ntfy_client.receiver_timeout_config
             try:
-                logger.info(f"Attempting to connect to WebSocket: {self.websocket_url}")
-                # Configure connection timeout for websockets using receiver's timeout config
-                connect_timeout = self.ntfy_client.receiver_timeout_config
-                websocket = await asyncio.wait_for(
-                    websockets.connect(
-                        self.websocket_url,
-                        ping_interval=20,
-                        ping_timeout=20
-                    ),
-                    timeout=connect_timeout
-                )
-                logger.info(f"Successfully connected to ntfy topic via WebSocket.")
+                if not self.connection_stats.live:
+                    # Apply only the newest message missed while disconnected, then subscribe after it
+                    await self.catch_up(self.session)
+                subscribe_url = self._subscribe_url()
+                logger.info(f"Attempting to connect ({self.transport_name}, {slot}): {subscribe_url}")
+                # Runs on the shared session: reuses its pooled connection, DNS cache and proxy settings
+                transport = create_transport(self.transport_name, self.session, subscribe_url, connect_timeout,
+                                             read_timeout=self.stream_read_timeout, heartbeat=self.websocket_heartbeat)
+                # WebSocket liveness is left to the heartbeat: ntfy sends no keepalive events there
+                liveness = StreamLiveness(self.keepalive_interval, self.stall_grace,
+                                          enabled=transport.keepalive_events)
+                await transport.connect()
+                connected_at = time.monotonic()
+                outage = self.connection_stats.connected()
+                if outage is not None:
+                    logger.info(f"Reconnected via {self.transport_name} ({slot}) after {outage:.1f}s without a live subscription.")
+                else:
+                    logger.info(f"Successfully connected to ntfy topic via {self.transport_name} ({slot}).")
+                self._first_connected.set()
                 # Pass the session to handle_messages
-                await self.handle_messages(websocket, self.session)
+                await self.handle_messages(transport, self.session, liveness)
 
-            except (websockets.exceptions.ConnectionClosedError,
-                    websockets.exceptions.ConnectionClosedOK) as e:
-                logger.warning(f"WebSocket connection closed: {e}. Reconnecting in {self.reconnect_delay}s...")
-            except websockets.exceptions.InvalidURI:
-                logger.critical(f"Invalid WebSocket URI: {self.websocket_url}. Receiver stopping.")
+            except aiohttp.InvalidURL:
+                logger.critical(f"Invalid subscription URL: {self.subscribe_base_url}. Receiver stopping.")
                 self.enabled = False # Stop trying on fatal config error
-            except (ConnectionRefusedError, OSError, socket.gaierror) as e:
-                 logger.error(f"WebSocket connection failed (Network/Socket Error): {e}. Retrying in {self.reconnect_delay}s...")
+            except aiohttp.ClientResponseError as e: # Includes a rejected WebSocket handshake
+                logger.error(f"Subscription ({slot}) rejected by server: {e.status} {e.message}.")
+            except (aiohttp.ClientError, ConnectionRefusedError, OSError, socket.gaierror) as e:
+                 logger.error(f"Subscription ({slot}) connection failed (Network/Socket Error): {e}.")
             except (TimeoutError, asyncio.TimeoutError) as e: # Catch generic TimeoutError and asyncio.TimeoutError
-                 logger.error(f"WebSocket connection attempt timed out ({connect_timeout}s). Retrying in {self.reconnect_delay}s...")
+                 logger.error(f"Subscription ({slot}) connection attempt timed out ({connect_timeout}s).")
             except asyncio.CancelledError:
-                logger.info("Receiver task cancelled during shutdown.")
+                logger.info(f"Receiver connection ({slot}) cancelled during shutdown.")
                 self.enabled = False # Ensure loop terminates on cancellation
             except Exception as e:
                 # Catch potential proxy errors more specifically if needed
                 if "python-socks" in str(e):
-                     logger.critical(f"Connection error possibly related to proxy: {e}. Ensure 'python-socks' is installed if using SOCKS proxy. Retrying in {self.reconnect_delay}s...")
+                     logger.critical(f"Connection error possibly related to proxy: {e}. Ensure 'python-socks' is installed if using SOCKS proxy.")
                 else:
-                    logger.critical(f"Unexpected error in WebSocket connection loop: {e}. Retrying in {self.reconnect_delay}s...", exc_info=True)
+                    logger.critical(f"Unexpected error in subscription connection loop ({slot}): {e}", exc_info=True)
             finally:
-                # Ensure websocket is closed if it was opened
-                if websocket and not websocket.close:
-                     await websocket.close()
-                     logger.debug("WebSocket connection closed in finally block.")
-
+                # Ensure the subscription is closed if it was opened
+                if transport:
+                     await transport.close()
+                     logger.debug(f"Subscription connection ({slot}) closed in finally block.")
+                if connected_at is not None:
+                    self._connection_lost(slot, liveness, time.monotonic() - connected_at, backoff)
 
             # Wait before reconnecting, only if enabled and not cancelled
             if self.enabled:
+                delay = backoff.next_delay()
+                logger.info(f"Reconnecting ({slot}) in {delay:.1f}s...")
                 try:
-                    await asyncio.sleep(self.reconnect_delay)
+                    await asyncio.sleep(delay)
                 except asyncio.CancelledError:
                      logger.info("Receiver reconnect sleep interrupted by cancellation.")
                      self.enabled = False # Ensure loop terminates
+        self._first_connected.set() # Release a standby still waiting for the first connection
+
+    def _connection_lost(self, slot: str, liveness: StreamLiveness, uptime: float, backoff: ExponentialBackoff):
+        if self.connection_stats.disconnected(stalled=liveness.stalled):
+            logger.warning(f"No live subscription left ({slot} dropped after {uptime:.0f}s). Connection stats: {self.connection_stats.stats()}")
+        else:
+            logger.info(f"Subscription ({slot}) dropped; the other connection keeps delivering.")
+        if liveness.learned_count:
+            # Start the next connection with the cadence measured between keepalives
+            self.keepalive_interval = min(liveness.expected_interval, self.stream_read_timeout)
+        elif liveness.stalled and not liveness.keepalive_count:
+            # Never saw a keepalive: the server's cadence may be longer than assumed
+            self.keepalive_interval = min(self.keepalive_interval * 2, self.stream_read_timeout)
+        if uptime >= self.backoff_reset_after:
+            backoff.reset() # A connection that held up earns a fast first retry again
+
+    def _subscribe_url(self) -> str:
+        if self.cursor and self.cursor.is_set:
+            return f"{self.subscribe_base_url}?since={self.cursor.message_id}"
+        return self.subscribe_base_url
+
+    async def _advance_cursor(self, data: Dict[str, Any]):
+        if self.cursor and self.cursor.advance(data):
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.cursor.save)
+
+    async def catch_up(self, session: aiohttp.ClientSession):
+        """
+        Polls the messages published since the cursor (or only the latest one on a cold start
+        with fetch_latest_on_start) and copies just the newest of them, instead of replaying
+        every missed message into the clipboard.
+        """
+        if self.cursor and self.cursor.is_set:
+            since = self.cursor.message_id
+        elif self.fetch_latest_on_start and not self._cold_start_done:
+            since = 'latest'
+        else:
+            return
+        self._cold_start_done = True
+        if not self.poll_url:
+            return
 
-        logger.info("Ntfy Receiver run loop finished.")
+        try:
+            request_timeout = aiohttp.ClientTimeout(total=self.ntfy_client.receiver_timeout_config)
+            async with session.get(self.poll_url, params={'poll': '1', 'since': since}, timeout=request_timeout) as response:
+                response.raise_for_status()
+                body = await response.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Catch-up poll failed ({e}). Relying on since= replay over the subscription.")
+            return
 
+        messages = []
+        for line in body.splitlines():
+            try:
+                event, data = parse_frame(line, self.decode_json)
+            except json.JSONDecodeError:
+                continue
+            if event == 'message' and self._policy_rejection(data) is None:
+                messages.append(data)
+        if not messages:
+            logger.debug("No missed messages to catch up on.")
+            return
 
-    async def handle_messages(self, websocket, session: aiohttp.ClientSession):
-        """Processes incoming messages from the WebSocket."""
+        newest = messages[-1]
+        logger.info(f"Catching up: {len(messages)} missed message(s); applying only the newest (ID: {newest.get('id')}).")
+        # The cursor only moves once the newest is applied, so the since= replay repeats these; mark them seen
+        for skipped in messages[:-1]:
+            self.dedupe.mark_seen(skipped)
+        await self._dispatch(newest)
+
+    async def handle_messages(self, transport, session: aiohttp.ClientSession, liveness: Optional[StreamLiveness] = None):
+        """Processes incoming messages from the subscription transport until it closes or stalls."""
+        liveness = liveness or StreamLiveness(self.keepalive_interval, self.stall_grace,
+                                              enabled=transport.keepalive_events)
         try:
-            async for message in websocket:
+            async for message in iter_with_liveness(transport, liveness):
                 try:
-                    data = json.loads(message)
-                    event = data.get('event')
+                    # Keepalive/open/poll_request frames are classified without a JSON decode
+                    event, data = parse_frame(message, self.decode_json)
 
                     if event == 'message':
-                        # Pass the session down
-                        await self.process_ntfy_message(data, session)
+                        # Hand off without waiting, so a slow download does not stall this loop
+                        await self._dispatch(data)
                     elif event == 'keepalive':
+                        liveness.keepalive_received()
                         logger.debug("Received keepalive.")
                     elif event == 'open':
-                        logger.info("WebSocket connection confirmed open by ntfy.")
+                        logger.info(f"Subscription ({self.transport_name}) confirmed open by ntfy.")
                     elif event == 'poll_request':
                          logger.debug("Received poll_request signal.") # ntfy internal
                     else:
-                        logger.warning(f"Received unknown event type: {event}, Data: {str(data)[:100]}...")
+                        logger.warning(f"Received unknown event type: {event}, Frame: {message[:100]}...")
 
                 except json.JSONDecodeError:
                     logger.warning(f"Failed to decode JSON message: {message[:200]}...")
                 except Exception as e:
                     # Log errors processing individual messages but continue listening
-                    logger.error(f"Error processing WebSocket message: {e}", exc_info=True)
+                    logger.error(f"Error processing subscription message: {e}", exc_info=True)
         except asyncio.CancelledError:
              logger.info("Receiver message handling loop cancelled.")
              # Allow cancellation to propagate
              raise
-        except websockets.exceptions.ConnectionClosed as e:
-             logger.warning(f"WebSocket connection closed while handling messages: {e}")
+        except ConnectionClosed as e:
+             logger.warning(f"Subscription ({self.transport_name}) closed while handling messages: {e}.")
              # Let the outer loop handle reconnection
         except Exception as e:
              logger.error(f"Unexpected error in handle_messages loop: {e}", exc_info=True)
              # Depending on severity, might want to raise or let outer loop retry
 
 
+    def _policy_for(self, data: Dict[str, Any]) -> TopicPolicy:
+        topic = data.get('topic') or ''
+        return self.topic_policies.get(topic) or TopicPolicy(topic)
+
+    def _policy_rejection(self, data: Dict[str, Any]) -> Optional[str]:
+        """Checks a message against its topic's policy before anything is downloaded. Returns why it is refused, if it is."""
+        policy = self._policy_for(data)
+        if not policy.accepts_priority(data):
+            return f"below the minimum priority of topic '{policy.topic}'"
+        attachment = data.get('attachment')
+        if isinstance(attachment, dict) and attachment.get('url') and attachment.get('name'):
+            if self.ntfy_client.is_image_attachment(attachment['name'], attachment.get('type')):
+                if not policy.images:
+                    return f"topic '{policy.topic}' does not accept images"
+                if not self.is_macos_image_support and not policy.text:
+                    # Without native image support the image's URL is copied, as text
+                    return f"topic '{policy.topic}' does not accept text (image URLs are copied as text here)"
+                return None
+        if not policy.text:
+            return f"topic '{policy.topic}' does not accept text"
+        return None
+
+    async def _dispatch(self, data: Dict[str, Any]):
+        """Frame stage: drops filtered and duplicate messages and submits new ones to the receive pipeline."""
+        rejection = self._policy_rejection(data)
+        if rejection:
+            logger.info(f"Ignoring message (ID: {data.get('id', 'N/A')}): {rejection}.")
+            await self._advance_cursor(data)
+            return
+        if self.dedupe.is_duplicate(data):
+            # With a standby connection every message arrives twice, so duplicates are routine
+            log = logger.debug if self.standby_enabled else logger.info
+            log(f"Skipping duplicate message (ID: {data.get('id', 'N/A')}). Dedupe stats: {self.dedupe.stats()}")
+            await self._advance_cursor(data)
+            return
+        self.pipeline.submit(data)
+
+    async def _resolve_for_pipeline(self, data: Dict[str, Any]) -> Optional[ClipboardUpdate]:
+        return await self.resolve_message(data, self.session)
+
+    async def _apply_from_pipeline(self, data: Dict[str, Any], update: Optional[ClipboardUpdate]):
+        if update:
+            await self.apply_update(update)
+        await self._advance_cursor(data)
+
+    @staticmethod
+    def _release_update(update: Optional[ClipboardUpdate]):
+        if update and update.buffer:
+            if isinstance(update.image, memoryview):
+                update.image.release()
+            update.buffer.close()
+
     async def process_ntfy_message(self, data: Dict[str, Any], session: aiohttp.ClientSession):
-        """Processes a single ntfy message event, downloading attachments and updating clipboard."""
+        """Processes a single ntfy message event inline (bypassing the pipeline): policy, dedupe, download, copy."""
+        rejection = self._policy_rejection(data)
+        if rejection:
+            logger.info(f"Ignoring message (ID: {data.get('id', 'N/A')}): {rejection}.")
+            return
+        if self.dedupe.is_duplicate(data):
+            logger.info(f"Skipping duplicate message (ID: {data.get('id', 'N/A')}). Dedupe stats: {self.dedupe.stats()}")
+            return
+        update = await self.resolve_message(data, session)
+        if update:
+            await self.apply_update(update)
+
+    async def resolve_message(self, data: Dict[str, Any], session: aiohttp.ClientSession) -> Optional[ClipboardUpdate]:
+        """Downloads and decodes what a message carries. Returns None if there is nothing to copy."""
         message_id = data.get('id', 'N/A')
         message_content = data.get('message', '') # The main text content of the notification
         attachment = data.get('attachment')
         title = data.get('title', '') # Notification title
+        policy = self._policy_for(data)
 
-        logger.info(f"Received message (ID: {message_id}, Title: '{title[:30]}...')")
+        logger.info(f"Received message (ID: {message_id}, Topic: {policy.topic}, Title: '{title[:30]}...')")
 
         text_to_copy: Optional[str] = None
-        image_to_copy: Optional[bytes] = None
+        image_to_copy: Optional[BytesLike] = None
+        download_buffer: Optional[DownloadBuffer] = None
         image_filename: Optional[str] = None
         copy_source_description: str = "Unknown" # For logging
 
@@ -175,14 +428,24 @@ class NtfyReceiver:
 
             if attach_url and attach_name:
                 logger.info(f"Message has attachment: '{attach_name}' (Type: {attach_type or 'N/A'}, Size: {attach_size or 'N/A'})")
-
-                # Download the attachment content using the shared session
-                download_result = await self.ntfy_client.download_attachment(session, attach_url)
+                # Stream the attachment using the shared session (refused early if too large)
+                download_result = await self.ntfy_client.download_attachment(session, attach_url, attach_size, attach_name)
 
                 if download_result:
-                    content_bytes, content_type_header = download_result
+                    download_buffer, content_type_header = download_result
                     resolved_content_type = attach_type or content_type_header # Prefer explicit type
+                    # Undo sender-side compression ('.txt.gz' / '.txt.zst') before type detection
+                    content_bytes, attach_name, resolved_content_type = await self.ntfy_client.decompress_attachment(
+                        download_buffer.getbuffer(), attach_name, resolved_content_type
+                    )
+                    if not isinstance(content_bytes, memoryview):
+                        # Decompressed (or failed): the downloaded data is no longer needed
+                        download_buffer.close()
+                        download_buffer = None
+                    if content_bytes is None:
+                        download_result = None
 
+                if download_result:
                     # Check if it's an image
                     if self.ntfy_client.is_image_attachment(attach_name, resolved_content_type):
                         if self.is_macos_image_support:
@@ -190,6 +453,14 @@ class NtfyReceiver:
                             image_to_copy = content_bytes
                             image_filename = attach_name
                             copy_source_description = f"Image Attachment '{attach_name}'"
+                            processed = await self.image_pipeline.process(content_bytes) if self.image_pipeline else None
+                            if processed:
+                                image_to_copy = processed.data
+                                image_filename = os.path.splitext(attach_name)[0] + IMAGE_EXTENSIONS[processed.format]
+                                content_bytes = None
+                                if download_buffer:
+                                    download_buffer.close() # The processed copy replaces the download
+                                    download_buffer = None
                         else:
                             logger.info(f"Detected image attachment '{attach_name}'. Copying URL (non-macOS or disabled).")
                             # Ensure URL is resolved before copying
@@ -201,6 +472,7 @@ class NtfyReceiver:
                     elif self.ntfy_client.is_text_attachment(attach_name, resolved_content_type):
                         logger.info(f"Detected text attachment '{attach_name}'. Decoding content.")
                         text_to_copy = self.ntfy_client.decode_text_content(content_bytes, attach_url)
+                        content_bytes = None
                         copy_source_description = f"Text Attachment '{attach_name}'"
                         if text_to_copy is None:
                              logger.warning(f"Failed to decode text attachment '{attach_name}'. Falling back to message body.")
@@ -215,16 +487,16 @@ class NtfyReceiver:
                             copy_source_description = f"Message Body (Unknown attach type: '{attach_name}')"
                         else:
                             logger.warning(f"Unknown attachment type '{attach_name}' and no message body. Nothing to copy.")
-                            return # Nothing to do
+                            return None # Nothing to do
 
-                else: # Download failed
+                else: # Download or decompression failed
                     logger.warning(f"Failed to download attachment '{attach_name}'. Falling back to message body if available.")
                     if message_content:
                         text_to_copy = message_content # Fallback
                         copy_source_description = f"Message Body (Attach download failed: '{attach_name}')"
                     else:
                         logger.warning(f"Attachment download failed for '{attach_name}' and no message body. Nothing to copy.")
-                        return # Nothing to do
+                        return None # Nothing to do
 
             else: # Attachment info incomplete
                 logger.warning("Message has incomplete attachment data. Copying message body if available.")
@@ -233,36 +505,51 @@ class NtfyReceiver:
                     copy_source_description = "Message Body (Incomplete attach data)"
                 else:
                     logger.warning("Incomplete attachment data and no message body. Nothing to copy.")
-                    return # Nothing to do
+                    return None # Nothing to do
 
         # --- No Attachment or Fallback ---
         else:
             if message_content:
-                 logger.info("Received message with no attachment or fell back to message body.")
+                 # Short clipboard text is sent inline, so the body is the content itself (no download)
+                 logger.info("Received message with no attachment. Using inline message body.")
                  text_to_copy = message_content
-                 copy_source_description = "Message Body"
+                 copy_source_description = "Inline Message Body"
             else:
                  logger.info("Received message with no attachment and no message body. Nothing to copy.")
-                 return # Nothing to do
-
-        # --- Perform Clipboard Action ---
-        # Use run_in_executor for synchronous clipboard operations
-        loop = asyncio.get_running_loop()
+                 return None # Nothing to do
+
+        if download_buffer and image_to_copy is None:
+            content_bytes = None # Drop the view so the buffer can be released
+            download_buffer.close()
+            download_buffer = None
+        if image_to_copy is None and not policy.text:
+            # Image topics without text: a failed image download falls back to the message body
+            logger.info(f"Topic '{policy.topic}' does not accept text ({copy_source_description}). Ignoring message.")
+            return None
+        return ClipboardUpdate(text_to_copy, image_to_copy, image_filename, copy_source_description, download_buffer)
+
+    async def apply_update(self, update: ClipboardUpdate):
+        """Clipboard stage: writes a resolved message to the clipboard."""
+        text_to_copy = update.text
+        image_to_copy = update.image
+        image_filename = update.image_filename
+        copy_source_description = update.description
+        # Synchronous clipboard operations run on the clipboard manager's dedicated thread
         copied_successfully = False
 
         try:
             if image_to_copy and image_filename and self.is_macos_image_support:
                 logger.info(f"Attempting to copy {copy_source_description} to clipboard (macOS image)...")
-                copied_successfully = await loop.run_in_executor(
-                    None,
+                copied_successfully = await self.clipboard.run_io(
                     self.clipboard.set_image_macos,
                     image_to_copy,
                     image_filename,
                     "Receiver" # Source description for clipboard manager logs
                 )
                 if copied_successfully:
+                     self.echo_suppressor.remember(content_digest(image_to_copy))
+                     self.shared_state['_last_remote_activity'] = time.monotonic() # Lets the sender poll fast again
                      logger.info(f"Successfully copied {copy_source_description} to clipboard.")
-                     # No need to set _last_received_text for images currently
                 else:
                      logger.error(f"Failed to copy {copy_source_description} (image) to clipboard.")
                      # Optional: Fallback to copying text if image copy fails?
@@ -270,19 +557,21 @@ class NtfyReceiver:
             # If we have text to copy (either primary or fallback) and image wasn't copied
             if text_to_copy is not None and not copied_successfully:
                 logger.info(f"Attempting to copy {copy_source_description} to clipboard (text)...")
-                copied_successfully = await loop.run_in_executor(
-                    None,
+                copied_successfully = await self.clipboard.run_io(
                     self.clipboard.set_text,
                     text_to_copy,
                     "Receiver" # Source description
                 )
                 if copied_successfully:
                     # !!! IMPORTANT: Update shared state for loop prevention !!!
-                    self.shared_state['_last_received_text'] = text_to_copy
-                    logger.info(f"Successfully copied {copy_source_description} to clipboard. Updated _last_received_text.")
+                    self.echo_suppressor.remember(content_digest(text_to_copy))
+                    self.shared_state['_last_remote_activity'] = time.monotonic() # Lets the sender poll fast again
+                    logger.info(f"Successfully copied {copy_source_description} to clipboard. Registered for echo suppression.")
                 else:
                     logger.error(f"Failed to copy {copy_source_description} (text) to clipboard.")
 
         except Exception as e:
              # Catch errors during the clipboard setting phase
-             logger.error(f"Error during clipboard update for {copy_source_description}: {e}", exc_info=True)
\ No newline at end of file
+             logger.error(f"Error during clipboard update for {copy_source_description}: {e}", exc_info=True)
+        finally:
+            self._release_update(update)
\ No newline at end of file
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger("SendQueue")
+
+
+class OutboundItem:
+    """One clipboard state waiting to be sent."""
+
+    __slots__ = ('kind', 'content', 'digest', 'created_at', 'filename')
+
+    def __init__(self, kind: str, content: Any, digest: Optional[str], filename: Optional[str] = None):
+        self.kind = kind # 'text' (or 'image')
+        self.content = content
+        self.digest = digest
+        self.filename = filename
+        self.created_at = time.monotonic()
+
+
+class CoalescingSendQueue:
+    """
+    Hand-off between clipboard detection and the send worker, with latest-wins semantics:
+    at most one item is pending, and a new item replaces it whatever its kind, since
+    nobody will paste the older clipboard state (text or image).
+    `put` never blocks, so detection never waits on the network.
+    """
+
+    def __init__(self):
+        self._pending: Optional[OutboundItem] = None
+        self._not_empty: Optional[asyncio.Event] = None
+        self.enqueued_count = 0
+        self.coalesced_count = 0
+
+    def _event(self) -> asyncio.Event:
+        # Created lazily so the queue can be built outside a running loop
+        if self._not_empty is None:
+            self._not_empty = asyncio.Event()
+        return self._not_empty
+
+    def put(self, item: OutboundItem):
+        if self._pending is not None:
+            self.coalesced_count += 1
+            logger.debug(f"Pending {self._pending.kind} item superseded by a newer {item.kind} item.")
+        self._pending = item
+        self.enqueued_count += 1
+        self._event().set()
+
+    async def get(self) -> OutboundItem:
+        while self._pending is None:
+            event = self._event()
+            event.clear()
+            await event.wait()
+        item, self._pending = self._pending, None
+        return item
+
+    def __len__(self) -> int:
+        return 1 if self._pending is not None else 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'pending': len(self),
+            'enqueued': self.enqueued_count,
+            'coalesced': self.coalesced_count,
+        }
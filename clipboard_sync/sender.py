@@ -1,17 +1,24 @@
 # -*- coding: utf-8 -*-
 import asyncio
-import time
 import logging
 import aiohttp # Import aiohttp
 from typing import Dict, Any, Optional
 
 from .clipboard_manager import ClipboardManager
 from .ntfy_client import NtfyClient
+from .clipboard_watcher import create_watcher
+from .poll_scheduler import create_poll_scheduler
+from .send_queue import CoalescingSendQueue, OutboundItem
+from .spool import OutboundSpool, SpooledItem, create_spool
+from .config import get_state_dir
+from .utils import ExponentialBackoff
+from .echo import get_echo_suppressor
+from .image_pipeline import create_image_pipeline
 
 logger = logging.getLogger("Sender")
 
 class ClipboardSender:
-    """Monitors the local clipboard and sends new text content to ntfy."""
+    """Monitors the local clipboard and sends new text and image content to ntfy."""
 
     # Modify __init__ to accept and store the session
     def __init__(self, config: Dict[str, Any], clipboard_manager: ClipboardManager, ntfy_client: NtfyClient, shared_state: Dict, session: aiohttp.ClientSession):
@@ -20,10 +27,35 @@ class ClipboardSender:
         self.ntfy_client = ntfy_client
         self.shared_state = shared_state
         self.session = session # Store the session
+        # Digests of content the receiver wrote, so it is not sent straight back
+        self.echo_suppressor = get_echo_suppressor(shared_state, config)
 
         self.enabled = self.config.get('enabled', False)
         self.poll_interval = float(self.config.get('poll_interval_seconds', 1.0))
-        self.last_posted_text: Optional[str] = None
+        images_cfg = self.config.get('images') or {}
+        self.send_images = bool(images_cfg.get('enabled', True)) and clipboard_manager.image_capture_enabled
+        self.max_image_bytes = int(images_cfg.get('max_bytes', 15 * 1024 * 1024))
+        # Downscaling/recompression before upload, off the event loop (sender.images.transcode)
+        self.image_pipeline = create_image_pipeline(config, 'sender') if self.send_images else None
+        self.last_queued_digest: Optional[str] = None
+        # Detection hands items to a separate send worker; superseded states are coalesced
+        self.send_queue = CoalescingSendQueue()
+        self._send_worker_task: Optional[asyncio.Task] = None
+        # Durable spool for failed sends, drained by a retry worker with backoff
+        self.spool: Optional[OutboundSpool] = None
+        self._retry_task: Optional[asyncio.Task] = None
+        self._retry_wakeup: Optional[asyncio.Event] = None
+        retry_cfg = self.config.get('retry') or {}
+        self.retry_backoff = ExponentialBackoff(
+            initial=float(retry_cfg.get('initial_delay_seconds', 2.0)),
+            maximum=float(retry_cfg.get('max_delay_seconds', 300.0)),
+            factor=float(retry_cfg.get('backoff_factor', 2.0)),
+            jitter=float(retry_cfg.get('jitter', 0.5)),
+        )
+        # Adaptive polling: fast right after activity, backing off while idle (used when polling)
+        self.scheduler = create_poll_scheduler(self.config)
+        self.watcher = create_watcher(clipboard_manager, self.config, self.scheduler)
+        self._seen_remote_activity = None
 
         if not self.enabled:
             logger.info("Clipboard Sender is disabled in the configuration.")
@@ -35,7 +67,13 @@ class ClipboardSender:
              logger.error("Sender requires an aiohttp ClientSession but none was provided. Disabling sender.")
              self.enabled = False
         else:
-             logger.info(f"Clipboard Sender initialized. Polling interval: {self.poll_interval}s")
+             self.spool = create_spool(self.config, get_state_dir(config))
+             if self.send_images:
+                 logger.info(f"Clipboard images up to {self.max_image_bytes} bytes will be sent.")
+             if self.watcher.event_driven:
+                 logger.info(f"Clipboard Sender initialized. Watching clipboard via '{self.watcher.name}' notifications.")
+             else:
+                 logger.info(f"Clipboard Sender initialized. Polling every {self.scheduler.min_interval}-{self.scheduler.max_interval}s.")
 
 
     async def run(self):
@@ -44,55 +82,190 @@ class ClipboardSender:
             return
 
         logger.info("Starting clipboard monitoring loop (Sender)...")
+        await self.watcher.start()
+        self._send_worker_task = asyncio.create_task(self._send_worker(), name="SenderWorker")
+        if self.spool:
+            self._retry_wakeup = asyncio.Event()
+            self._retry_task = asyncio.create_task(self._retry_worker(), name="SenderRetry")
+        try:
+            while True:
+                changed = await self.check_and_send()
+                self._note_remote_activity()
+                self.scheduler.record_wake(changed)
+                # Handle potential CancelledError while waiting for the next change
+                try:
+                    if await self.watcher.wait_for_change():
+                        self.clipboard.notify_change()
+                except asyncio.CancelledError:
+                    logger.info("Sender wait interrupted by cancellation.")
+                    break # Exit loop on cancellation
+                # Without notifications (polling, or a watcher that fell back to it) images are probed every check
+                self.clipboard.change_notifications = self.watcher.event_driven
+        finally:
+            for task in (self._send_worker_task, self._retry_task):
+                if task:
+                    task.cancel()
+                    try:
+                        await task
+                    except asyncio.CancelledError:
+                        pass
+            await self.watcher.close()
+            if self.spool:
+                self.spool.close()
+
+    async def _send_worker(self):
+        """Sends queued clipboard states one at a time, always taking the newest pending one."""
         while True:
-            await self.check_and_send()
-            # Handle potential CancelledError during sleep
+            item = await self.send_queue.get()
             try:
-                await asyncio.sleep(self.poll_interval)
+                await self._send_item(item)
             except asyncio.CancelledError:
-                logger.info("Sender sleep interrupted by cancellation.")
-                break # Exit loop on cancellation
+                raise
+            except Exception as e:
+                logger.error(f"Error in sender worker: {e}", exc_info=True)
+
+    async def _post_item(self, item: OutboundItem) -> bool:
+        if item.kind == 'image':
+            return await self.ntfy_client.post_image(self.session, item.content, item.digest)
+        # --- Inline message for short text, attachment otherwise ---
+        return await self.ntfy_client.post_text(self.session, item.content)
+
+    def _on_item_sent(self, item: OutboundItem):
+        logger.info(f"Successfully sent clipboard {item.kind} to ntfy.")
+
+    async def _prepare_image(self, item: OutboundItem) -> Optional[OutboundItem]:
+        """Runs the image pipeline on a captured image; returns None if it is still too large to send."""
+        if self.image_pipeline:
+            processed = await self.image_pipeline.process(item.content)
+            if processed:
+                # The digest stays that of the captured image, so echo and duplicate checks still match it
+                item = OutboundItem('image', processed.data, item.digest)
+        if len(item.content) > self.max_image_bytes:
+            logger.warning(f"Clipboard image ({len(item.content)} bytes) exceeds sender.images.max_bytes ({self.max_image_bytes}). Not sending it.")
+            return None
+        return item
+
+    async def _send_item(self, item: OutboundItem):
+        loop = asyncio.get_running_loop()
+        if item.kind == 'image':
+            item = await self._prepare_image(item)
+            if item is None:
+                return
+        if self.spool and await loop.run_in_executor(None, self.spool.count):
+            # Older items are still waiting: append behind them so delivery order is preserved
+            logger.info("Undelivered items are pending. Spooling new clipboard content behind them.")
+            await self._spool_item(item)
+            return
+
+        if await self._post_item(item):
+            self._on_item_sent(item)
+            return
+
+        if self.last_queued_digest == item.digest:
+            self.last_queued_digest = None # Allow the same content to be queued again
+        if self.spool:
+            logger.warning(f"Failed to send clipboard {item.kind} to ntfy. Spooled for retry.")
+            await self._spool_item(item)
+        else:
+            logger.warning(f"Failed to send clipboard {item.kind} to ntfy.")
+
+    async def _spool_item(self, item: OutboundItem):
+        payload = item.content.encode('utf-8') if isinstance(item.content, str) else item.content
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.spool.add, item.kind, payload, item.digest, item.filename)
+        self._retry_wakeup.set()
 
+    @staticmethod
+    def _item_from_spool(spooled: SpooledItem) -> OutboundItem:
+        content = spooled.payload.decode('utf-8') if spooled.kind == 'text' else spooled.payload
+        return OutboundItem(spooled.kind, content, spooled.digest, spooled.filename)
 
-    async def check_and_send(self):
+    async def _retry_worker(self):
         """
-        Checks the clipboard and sends content if necessary.
-        Uses run_in_executor for clipboard access.
-        Uses aiohttp session for posting.
+        Drains the spool oldest-first. After a failure it waits with exponential backoff and
+        jitter, but new content being spooled (a fresh copy) cuts the wait short and triggers
+        an immediate attempt; once a send succeeds the remaining items go out back to back.
         """
-        try:
-            current_loop = asyncio.get_running_loop()
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                self._retry_wakeup.clear() # Anything spooled from here on wakes the next wait
+                spooled = await loop.run_in_executor(None, self.spool.oldest)
+                if spooled is None:
+                    await self._retry_wakeup.wait()
+                    continue
 
-            # Clipboard checks still run in executor
-            changed = await current_loop.run_in_executor(None, self.clipboard.has_changed)
-            if not changed:
-                 return
+                item = self._item_from_spool(spooled)
+                if await self._post_item(item):
+                    await loop.run_in_executor(None, self.spool.remove, spooled.id)
+                    self.retry_backoff.reset()
+                    self._on_item_sent(item)
+                    continue
 
-            current_text = await current_loop.run_in_executor(None, self.clipboard.get_text)
-            await current_loop.run_in_executor(None, self.clipboard.update_last_change_count)
+                await loop.run_in_executor(None, self.spool.record_attempt, spooled.id)
+                await loop.run_in_executor(None, self.spool.prune)
+                delay = self.retry_backoff.next_delay()
+                logger.warning(f"Retry of spooled clipboard {spooled.kind} failed (attempt {spooled.attempts + 1}). Next retry in {delay:.1f}s.")
+                try:
+                    await asyncio.wait_for(self._retry_wakeup.wait(), timeout=delay)
+                    logger.info("New clipboard content was spooled. Retrying now.")
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in sender retry worker: {e}", exc_info=True)
+                await asyncio.sleep(self.retry_backoff.next_delay())
 
-            if not current_text:
-                return
+    def _note_remote_activity(self):
+        """Treats content written by the receiver as activity, so polling speeds up after it."""
+        remote_activity = self.shared_state.get('_last_remote_activity')
+        if remote_activity is not None and remote_activity != self._seen_remote_activity:
+            self._seen_remote_activity = remote_activity
+            self.scheduler.record_activity()
 
-            if current_text == self.last_posted_text:
-                return
+    async def check_and_send(self) -> bool:
+        """
+        Checks the clipboard and queues new content for the send worker.
+        Clipboard access runs on the clipboard manager's dedicated thread;
+        the network send happens in _send_worker, so this never waits on the uplink.
+        Returns True if the clipboard had changed since the last check.
+        """
+        try:
+            # Change count, content and digest in a single hop to the clipboard thread
+            snapshot = await self.clipboard.run_io(self.clipboard.snapshot, self.send_images)
+            if not snapshot.changed:
+                 return False
 
-            last_received = self.shared_state.get('_last_received_text')
-            if current_text == last_received:
-                logger.info("Clipboard content matches the last received content. Skipping send to prevent loop.")
-                return
+            current_text = snapshot.text
+            image = snapshot.image
+            current_digest = snapshot.digest
+            if self.echo_suppressor.is_echo(current_digest):
+                logger.info("Clipboard content matches recently received content. Skipping send to prevent loop.")
+                return True
+            # Any other change replaced what the receiver wrote, so copying that content again is deliberate
+            self.echo_suppressor.clear()
 
-            logger.info("Detected new clipboard text, preparing to send...")
+            if not current_text and image is None:
+                return True
 
-            # --- Use the stored session to call the async post_text_as_file ---
-            success = await self.ntfy_client.post_text_as_file(self.session, current_text)
+            # Unchanged content (e.g. the same screenshot seen again) is skipped by digest, before any upload
+            if current_digest == self.last_queued_digest:
+                return True
 
-            if success:
-                logger.info("Successfully sent new clipboard text to ntfy.")
-                self.last_posted_text = current_text
-                self.shared_state['_last_received_text'] = None
-            else:
-                logger.warning("Failed to send clipboard text to ntfy.")
+            if image is not None:
+                if not image.format:
+                    logger.warning(f"Clipboard image ({len(image.data)} bytes) is not in a recognized format. Not sending it.")
+                    return True
+                logger.info(f"Detected new clipboard image ({image.format}, {len(image.data)} bytes), queueing it for sending...")
+                self.last_queued_digest = current_digest
+                self.send_queue.put(OutboundItem('image', image.data, current_digest))
+                return True
+
+            logger.info("Detected new clipboard text, queueing it for sending...")
+            self.last_queued_digest = current_digest
+            self.send_queue.put(OutboundItem('text', current_text, current_digest))
+            return True
 
         # Add explicit CancelledError handling here too
         except asyncio.CancelledError:
@@ -110,4 +283,5 @@ class ClipboardSender:
                  logger.info("Sender error sleep interrupted by cancellation.")
                  # Exit immediately if cancelled during error sleep
                  # Re-raising ensures the run loop breaks
-                 raise
\ No newline at end of file
+                 raise
+            return False
\ No newline at end of file
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, NamedTuple
+
+logger = logging.getLogger("Spool")
+
+
+class SpooledItem(NamedTuple):
+    id: int
+    kind: str
+    payload: bytes
+    digest: Optional[str]
+    filename: Optional[str]
+    created_at: float
+    attempts: int
+
+
+class OutboundSpool:
+    """
+    Disk-backed (SQLite) store for clipboard items that could not be sent.
+    Items survive restarts and are bounded by age, count and total size;
+    the oldest items are evicted first. Methods are blocking and thread-safe,
+    so callers run them in an executor.
+    """
+
+    def __init__(self, path: str, max_age_seconds: float = 24 * 3600, max_items: int = 50,
+                 max_bytes: int = 50 * 1024 * 1024):
+        self.path = path
+        self.max_age_seconds = max_age_seconds
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " kind TEXT NOT NULL,"
+            " payload BLOB NOT NULL,"
+            " digest TEXT,"
+            " filename TEXT,"
+            " created_at REAL NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0)"
+        )
+        self.prune()
+        pending = self.count()
+        if pending:
+            logger.info(f"Outgoing spool at {path} has {pending} undelivered item(s) from a previous run.")
+
+    def add(self, kind: str, payload: bytes, digest: Optional[str] = None, filename: Optional[str] = None) -> int:
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO outbox (kind, payload, digest, filename, created_at) VALUES (?, ?, ?, ?, ?)",
+                (kind, sqlite3.Binary(payload), digest, filename, time.time()),
+            )
+            item_id = cursor.lastrowid
+        self.prune()
+        return item_id
+
+    def oldest(self) -> Optional[SpooledItem]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, kind, payload, digest, filename, created_at, attempts FROM outbox ORDER BY id LIMIT 1"
+            ).fetchone()
+        if not row:
+            return None
+        return SpooledItem(row[0], row[1], bytes(row[2]), row[3], row[4], row[5], row[6])
+
+    def remove(self, item_id: int):
+        with self._lock:
+            self._db.execute("DELETE FROM outbox WHERE id = ?", (item_id,))
+
+    def record_attempt(self, item_id: int):
+        with self._lock:
+            self._db.execute("UPDATE outbox SET attempts = attempts + 1 WHERE id = ?", (item_id,))
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def prune(self) -> int:
+        """Evicts expired items, then the oldest ones beyond the count and size limits."""
+        removed = 0
+        with self._lock:
+            cursor = self._db.execute("DELETE FROM outbox WHERE created_at < ?", (time.time() - self.max_age_seconds,))
+            removed += cursor.rowcount
+            cursor = self._db.execute(
+                "DELETE FROM outbox WHERE id NOT IN (SELECT id FROM outbox ORDER BY id DESC LIMIT ?)",
+                (self.max_items,),
+            )
+            removed += cursor.rowcount
+            # Keep the newest items whose cumulative size fits in max_bytes
+            rows = self._db.execute("SELECT id, LENGTH(payload) FROM outbox ORDER BY id DESC").fetchall()
+            total = 0
+            for item_id, size in rows:
+                total += size
+                if total > self.max_bytes:
+                    cursor = self._db.execute("DELETE FROM outbox WHERE id <= ?", (item_id,))
+                    removed += cursor.rowcount
+                    break
+        if removed:
+            logger.warning(f"Evicted {removed} item(s) from the outgoing spool (age/size limits).")
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(payload)), 0) FROM outbox").fetchone()
+        return {'pending': count, 'bytes': size}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def create_spool(sender_config: Dict[str, Any], state_dir: Optional[str]) -> Optional[OutboundSpool]:
+    """Builds the outgoing spool from sender.spool, or returns None if disabled/unavailable."""
+    spool_cfg = sender_config.get('spool') or {}
+    if not spool_cfg.get('enabled', True):
+        return None
+    if not spool_cfg.get('path') and state_dir is None:
+        logger.error("No usable state directory for the outgoing spool. Failed sends will not be retried.")
+        return None
+    path = os.path.expanduser(spool_cfg.get('path') or os.path.join(state_dir, 'outbox.sqlite3'))
+    try:
+        return OutboundSpool(
+            path,
+            max_age_seconds=float(spool_cfg.get('max_age_seconds', 24 * 3600)),
+            max_items=int(spool_cfg.get('max_items', 50)),
+            max_bytes=int(spool_cfg.get('max_bytes', 50 * 1024 * 1024)),
+        )
+    except (sqlite3.Error, OSError) as e:
+        logger.error(f"Cannot open outgoing spool at {path}: {e}. Failed sends will not be retried.")
+        return None
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+import logging
+import re
+from typing import Any, Dict, List, NamedTuple, Optional
+
+logger = logging.getLogger("Topics")
+
+# ntfy topic names: letters, digits, '-' and '_', at most 64 characters
+TOPIC_NAME_RE = re.compile(r'^[-_A-Za-z0-9]{1,64}$')
+DEFAULT_PRIORITY = 3 # What ntfy assumes for messages published without a priority
+
+
+class TopicPolicy(NamedTuple):
+    """How messages from one subscribed topic are handled."""
+    topic: str
+    text: bool = True # Copy text (inline bodies, text attachments, image URLs on non-macOS)
+    images: bool = True # Download and copy image attachments
+    min_priority: int = 1 # Ignore messages published with a lower ntfy priority (1-5)
+
+    def accepts_priority(self, message: Dict[str, Any]) -> bool:
+        try:
+            priority = int(message.get('priority') or DEFAULT_PRIORITY)
+        except (TypeError, ValueError):
+            priority = DEFAULT_PRIORITY
+        return priority >= self.min_priority
+
+
+def _topic_entries(receiver_cfg: Dict[str, Any]) -> List[Any]:
+    """receiver.topics (names or policy dicts), falling back to receiver.ntfy_topic ('a,b' allowed)."""
+    entries = receiver_cfg.get('topics') or receiver_cfg.get('ntfy_topic') or []
+    if isinstance(entries, (str, dict)):
+        entries = [entries]
+    expanded = []
+    for entry in entries:
+        if isinstance(entry, str):
+            expanded.extend(name.strip() for name in entry.split(',') if name.strip())
+        else:
+            expanded.append(entry)
+    return expanded
+
+
+def parse_topic_policy(entry: Any) -> Optional[TopicPolicy]:
+    """Builds a TopicPolicy from a topic name or a {topic, text, images, min_priority} dict."""
+    if isinstance(entry, str):
+        return TopicPolicy(entry)
+    if not isinstance(entry, dict) or not entry.get('topic'):
+        return None
+    return TopicPolicy(
+        topic=str(entry['topic']),
+        text=bool(entry.get('text', True)),
+        images=bool(entry.get('images', True)),
+        min_priority=int(entry.get('min_priority', 1)),
+    )
+
+
+def load_topic_policies(receiver_cfg: Optional[Dict[str, Any]]) -> Dict[str, TopicPolicy]:
+    """Subscribed topics in configured order, each with its handling policy."""
+    policies: Dict[str, TopicPolicy] = {}
+    for entry in _topic_entries(receiver_cfg or {}):
+        policy = parse_topic_policy(entry)
+        if policy is None:
+            logger.warning(f"Ignoring invalid receiver topic entry: {entry!r}")
+        elif policy.topic in policies:
+            logger.warning(f"Topic '{policy.topic}' is listed more than once; using its first entry.")
+        else:
+            policies[policy.topic] = policy
+    return policies
+
+
+def get_topic_names(receiver_cfg: Optional[Dict[str, Any]]) -> List[str]:
+    return list(load_topic_policies(receiver_cfg))
+
+
+def validate_topics(receiver_cfg: Dict[str, Any]) -> Optional[str]:
+    """Returns an error message if the configured receiver topics are unusable, else None."""
+    entries = _topic_entries(receiver_cfg)
+    if not entries:
+        return "Receiver is enabled but neither 'receiver.topics' nor 'receiver.ntfy_topic' is set."
+    for entry in entries:
+        try:
+            policy = parse_topic_policy(entry)
+        except (TypeError, ValueError):
+            policy = None
+        if policy is None:
+            return f"Invalid receiver topic entry: {entry!r}. Use a name or a dict with 'topic'."
+        if "YOUR_RECEIVE_TOPIC_HERE" in policy.topic:
+            return "Receiver is enabled but 'receiver.ntfy_topic' is missing or not set."
+        if not TOPIC_NAME_RE.match(policy.topic):
+            return f"Invalid receiver topic '{policy.topic}'. Use 1-64 letters, digits, '-' or '_'."
+        if not 1 <= policy.min_priority <= 5:
+            return f"Invalid 'min_priority' for topic '{policy.topic}'. Must be between 1 and 5."
+    return None
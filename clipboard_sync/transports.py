@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from .config import get_server_base_url
+
+logger = logging.getLogger("Transport")
+
+
+class ConnectionClosed(Exception):
+    """The subscription stream ended; the receiver reconnects."""
+
+
+def get_network_config(config: Dict[str, Any]) -> Dict[str, Any]:
+    return (config or {}).get('network') or {}
+
+
+def create_connector(config: Dict[str, Any]) -> aiohttp.TCPConnector:
+    """
+    Connection pool shared by uploads, downloads and the WebSocket subscription.
+    DNS answers are cached and idle connections kept alive, so requests to the ntfy
+    server reuse an established (TLS) connection instead of a fresh handshake.
+    """
+    net_cfg = get_network_config(config)
+    dns_ttl = net_cfg.get('dns_cache_ttl_seconds', 300)
+    return aiohttp.TCPConnector(
+        use_dns_cache=dns_ttl is not None,
+        ttl_dns_cache=dns_ttl,
+        limit=int(net_cfg.get('max_connections', 32)),
+        limit_per_host=int(net_cfg.get('max_connections_per_host', 8)),
+        keepalive_timeout=float(net_cfg.get('keepalive_timeout_seconds', 60)),
+        enable_cleanup_closed=True,
+    )
+
+
+def create_session(config: Dict[str, Any]) -> aiohttp.ClientSession:
+    """
+    Creates the application's shared ClientSession on a tuned connector (call inside the event loop).
+    HTTP(S)_PROXY environment settings are honoured, as the previous WebSocket client did.
+    """
+    net_cfg = get_network_config(config)
+    return aiohttp.ClientSession(connector=create_connector(config), trust_env=bool(net_cfg.get('trust_env', True)))
+
+
+def _origin(url: Optional[str]) -> Optional[str]:
+    if not url:
+        return None
+    parts = urlsplit(url)
+    if not parts.scheme or not parts.netloc:
+        return None
+    scheme = {'ws': 'http', 'wss': 'https'}.get(parts.scheme, parts.scheme)
+    return f"{scheme}://{parts.netloc}"
+
+
+def get_warmup_origins(config: Dict[str, Any]) -> List[str]:
+    """Distinct ntfy server origins used by the enabled sender/receiver."""
+    origins = []
+    sender_cfg = config.get('sender') or {}
+    if sender_cfg.get('enabled'):
+        origins.append(_origin(sender_cfg.get('ntfy_topic_url')))
+    if (config.get('receiver') or {}).get('enabled'):
+        origins.append(_origin(get_server_base_url(config)))
+    return list(dict.fromkeys(o for o in origins if o))
+
+
+async def warm_up_connections(session: aiohttp.ClientSession, config: Dict[str, Any],
+                              origins: Optional[List[str]] = None):
+    """
+    Opens a pooled keep-alive connection to each ntfy server at startup (DNS, TCP and TLS
+    done up front), so the first send or download does not pay for the handshake.
+    Uses ntfy's lightweight /v1/health endpoint; any HTTP answer is good enough.
+    `origins` overrides the servers taken from the config (the hub passes all tenants' servers).
+    """
+    net_cfg = get_network_config(config)
+    if not net_cfg.get('warmup', True):
+        return
+    timeout = aiohttp.ClientTimeout(total=float(net_cfg.get('warmup_timeout_seconds', 5)))
+
+    async def warm(origin: str):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            async with session.get(f"{origin}/v1/health", timeout=timeout) as response:
+                await response.read() # Drain the body so the connection returns to the pool
+            logger.info(f"Warmed up connection to {origin} in {(loop.time() - started) * 1000:.0f} ms.")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Connection warmup to {origin} failed: {e or type(e).__name__}")
+
+    origins = get_warmup_origins(config) if origins is None else origins
+    if origins:
+        await asyncio.gather(*(warm(origin) for origin in origins))
+
+
+class SubscriptionTransport:
+    """
+    A live ntfy subscription. connect() opens it; iterating yields each event as its JSON
+    text (message, keepalive, open, ...); ConnectionClosed is raised when the stream ends.
+    """
+
+    name = 'base'
+    # Whether the server sends keepalive events on this stream (checked by the receiver's stall detection)
+    keepalive_events = True
+
+    def __init__(self, session: aiohttp.ClientSession, url: str, connect_timeout: float = 15):
+        self.session = session
+        self.url = url
+        self.connect_timeout = connect_timeout
+
+    async def connect(self):
+        raise NotImplementedError
+
+    def __aiter__(self) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class WebSocketTransport(SubscriptionTransport):
+    """
+    ntfy /ws subscription on the shared session, with client heartbeats. ntfy keeps WebSocket
+    subscriptions alive with ping control frames, which aiohttp answers without yielding
+    them, so liveness here comes from the heartbeat's pongs rather than keepalive events.
+    """
+
+    name = 'websocket'
+    keepalive_events = False
+
+    def __init__(self, session: aiohttp.ClientSession, url: str, connect_timeout: float = 15,
+                 heartbeat: float = 20):
+        super().__init__(session, url, connect_timeout)
+        self.heartbeat = heartbeat
+        self._ws: Optional[aiohttp.ClientWebSocketResponse] = None
+
+    async def connect(self):
+        # The handshake is bounded here; once open, liveness is checked by the heartbeat
+        self._ws = await asyncio.wait_for(
+            self.session.ws_connect(self.url, heartbeat=self.heartbeat, autoping=True),
+            timeout=self.connect_timeout,
+        )
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        ws = self._ws
+        if ws is None:
+            raise ConnectionClosed("not connected")
+        async for msg in ws:
+            if msg.type == aiohttp.WSMsgType.TEXT:
+                yield msg.data
+            elif msg.type == aiohttp.WSMsgType.BINARY:
+                yield msg.data.decode('utf-8', errors='replace')
+            elif msg.type == aiohttp.WSMsgType.ERROR:
+                raise ConnectionClosed(f"WebSocket error: {ws.exception()}")
+        raise ConnectionClosed(f"closed (code {ws.close_code})")
+
+    async def close(self):
+        if self._ws is not None and not self._ws.closed:
+            try:
+                # A dead peer never answers the close handshake; do not wait on it indefinitely
+                await asyncio.wait_for(self._ws.close(), timeout=self.connect_timeout)
+            except asyncio.TimeoutError:
+                logger.debug("WebSocket close handshake timed out.")
+        self._ws = None
+
+
+class _HttpStreamTransport(SubscriptionTransport):
+    """
+    Base for plain HTTP streaming subscriptions, which pass through proxies that break
+    WebSocket upgrades. ntfy sends a keepalive event every ~45s, so a read that sees no
+    data for `read_timeout` seconds means the stream is dead.
+    """
+
+    def __init__(self, session: aiohttp.ClientSession, url: str, connect_timeout: float = 15,
+                 read_timeout: float = 90):
+        super().__init__(session, url, connect_timeout)
+        self.read_timeout = read_timeout
+        self._response: Optional[aiohttp.ClientResponse] = None
+
+    async def connect(self):
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=self.connect_timeout, sock_read=self.read_timeout)
+        response = await asyncio.wait_for(self.session.get(self.url, timeout=timeout), timeout=self.connect_timeout)
+        try:
+            response.raise_for_status()
+        except aiohttp.ClientResponseError:
+            response.release()
+            raise
+        self._response = response
+
+    async def _lines(self) -> AsyncIterator[str]:
+        response = self._response
+        if response is None:
+            raise ConnectionClosed("not connected")
+        try:
+            async for raw_line in response.content:
+                yield raw_line.decode('utf-8', errors='replace').rstrip('\r\n')
+        except asyncio.TimeoutError:
+            raise ConnectionClosed(f"no data for {self.read_timeout}s")
+        except aiohttp.ClientPayloadError as e:
+            raise ConnectionClosed(f"stream interrupted: {e}")
+        raise ConnectionClosed("stream ended by server")
+
+    async def close(self):
+        if self._response is not None:
+            self._response.close()
+        self._response = None
+
+
+class JsonStreamTransport(_HttpStreamTransport):
+    """ntfy /json subscription: one JSON event per line."""
+
+    name = 'json'
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        async for line in self._lines():
+            if line:
+                yield line
+
+
+class SseTransport(_HttpStreamTransport):
+    """ntfy /sse subscription (Server-Sent Events); each event's data is the JSON event."""
+
+    name = 'sse'
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        data_lines: List[str] = []
+        async for line in self._lines():
+            if not line:
+                # A blank line ends the event
+                if data_lines:
+                    yield '\n'.join(data_lines)
+                    data_lines = []
+            elif line.startswith('data:'):
+                data_lines.append(line[5:].lstrip(' '))
+            # 'event:', 'id:', 'retry:' and ':' comment lines carry nothing the JSON lacks
+
+
+def create_transport(name: str, session: aiohttp.ClientSession, url: str, connect_timeout: float = 15,
+                     read_timeout: float = 90, heartbeat: float = 20) -> SubscriptionTransport:
+    """Builds the subscription transport selected by receiver.transport."""
+    if name == 'json':
+        return JsonStreamTransport(session, url, connect_timeout, read_timeout)
+    if name == 'sse':
+        return SseTransport(session, url, connect_timeout, read_timeout)
+    return WebSocketTransport(session, url, connect_timeout, heartbeat=heartbeat)
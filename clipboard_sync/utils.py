@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
+import hashlib
 import logging
+import random
 import sys
+from typing import Callable, Optional, Union
 
 # --- 日志设置 ---
 def setup_logging(log_level_str="INFO"):
@@ -13,7 +16,6 @@ def setup_logging(log_level_str="INFO"):
     )
     # 为第三方库设置稍微安静的日志级别，除非全局是 DEBUG
     if log_level > logging.DEBUG:
-        logging.getLogger("websockets").setLevel(logging.WARNING)
         logging.getLogger("aiohttp").setLevel(logging.WARNING)
 
     root_logger = logging.getLogger() # 获取根 logger
@@ -41,4 +43,46 @@ def check_pyobjc():
             return False
     else:
         logging.getLogger(__name__).info(f"Running on non-macOS platform ({sys.platform}). PyObjC check skipped.")
-        return False # 在非 macOS 上认为 PyObjC 不可用
\ No newline at end of file
+        return False # 在非 macOS 上认为 PyObjC 不可用
+
+# --- 内容摘要 ---
+def content_digest(content: Optional[Union[str, bytes]]) -> Optional[str]:
+    """
+    Returns a short hex digest identifying clipboard content (text or bytes).
+    Used for cheap change detection and comparisons instead of full-content equality.
+    """
+    if content is None:
+        return None
+    if isinstance(content, str):
+        content = content.encode('utf-8', errors='surrogatepass')
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+
+# --- 重试退避 ---
+class ExponentialBackoff:
+    """
+    Exponential backoff with jitter for retries and reconnects.
+    Each call to next_delay() returns the current delay randomized by +/- `jitter`
+    (a fraction), then multiplies the base delay by `factor` up to `maximum`.
+    """
+
+    def __init__(self, initial: float = 1.0, maximum: float = 300.0, factor: float = 2.0,
+                 jitter: float = 0.5, rng: Callable[[], float] = random.random):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = min(max(jitter, 0.0), 1.0)
+        self.rng = rng
+        self.attempts = 0
+        self._current = initial
+
+    def next_delay(self) -> float:
+        base = self._current
+        self._current = min(self._current * self.factor, self.maximum)
+        self.attempts += 1
+        spread = base * self.jitter
+        return max(0.0, base - spread + 2 * spread * self.rng())
+
+    def reset(self):
+        self.attempts = 0
+        self._current = self.initial
@@ -6,16 +6,19 @@ import asyncio
 import logging
 import sys
 import signal
-import aiohttp # Import aiohttp
 from typing import Dict
 
 # --- Project Imports ---
-from clipboard_sync.config import load_config
+from clipboard_sync.config import load_config, get_clipboard_config
 from clipboard_sync.utils import setup_logging, check_pyobjc
 from clipboard_sync.clipboard_manager import ClipboardManager
 from clipboard_sync.ntfy_client import NtfyClient
 from clipboard_sync.sender import ClipboardSender
 from clipboard_sync.receiver import NtfyReceiver
+from clipboard_sync.echo import create_echo_suppressor
+from clipboard_sync.transports import create_session, warm_up_connections
+from clipboard_sync.hub import ClipboardHub, get_hub_warmup_origins, install_tenant_logging, load_hub_config
+from clipboard_sync.image_pipeline import shutdown_process_pool
 
 # --- Global Logger ---
 # Setup basic logging first to catch early errors, will be reconfigured by config
@@ -23,9 +26,10 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - [%
 logger = logging.getLogger("Main")
 
 # --- Shared State ---
-# Used to prevent the sender from immediately re-sending content just received.
+# echo_suppressor (created from config in main) prevents the sender from re-sending content just received.
 shared_state: Dict[str, any] = {
-    "_last_received_text": None,
+    "echo_suppressor": None,
+    "_last_remote_activity": None, # monotonic time of the last clipboard write by the receiver
 }
 
 # --- Signal Handling ---
@@ -51,8 +55,19 @@ async def main():
         default=None, # Default is None, meaning rely on config file
         help="Specify the operating mode: 'sender', 'receiver', or 'both'. Overrides config.yaml."
     )
+    parser.add_argument(
+        "--hub",
+        type=str,
+        default=None,
+        metavar="HUB_CONFIG",
+        help="Run in hub mode: serve every tenant listed in HUB_CONFIG from this process (see config/hub.yaml.example)."
+    )
     args = parser.parse_args()
 
+    if args.hub:
+        await run_hub(args.hub)
+        return
+
     # --- Load Configuration ---
     config = load_config()
     if not config:
@@ -98,17 +113,22 @@ async def main():
          logger.info("Running on non-macOS platform. Image clipboard operations will be skipped by receiver.")
 
     # --- Create shared aiohttp ClientSession ---
+    # One tuned connection pool (DNS cache, keep-alive) for uploads, downloads and the WebSocket.
     # Use async with for proper session management (creation and closing)
-    async with aiohttp.ClientSession() as session:
+    async with create_session(config) as session:
         logger.info("Shared aiohttp ClientSession created.")
+        # Connect to the ntfy server(s) now, so the first send/download reuses a warm connection
+        await warm_up_connections(session, config)
         sender = None
         receiver = None
+        clipboard_manager = None
         tasks = []
 
         try:
             # --- Initialize Components (pass session) ---
-            clipboard_manager = ClipboardManager(macos_cfg)
+            clipboard_manager = ClipboardManager(macos_cfg, get_clipboard_config(config))
             ntfy_client = NtfyClient(config) # NtfyClient itself doesn't store the session
+            shared_state["echo_suppressor"] = create_echo_suppressor(config)
             # Pass session to Sender and Receiver during initialization
             sender = ClipboardSender(config, clipboard_manager, ntfy_client, shared_state, session)
             receiver = NtfyReceiver(config, clipboard_manager, ntfy_client, shared_state, session)
@@ -198,6 +218,9 @@ async def main():
             raise
         finally:
             # This block runs whether main completes normally or via exception
+            if clipboard_manager:
+                clipboard_manager.close() # Stops the persistent clipboard helper, if any
+            shutdown_process_pool() # Image processing workers, if any were started
             # The 'async with session:' ensures session.close() is called here
             logger.info("aiohttp ClientSession is being closed by 'async with'.")
 
@@ -205,6 +228,41 @@ async def main():
     logger.info("Main coroutine finished.")
 
 
+async def run_hub(hub_config_path: str):
+    """Hub mode: many sender/receiver pairs (tenants) on this event loop, sharing one aiohttp session."""
+    hub_config = load_hub_config(hub_config_path)
+    if not hub_config:
+        logger.critical("Failed to load hub configuration. Exiting.")
+        sys.exit(1)
+    setup_logging((hub_config.get('logging') or {}).get('level', 'INFO'))
+    install_tenant_logging()
+
+    # Every subscription holds a pooled connection, so the single-user pool limits do not apply
+    network_cfg = hub_config.setdefault('network', {}) or {}
+    network_cfg.setdefault('max_connections', 0) # 0 = unlimited
+    network_cfg.setdefault('max_connections_per_host', 0)
+    hub_config['network'] = network_cfg
+
+    async with create_session(hub_config) as session:
+        hub = ClipboardHub(hub_config, session)
+        tenant_configs = hub.tenant_configs()
+        await warm_up_connections(session, hub_config, get_hub_warmup_origins(tenant_configs))
+        hub.build(tenant_configs)
+        if not hub.tenants:
+            logger.warning("No usable tenants in the hub configuration. Nothing to do. Exiting.")
+            return
+        hub.start()
+        logger.info(f"Hub started with {len(hub.tenants)} tenant(s). Press Ctrl+C to stop.")
+        try:
+            await shutdown_event.wait()
+        finally:
+            logger.info("Stopping hub tenants...")
+            await hub.stop()
+            shutdown_process_pool()
+            logger.debug(f"Hub tenant stats: {hub.stats()}")
+    logger.info("Hub finished.")
+
+
 if __name__ == "__main__":
     # Register signal handlers for graceful shutdown
     # Do this *before* starting the event loop
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Microbenchmark of subscription frame parsing: full json.loads on every frame (the old
+receiver behaviour) against clipboard_sync.events.parse_frame with each available decoder.
+
+Frames are read from a recorded stream, one frame per line, e.g. captured with
+    curl -s https://ntfy.sh/<topic>/json > frames.jsonl
+or, without --frames, a synthetic busy stream (mostly keepalives, with opens and
+messages carrying inline text or attachments) is generated.
+
+    python scripts/bench_event_parsing.py
+    python scripts/bench_event_parsing.py --frames frames.jsonl --repeat 20
+"""
+import argparse
+import json
+import os
+import random
+import secrets
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from clipboard_sync.events import HAS_ORJSON, parse_frame, resolve_decoder # noqa: E402
+
+
+def synthetic_frames(count: int, message_ratio: float, topics: int, seed: int = 0):
+    """ntfy-shaped frames: keepalive/open control events mixed with message events."""
+    rng = random.Random(seed)
+    frames = []
+    for i in range(count):
+        topic = f"clip-{i % topics}"
+        base = {'id': secrets.token_hex(6), 'time': 1700000000 + i}
+        roll = rng.random()
+        if roll < message_ratio:
+            event = dict(base, expires=1700043200 + i, event='message', topic=topic)
+            if rng.random() < 0.5:
+                event['message'] = 'x' * rng.randint(20, 3500)
+            else:
+                event.update(message='clipboard_20240101_120000.txt', attachment={
+                    'name': f"clipboard_20240101_120000_{secrets.token_hex(16)}.txt.gz",
+                    'type': 'application/gzip', 'size': rng.randint(4096, 1 << 20),
+                    'expires': 1700010800 + i, 'url': f"https://ntfy.sh/file/{secrets.token_hex(6)}.gz",
+                })
+            frames.append(json.dumps(event, separators=(',', ':')))
+        elif roll < message_ratio + 0.01:
+            frames.append(json.dumps(dict(base, event='open', topic=topic), separators=(',', ':')))
+        else:
+            frames.append(json.dumps(dict(base, event='keepalive', topic=topic), separators=(',', ':')))
+    return frames
+
+
+def load_frames(path: str):
+    with open(path, 'r', encoding='utf-8') as f:
+        frames = [line.rstrip('\n') for line in f]
+    # SSE captures: keep only the data payloads
+    if any(frame.startswith('data:') for frame in frames):
+        frames = [frame[5:].lstrip(' ') for frame in frames if frame.startswith('data:')]
+    return [frame for frame in frames if frame]
+
+
+def baseline(frames):
+    for frame in frames:
+        data = json.loads(frame)
+        data.get('event')
+
+
+def make_fast_path(decode):
+    def run(frames):
+        for frame in frames:
+            parse_frame(frame, decode)
+    return run
+
+
+def bench(fn, frames, repeat: int) -> float:
+    """Best-of-`repeat` seconds per pass over `frames`."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(frames)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ntfy subscription frame parsing")
+    parser.add_argument('--frames', default=None, help="Recorded frames, one per line (default: synthetic)")
+    parser.add_argument('--count', type=int, default=20000, help="Synthetic frame count")
+    parser.add_argument('--message-ratio', type=float, default=0.1, help="Share of synthetic frames that are messages")
+    parser.add_argument('--topics', type=int, default=8, help="Synthetic topics in the stream")
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    frames = load_frames(args.frames) if args.frames else synthetic_frames(args.count, args.message_ratio, args.topics)
+    if not frames:
+        sys.exit("No frames to parse.")
+    messages = sum(1 for frame in frames if parse_frame(frame)[0] == 'message')
+    print(f"{len(frames)} frames ({messages} messages), best of {args.repeat}")
+
+    variants = [('json.loads every frame', baseline),
+                ('fast path + stdlib', make_fast_path(resolve_decoder('stdlib')))]
+    if HAS_ORJSON:
+        variants.append(('fast path + orjson', make_fast_path(resolve_decoder('orjson'))))
+    else:
+        print("(orjson not installed; pip install orjson to include it)")
+
+    reference = None
+    for name, fn in variants:
+        seconds = bench(fn, frames, args.repeat)
+        reference = reference or seconds
+        print(f"{name:<24} {seconds * 1e9 / len(frames):>9.0f} ns/frame  {reference / seconds:>5.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Load test for hub mode: delivered messages per second and memory per tenant as the
+number of tenants grows.
+
+A local ntfy stand-in (scripts/ntfy_standin.py) is started in a subprocess. For each
+tenant count a fresh hub process is measured: tenants form a ring (tenant i sends to
+topic i and receives topic i+1), copies are injected into the tenants' in-memory
+clipboard sinks at a fixed total rate, and the time until each copy lands on the
+neighbouring tenant's clipboard is recorded.
+
+    python scripts/bench_hub.py --tenants 10,50,100,200 --rate 200 --messages-per-tenant 5
+    python scripts/bench_hub.py --server http://ntfy.internal:8080 --tenants 500
+
+Memory per tenant is the growth of the process RSS from before the hub was built to after
+every tenant has connected, divided by the tenant count.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import secrets
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import aiohttp # noqa: E402
+
+from clipboard_sync.clipboard_backends import MemoryBackend # noqa: E402
+from clipboard_sync.hub import ClipboardHub # noqa: E402
+from clipboard_sync.transports import create_session # noqa: E402
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _rss_bytes() -> int:
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 # Peak only, in KiB on Linux
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class RecordingSink(MemoryBackend):
+    """Memory clipboard that records when texts written by the receiver arrive."""
+
+    def __init__(self, arrivals: dict):
+        super().__init__()
+        self.arrivals = arrivals
+
+    def set_text(self, text: str) -> bool:
+        self.arrivals.setdefault(text, time.perf_counter())
+        return super().set_text(text)
+
+
+def hub_config(base_url: str, tenants: int, state_dir: str, prefix: str) -> dict:
+    return {
+        'state_dir': state_dir,
+        'network': {'max_connections': 0, 'max_connections_per_host': 0, 'warmup': False},
+        'defaults': {
+            'sender': {
+                'enabled': True,
+                'watch_mode': 'event',
+                'spool': {'enabled': False},
+                'rate_limit': {'enabled': False},
+            },
+            'receiver': {
+                'enabled': True,
+                'ntfy_server': base_url,
+                'resume': False,
+                'attachment_cache': {'enabled': False},
+            },
+        },
+        'tenants': [
+            {
+                'name': f"t{i}",
+                'sender': {'ntfy_topic_url': f"{base_url}/{prefix}-{i}"},
+                'receiver': {'ntfy_topic': f"{prefix}-{(i + 1) % tenants}"},
+            }
+            for i in range(tenants)
+        ],
+    }
+
+
+async def measure(base_url: str, tenants: int, messages_per_tenant: int, rate: float, settle_timeout: float) -> dict:
+    """Runs one hub with `tenants` tenants in this process and returns its measurements."""
+    arrivals: dict = {}
+    sinks: dict = {}
+
+    def sink_factory(name, config):
+        sinks[name] = RecordingSink(arrivals)
+        return sinks[name]
+
+    rss_before = _rss_bytes()
+    with tempfile.TemporaryDirectory(prefix='hub-bench-') as state_dir:
+        config = hub_config(base_url, tenants, state_dir, f"hub-{secrets.token_hex(3)}")
+        async with create_session(config) as session:
+            hub = ClipboardHub(config, session, sink_factory=sink_factory)
+            started = time.perf_counter()
+            hub.build()
+            hub.start()
+            deadline = time.monotonic() + settle_timeout
+            while sum(t.receiver.connection_stats.live for t in hub.tenants.values()) < tenants:
+                if time.monotonic() > deadline:
+                    break
+                await asyncio.sleep(0.05)
+            connected = sum(t.receiver.connection_stats.live for t in hub.tenants.values())
+            startup_seconds = time.perf_counter() - started
+            await asyncio.sleep(0.5) # Let subscriptions receive their 'open' events
+            rss_connected = _rss_bytes()
+
+            sent_at = {}
+            total = tenants * messages_per_tenant
+            cpu_started = time.process_time()
+            send_started = time.perf_counter()
+            for seq in range(total):
+                name = f"t{seq % tenants}"
+                text = f"bench {seq} {name}"
+                sent_at[text] = time.perf_counter()
+                sinks[name].external_copy(text)
+                await asyncio.sleep(1 / rate if rate else 0)
+
+            deadline = time.monotonic() + settle_timeout
+            while len(arrivals) < total and time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+            cpu_seconds = time.process_time() - cpu_started
+            await hub.stop()
+
+    latencies = [(arrivals[text] - sent_at[text]) * 1000 for text in sent_at if text in arrivals]
+    last_arrival = max(arrivals.values()) if arrivals else send_started
+    result = {
+        'tenants': tenants,
+        'connected': connected,
+        'sent': total,
+        'delivered': len(latencies),
+        'startup_seconds': startup_seconds,
+        'messages_per_second': len(latencies) / (last_arrival - send_started) if latencies else 0.0,
+        'cpu_ms_per_message': cpu_seconds * 1000 / total if total else 0.0,
+        'memory_per_tenant_kib': (rss_connected - rss_before) / tenants / 1024,
+    }
+    if latencies:
+        result.update(p50_ms=statistics.median(latencies), p95_ms=_percentile(latencies, 0.95),
+                      max_ms=max(latencies))
+    return result
+
+
+def print_results(results):
+    header = (f"{'tenants':>8} {'connected':>10} {'delivered':>11} {'startup':>8} {'msg/s':>8}"
+              f" {'p50':>8} {'p95':>8} {'max':>8} {'cpu/msg':>8} {'KiB/tenant':>11}")
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        latency = (f" {r['p50_ms']:>7.1f}m {r['p95_ms']:>7.1f}m {r['max_ms']:>7.1f}m" if 'p50_ms' in r
+                   else f" {'-':>8} {'-':>8} {'-':>8}")
+        print(f"{r['tenants']:>8} {r['connected']:>10} {r['delivered']:>5}/{r['sent']:<5} {r['startup_seconds']:>7.2f}s"
+              f" {r['messages_per_second']:>8.1f}{latency} {r['cpu_ms_per_message']:>7.2f}m {r['memory_per_tenant_kib']:>11.1f}")
+    print("(latency in ms from copy to arrival on the other tenant's clipboard; cpu/msg in ms of hub CPU)")
+
+
+def run_one(args):
+    logging.basicConfig(level=logging.WARNING)
+    result = asyncio.run(measure(args.server, args.one, args.messages_per_tenant, args.rate, args.settle_timeout))
+    print(json.dumps(result))
+
+
+def run_all(args):
+    server_process = None
+    base_url = args.server.rstrip('/') if args.server else None
+    if not base_url:
+        port = _free_port()
+        standin = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ntfy_standin.py')
+        server_process = subprocess.Popen([sys.executable, standin, '--port', str(port)],
+                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        base_url = f"http://127.0.0.1:{port}"
+
+    results = []
+    try:
+        asyncio.run(_wait_for_server(base_url))
+        for tenants in (int(n) for n in args.tenants.split(',')):
+            # A fresh process per size, so memory figures do not carry over between runs
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--one', str(tenants), '--server', base_url,
+                 '--messages-per-tenant', str(args.messages_per_tenant), '--rate', str(args.rate),
+                 '--settle-timeout', str(args.settle_timeout)],
+                capture_output=True, text=True, check=False,
+            )
+            lines = output.stdout.strip().splitlines()
+            if output.returncode != 0 or not lines:
+                print(f"{tenants} tenants: run failed\n{output.stderr[-2000:]}", file=sys.stderr)
+                continue
+            results.append(json.loads(lines[-1]))
+    finally:
+        if server_process:
+            server_process.terminate()
+            server_process.wait(timeout=10)
+    print_results(results)
+
+
+async def _wait_for_server(base_url: str, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.get(f"{base_url}/v1/health") as response:
+                    await response.read()
+                    return
+            except aiohttp.ClientError:
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for clipboard hub mode")
+    parser.add_argument('--server', default=None, help="ntfy base URL (default: start a local stand-in)")
+    parser.add_argument('--tenants', default='10,50,100,200', help="Comma-separated tenant counts")
+    parser.add_argument('--messages-per-tenant', type=int, default=5)
+    parser.add_argument('--rate', type=float, default=200, help="Total copies per second across all tenants")
+    parser.add_argument('--settle-timeout', type=float, default=30, help="Seconds to wait for connections/deliveries")
+    parser.add_argument('--one', type=int, default=None, help=argparse.SUPPRESS) # Child process: measure one size
+    args = parser.parse_args()
+    if args.one:
+        run_one(args)
+    else:
+        run_all(args)
+
+
+if __name__ == '__main__':
+    main()
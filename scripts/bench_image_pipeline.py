@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the image pipeline (clipboard_sync.image_pipeline): size reduction and
+throughput of each transcode policy over a corpus of screenshots, processed on the
+process pool exactly as the sender does, plus the worst event loop stall seen meanwhile.
+
+Images are read from --corpus (every PNG/JPEG/WebP/GIF/BMP/TIFF file in the directory),
+e.g. a folder of real Retina screenshots; without it a synthetic corpus of screenshot-like
+PNGs (flat UI areas, text, a photo region) at common Retina sizes is generated.
+
+    python scripts/bench_image_pipeline.py
+    python scripts/bench_image_pipeline.py --corpus ~/Desktop/Screenshots --workers 4
+"""
+import argparse
+import asyncio
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from clipboard_sync.image_pipeline import ( # noqa: E402
+    HAS_PIL, ImagePipeline, get_image_policy, get_process_pool, shutdown_process_pool,
+)
+from clipboard_sync.images import detect_image_format # noqa: E402
+
+POLICIES = {
+    'png (optimize, strip)': {'format': 'keep', 'max_pixels': 0, 'min_bytes': 0},
+    'png + 4K cap': {'format': 'keep', 'max_pixels': 3840 * 2160, 'min_bytes': 0},
+    'png + 1080p cap': {'format': 'png', 'max_pixels': 1920 * 1080, 'min_bytes': 0},
+    'webp q85 + 4K cap': {'format': 'webp', 'max_pixels': 3840 * 2160, 'quality': 85},
+    'webp q80 + 1080p cap': {'format': 'webp', 'max_pixels': 1920 * 1080, 'quality': 80},
+    'jpeg q85 + 4K cap': {'format': 'jpeg', 'max_pixels': 3840 * 2160, 'quality': 85},
+}
+
+SIZES = [(2880, 1800), (3024, 1964), (3456, 2234), (5120, 2880)]
+
+
+def synthetic_screenshot(width: int, height: int, seed: int) -> bytes:
+    """A screenshot-like PNG: window chrome, text lines, flat panels and a noisy photo region."""
+    from PIL import Image, ImageDraw
+    rng = random.Random(seed)
+    image = Image.new('RGB', (width, height), (236, 236, 236))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([0, 0, width, 56], fill=(210, 210, 214)) # Menu bar
+    for _ in range(3): # Windows with text
+        x0, y0 = rng.randint(0, width // 2), rng.randint(80, height // 2)
+        x1, y1 = min(width - 1, x0 + rng.randint(width // 3, width // 2)), min(height - 1, y0 + rng.randint(height // 3, height // 2))
+        draw.rectangle([x0, y0, x1, y1], fill=(255, 255, 255), outline=(180, 180, 180), width=2)
+        draw.rectangle([x0, y0, x1, y0 + 44], fill=(246, 246, 246))
+        for y in range(y0 + 70, y1 - 30, 34):
+            words = ' '.join(''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(2, 9)))
+                             for _ in range(rng.randint(4, 14)))
+            draw.text((x0 + 24, y), words, fill=(30, 30, 30))
+    # A photo-like region (noise over a gradient) that does not compress well losslessly
+    pw, ph = width // 4, height // 4
+    noise = Image.frombytes('L', (pw, ph), rng.randbytes(pw * ph)).convert('RGB')
+    gradient = Image.linear_gradient('L').resize((pw, ph)).convert('RGB')
+    image.paste(Image.blend(gradient, noise, 0.35), (width - pw - 40, height - ph - 40))
+    output = io.BytesIO()
+    image.save(output, 'PNG', compress_level=6)
+    return output.getvalue()
+
+
+def load_corpus(directory: str):
+    corpus = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            with open(path, 'rb') as f:
+                data = f.read()
+            if detect_image_format(data):
+                corpus.append((name, data))
+    return corpus
+
+
+async def measure_loop_stall(stop: asyncio.Event, interval: float = 0.005) -> float:
+    """Worst lateness of a periodic timer: how long the event loop was blocked at most."""
+    worst = 0.0
+    while not stop.is_set():
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - expected)
+    return worst
+
+
+async def run_policy(corpus, policy_cfg, workers: int):
+    pipeline = ImagePipeline(get_image_policy(policy_cfg), 'sender', workers=workers, timeout=300)
+    stop = asyncio.Event()
+    stall_task = asyncio.create_task(measure_loop_stall(stop))
+    started = time.perf_counter()
+    results = await asyncio.gather(*(pipeline.process(data) for _, data in corpus))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    stall = await stall_task
+    size_in = sum(len(data) for _, data in corpus)
+    size_out = sum(len(result.data) if result else len(data) for (_, data), result in zip(corpus, results))
+    return {
+        'images_per_second': len(corpus) / elapsed,
+        'mb_per_second': size_in / elapsed / 1e6,
+        'size_in': size_in,
+        'size_out': size_out,
+        'unchanged': sum(1 for result in results if result is None),
+        'max_loop_stall_ms': stall * 1000,
+    }
+
+
+async def run(args):
+    if args.corpus:
+        corpus = load_corpus(os.path.expanduser(args.corpus))
+        if not corpus:
+            sys.exit(f"No images found in {args.corpus}")
+    else:
+        corpus = [(f"synthetic_{w}x{h}_{i}.png", synthetic_screenshot(w, h, i))
+                  for i in range(args.images) for w, h in [SIZES[i % len(SIZES)]]]
+    total = sum(len(data) for _, data in corpus)
+    print(f"Corpus: {len(corpus)} images, {total / 1e6:.1f} MB (mean {total / len(corpus) / 1e6:.2f} MB); {args.workers} worker process(es)")
+
+    # Start the workers before timing, as a long-running sender would have them
+    pool = get_process_pool(args.workers)
+    await asyncio.gather(*(asyncio.get_running_loop().run_in_executor(pool, time.sleep, 0.01) for _ in range(args.workers)))
+
+    header = f"{'policy':<24} {'img/s':>7} {'MB/s':>7} {'in MB':>8} {'out MB':>8} {'ratio':>7} {'unchanged':>10} {'loop stall':>11}"
+    print(header)
+    print('-' * len(header))
+    try:
+        for name, policy_cfg in POLICIES.items():
+            if args.policies and name.split()[0] not in args.policies.split(','):
+                continue
+            r = await run_policy(corpus, policy_cfg, args.workers)
+            print(f"{name:<24} {r['images_per_second']:>7.2f} {r['mb_per_second']:>7.1f} {r['size_in'] / 1e6:>8.1f}"
+                  f" {r['size_out'] / 1e6:>8.2f} {r['size_in'] / max(1, r['size_out']):>6.1f}x {r['unchanged']:>10}"
+                  f" {r['max_loop_stall_ms']:>9.1f}ms")
+    finally:
+        shutdown_process_pool()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark clipboard image transcoding policies")
+    parser.add_argument('--corpus', default=None, help="Directory of sample screenshots (default: synthetic corpus)")
+    parser.add_argument('--images', type=int, default=8, help="Synthetic corpus size")
+    parser.add_argument('--workers', type=int, default=min(2, os.cpu_count() or 1))
+    parser.add_argument('--policies', default=None, help="Comma-separated policy families to run (png, webp, jpeg)")
+    args = parser.parse_args()
+    if not HAS_PIL:
+        sys.exit("Pillow is required: pip install Pillow")
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
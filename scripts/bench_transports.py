@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compares receive transports (WebSocket, /json stream, SSE): delivery latency and client CPU.
+
+By default a local ntfy stand-in (scripts/ntfy_standin.py) is started in a subprocess, so
+its CPU is not counted. Each transport subscribes to its own topic; messages are published
+at a fixed interval and the time from publish to receipt is recorded.
+
+    python scripts/bench_transports.py --messages 500 --interval 0.01
+    python scripts/bench_transports.py --server https://ntfy.example.com --transports json,sse
+
+Client CPU includes publishing, which is the same for every transport, so compare the
+differences between rows rather than the absolute numbers.
+"""
+import argparse
+import asyncio
+import json
+import os
+import secrets
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import aiohttp # noqa: E402
+
+from clipboard_sync.transports import ConnectionClosed, create_session, create_transport # noqa: E402
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_for_server(session: aiohttp.ClientSession, base_url: str, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            async with session.get(f"{base_url}/v1/health") as response:
+                await response.read()
+                return
+        except aiohttp.ClientError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+def _subscribe_url(base_url: str, topic: str, transport: str) -> str:
+    if transport == 'websocket':
+        return base_url.replace('http', 'ws', 1) + f"/{topic}/ws"
+    return f"{base_url}/{topic}/{transport}"
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+async def bench_transport(session: aiohttp.ClientSession, base_url: str, transport_name: str,
+                          messages: int, interval: float, size: int) -> dict:
+    topic = f"bench-{transport_name}-{secrets.token_hex(3)}"
+    sent_at = {}
+    latencies = []
+    done = asyncio.Event()
+
+    transport = create_transport(transport_name, session, _subscribe_url(base_url, topic, transport_name))
+    connect_started = time.perf_counter()
+    await transport.connect()
+
+    async def consume():
+        try:
+            async for frame in transport:
+                event = json.loads(frame)
+                if event.get('event') != 'message':
+                    continue
+                seq = int(event['message'].split(':', 1)[0])
+                latencies.append(time.perf_counter() - sent_at[seq])
+                if len(latencies) >= messages:
+                    done.set()
+                    return
+        except ConnectionClosed:
+            done.set()
+
+    consumer = asyncio.create_task(consume())
+    # The subscription is live once the server has sent its 'open' event; give it a moment
+    await asyncio.sleep(0.2)
+    connect_ms = (time.perf_counter() - connect_started - 0.2) * 1000
+
+    padding = 'x' * max(0, size - 12)
+    cpu_started = time.process_time()
+    wall_started = time.perf_counter()
+    for seq in range(messages):
+        sent_at[seq] = time.perf_counter()
+        async with session.post(f"{base_url}/{topic}", data=f"{seq}:{padding}".encode()) as response:
+            await response.read()
+        if interval:
+            await asyncio.sleep(interval)
+    try:
+        await asyncio.wait_for(done.wait(), timeout=10)
+    except asyncio.TimeoutError:
+        pass
+    cpu_seconds = time.process_time() - cpu_started
+    wall_seconds = time.perf_counter() - wall_started
+    consumer.cancel()
+    await asyncio.gather(consumer, return_exceptions=True)
+    await transport.close()
+
+    result = {'transport': transport_name, 'delivered': len(latencies), 'sent': messages,
+              'connect_ms': connect_ms, 'cpu_ms_per_msg': cpu_seconds * 1000 / messages,
+              'cpu_percent': 100 * cpu_seconds / wall_seconds if wall_seconds else 0.0}
+    if latencies:
+        ms = [latency * 1000 for latency in latencies]
+        result.update(p50_ms=statistics.median(ms), p95_ms=_percentile(ms, 0.95),
+                      p99_ms=_percentile(ms, 0.99), max_ms=max(ms), stdev_ms=statistics.pstdev(ms))
+    return result
+
+
+def print_results(results):
+    header = f"{'transport':<10} {'delivered':>10} {'connect':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'stdev':>8} {'cpu/msg':>8} {'cpu%':>6}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        if 'p50_ms' not in r:
+            print(f"{r['transport']:<10} {r['delivered']:>4}/{r['sent']:<5} (no messages delivered)")
+            continue
+        print(f"{r['transport']:<10} {r['delivered']:>4}/{r['sent']:<5} {r['connect_ms']:>7.1f}m"
+              f" {r['p50_ms']:>7.2f}m {r['p95_ms']:>7.2f}m {r['p99_ms']:>7.2f}m {r['max_ms']:>7.2f}m"
+              f" {r['stdev_ms']:>7.2f}m {r['cpu_ms_per_msg']:>7.3f}m {r['cpu_percent']:>5.1f}")
+    print("(latency columns in ms; cpu/msg in ms of client CPU per message)")
+
+
+async def run(args):
+    server_process = None
+    base_url = args.server.rstrip('/') if args.server else None
+    if not base_url:
+        port = _free_port()
+        standin = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ntfy_standin.py')
+        server_process = subprocess.Popen(
+            [sys.executable, standin, '--port', str(port), '--keepalive', '5'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        base_url = f"http://127.0.0.1:{port}"
+
+    results = []
+    try:
+        async with create_session({}) as session:
+            await _wait_for_server(session, base_url)
+            for name in args.transports.split(','):
+                name = name.strip()
+                for _ in range(args.warmup_rounds):
+                    await bench_transport(session, base_url, name, 10, args.interval, args.size)
+                results.append(await bench_transport(session, base_url, name, args.messages, args.interval, args.size))
+    finally:
+        if server_process:
+            server_process.terminate()
+            server_process.wait(timeout=10)
+    print_results(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ntfy receive transports")
+    parser.add_argument('--server', default=None, help="ntfy base URL (default: start a local stand-in)")
+    parser.add_argument('--transports', default='websocket,json,sse')
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--interval', type=float, default=0.01, help="Seconds between publishes")
+    parser.add_argument('--size', type=int, default=100, help="Message body size in bytes")
+    parser.add_argument('--warmup-rounds', type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
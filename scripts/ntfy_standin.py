@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Minimal local stand-in for an ntfy server, for exercising clipboard_sync without ntfy.sh.
+
+Supports what clipboard_sync uses:
+  POST/PUT /<topic>        publish (text body, or attachment when a Filename header is set)
+  GET /file/<id>           attachment download
+  GET /<topic>/ws          WebSocket subscription (supports ?since=<id|timestamp|all|latest>)
+  GET /<topic>/json        HTTP stream subscription, one JSON event per line (supports ?since=...)
+  GET /<topic>/json?poll=1 cached messages as JSON lines (with ?since=...)
+  GET /<topic>/sse         Server-Sent Events subscription (supports ?since=...)
+
+Like ntfy, WebSocket subscriptions are kept alive with ping control frames every
+--keepalive seconds, and HTTP streams get a keepalive event on the same fixed cadence
+(messages in between do not push it back).
+
+Optional throttling answers publishes with 429 + Retry-After once a token bucket
+is exhausted, to test the sender's rate limiting:
+
+    python scripts/ntfy_standin.py --port 8080 --rate 0.5 --burst 3
+
+Point the config at it with sender.ntfy_topic_url: "http://127.0.0.1:8080/test" and
+receiver.ntfy_server: "http://127.0.0.1:8080".
+"""
+import argparse
+import asyncio
+import json
+import logging
+import secrets
+import time
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+logger = logging.getLogger("NtfyStandIn")
+
+MESSAGE_LIMIT_BYTES = 4096
+
+
+class StandInState:
+    def __init__(self, rate: Optional[float] = None, burst: int = 10, retry_after: Optional[float] = None,
+                 keepalive_seconds: float = 45.0):
+        self.messages: Dict[str, List[dict]] = {}
+        self.attachments: Dict[str, bytes] = {}
+        self.subscribers: Dict[str, List[asyncio.Queue]] = {}
+        self.rate = rate
+        self.burst = burst
+        self.retry_after = retry_after
+        self.keepalive_seconds = keepalive_seconds
+        self.tokens = float(burst)
+        self.last_refill = time.monotonic()
+        self.publish_count = 0
+        self.throttled_count = 0
+
+    def take_token(self) -> bool:
+        if not self.rate:
+            return True
+        now = time.monotonic()
+        self.tokens = min(float(self.burst), self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def subscribe(self, topics: List[str]) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        for topic in topics:
+            self.subscribers.setdefault(topic, []).append(queue)
+        return queue
+
+    def unsubscribe(self, topics: List[str], queue: asyncio.Queue):
+        for topic in topics:
+            if queue in self.subscribers.get(topic, []):
+                self.subscribers[topic].remove(queue)
+
+    def since(self, topics: List[str], since: Optional[str]) -> List[dict]:
+        """Cached messages newer than `since` (message id, unix time, 'all' or 'latest')."""
+        if not since:
+            return []
+        cached = sorted((m for t in topics for m in self.messages.get(t, [])), key=lambda m: m['_seq'])
+        if since == 'all':
+            return cached
+        if since == 'latest':
+            return cached[-1:]
+        if since.isdigit():
+            return [m for m in cached if m['time'] > int(since)]
+        for index, message in enumerate(cached):
+            if message['id'] == since:
+                return cached[index + 1:]
+        return cached
+
+
+def _public(message: dict) -> dict:
+    return {k: v for k, v in message.items() if not k.startswith('_')}
+
+
+def _event(event: str, topic: str) -> dict:
+    return {'id': secrets.token_hex(6), 'time': int(time.time()), 'event': event, 'topic': topic}
+
+
+async def handle_publish(request: web.Request) -> web.Response:
+    state: StandInState = request.app['state']
+    topic = request.match_info['topic']
+    if not state.take_token():
+        state.throttled_count += 1
+        headers = {}
+        if state.retry_after is not None:
+            headers['Retry-After'] = str(int(state.retry_after))
+        return web.json_response({'code': 42901, 'http': 429, 'error': 'limit reached: too many requests'},
+                                 status=429, headers=headers)
+
+    body = await request.read()
+    message = _event('message', topic)
+    message['_seq'] = state.publish_count
+    state.publish_count += 1
+    if request.headers.get('Title'):
+        message['title'] = request.headers['Title']
+    filename = request.headers.get('Filename')
+    text = None
+    if not filename and len(body) <= MESSAGE_LIMIT_BYTES:
+        try:
+            text = body.decode('utf-8')
+        except UnicodeDecodeError:
+            filename = 'attachment.bin'
+    if text is not None:
+        message['message'] = text.strip() # ntfy trims message bodies
+    else:
+        filename = filename or 'attachment.txt'
+        attachment_id = message['id']
+        state.attachments[attachment_id] = body
+        base_url = f"{request.scheme}://{request.host}"
+        message['message'] = f"You received a file: {filename}"
+        message['attachment'] = {
+            'name': filename,
+            'type': request.headers.get('Content-Type', 'application/octet-stream').split(';')[0],
+            'size': len(body),
+            'expires': int(time.time()) + 3 * 3600,
+            'url': f"{base_url}/file/{attachment_id}",
+        }
+
+    state.messages.setdefault(topic, []).append(message)
+    for queue in state.subscribers.get(topic, []):
+        queue.put_nowait(message)
+    return web.json_response(_public(message))
+
+
+async def handle_file(request: web.Request) -> web.Response:
+    state: StandInState = request.app['state']
+    data = state.attachments.get(request.match_info['id'])
+    if data is None:
+        raise web.HTTPNotFound()
+    return web.Response(body=data, content_type='application/octet-stream')
+
+
+async def handle_ws(request: web.Request) -> web.WebSocketResponse:
+    state: StandInState = request.app['state']
+    topics = request.match_info['topics'].split(',')
+    # ntfy sends no keepalive events over WebSocket, only ping control frames
+    ws = web.WebSocketResponse(heartbeat=state.keepalive_seconds)
+    await ws.prepare(request)
+    queue = state.subscribe(topics)
+
+    async def push():
+        await ws.send_str(json.dumps(_event('open', ','.join(topics))))
+        for message in state.since(topics, request.query.get('since')):
+            await ws.send_str(json.dumps(_public(message)))
+        while not ws.closed:
+            message = await queue.get()
+            await ws.send_str(json.dumps(_public(message)))
+
+    pusher = asyncio.create_task(push())
+    try:
+        # Reading answers the client's pings and close handshake; clients send nothing else
+        async for _ in ws:
+            pass
+    except (ConnectionResetError, asyncio.CancelledError):
+        pass
+    finally:
+        pusher.cancel()
+        await asyncio.gather(pusher, return_exceptions=True)
+        state.unsubscribe(topics, queue)
+    return ws
+
+
+async def _stream_subscription(request: web.Request, content_type: str, encode) -> web.StreamResponse:
+    """Shared HTTP streaming subscription: open event, since= replay, live messages and keepalives."""
+    state: StandInState = request.app['state']
+    topics = request.match_info['topics'].split(',')
+    response = web.StreamResponse(headers={'Content-Type': content_type, 'Cache-Control': 'no-cache'})
+    await response.prepare(request)
+    queue = state.subscribe(topics)
+    loop = asyncio.get_running_loop()
+    try:
+        await response.write(encode(_event('open', ','.join(topics))))
+        for message in state.since(topics, request.query.get('since')):
+            await response.write(encode(_public(message)))
+        # Keepalives run on their own timer, as in ntfy: messages do not reset it
+        next_keepalive = loop.time() + state.keepalive_seconds
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), timeout=max(0.0, next_keepalive - loop.time()))
+                await response.write(encode(_public(message)))
+            except asyncio.TimeoutError:
+                await response.write(encode(_event('keepalive', ','.join(topics))))
+                next_keepalive += state.keepalive_seconds
+    except (ConnectionResetError, asyncio.CancelledError):
+        pass
+    finally:
+        state.unsubscribe(topics, queue)
+    return response
+
+
+def _encode_json_line(event: dict) -> bytes:
+    return (json.dumps(event) + '\n').encode('utf-8')
+
+
+def _encode_sse(event: dict) -> bytes:
+    prefix = '' if event['event'] == 'message' else f"event: {event['event']}\n"
+    return f"{prefix}data: {json.dumps(event)}\n\n".encode('utf-8')
+
+
+async def handle_json(request: web.Request) -> web.StreamResponse:
+    state: StandInState = request.app['state']
+    topics = request.match_info['topics'].split(',')
+    if request.query.get('poll') not in ('1', 'true', 'yes'):
+        return await _stream_subscription(request, 'application/x-ndjson', _encode_json_line)
+    lines = [json.dumps(_public(m)) for m in state.since(topics, request.query.get('since', 'all'))]
+    return web.Response(text=''.join(line + '\n' for line in lines), content_type='application/x-ndjson')
+
+
+async def handle_sse(request: web.Request) -> web.StreamResponse:
+    return await _stream_subscription(request, 'text/event-stream', _encode_sse)
+
+
+def create_app(state: Optional[StandInState] = None) -> web.Application:
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app['state'] = state or StandInState()
+    app.router.add_get('/file/{id}', handle_file)
+    app.router.add_get('/{topics}/ws', handle_ws)
+    app.router.add_get('/{topics}/json', handle_json)
+    app.router.add_get('/{topics}/sse', handle_sse)
+    app.router.add_route('POST', '/{topic}', handle_publish)
+    app.router.add_route('PUT', '/{topic}', handle_publish)
+    return app
+
+
+async def start_standin(host: str = '127.0.0.1', port: int = 0, state: Optional[StandInState] = None):
+    """Starts the stand-in in the current loop. Returns (runner, base_url)."""
+    runner = web.AppRunner(create_app(state))
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{bound_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local ntfy stand-in server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--rate', type=float, default=None, help="Publishes per second allowed (default: unlimited)")
+    parser.add_argument('--burst', type=int, default=10, help="Publish burst size when --rate is set")
+    parser.add_argument('--retry-after', type=float, default=None, help="Retry-After seconds sent with 429 responses")
+    parser.add_argument('--keepalive', type=float, default=45.0, help="Keepalive interval in seconds")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - [%(name)s] - %(message)s')
+    state = StandInState(rate=args.rate, burst=args.burst, retry_after=args.retry_after, keepalive_seconds=args.keepalive)
+    web.run_app(create_app(state), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()